@@ -1 +1 @@
-from apiserver.blueprints.admin.views import admin
+from apiserver.blueprints.admin.views import admin
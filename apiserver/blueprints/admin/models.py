@@ -1,44 +1,645 @@
-from database.db_arango import connect_to_db
-from database.aql import search, neighbors
-
-client = connect_to_db()
-
-
-def get_suggestions(search_term='sample'):
-    results = client.aql.execute(search(search_term), count=True, fail_on_warning=True)
-    return [doc for doc in results]
-
-
-def get_neighbors(node_key='sample'):
-    """
-    Get all neighbors which are defined by a single depth of traversal in either direction
-    Return the result as a graph formatted for visualization which requires nodes and edges in their own
-    lists, nodes with keys, and lines that consist of source and target. No source or target should have
-    a key that doesn't exist in the nodes
-
-    :param node_key: str
-        ID that is the collection/key of the node being searched
-    :return: graph: dict
-        standard json object that can be translated into any number of visualization libraries
-    """
-    results = client.aql.execute(neighbors(node_key), count=True, fail_on_warning=True)
-    graph = {'index': [], 'nodes': [], 'lines': []}
-    for r in results:
-        if 'v' in list(r.keys()):
-            if r['v']['_id'] not in graph['index']:
-                # Copy the whole result and make the 'key' from the system _id
-                node = r['v']
-                node['key'] = r['v']['_id']
-                # Pop out system attributes
-                node.pop('_rev')
-                node.pop('_key')
-                node.pop('_id')
-                graph['index'].append(node['key'])
-                graph['nodes'].append(node)
-        if 'e' in list(r.keys()):
-            edge = {
-                'source': r['e']['_from'],
-                'target': r['e']['_to'],
-                'label': str(r['e']['_id'])[:str(r['e']['_id']).find('/')]}
-            graph['lines'].append(edge)
-    return graph
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from arango.exceptions import CursorNextError, CursorStateError
+from loguru import logger
+
+from apiserver.resources import resources
+from database.db_arango import connect_to_db, add_write_listener
+from database.async_arango import AsyncDatabase
+from database.aql import bind, traversal, prepare, query_name, DEFAULT_GRAPH, SEARCH_VIEW
+from database.cache import ResultCache, MISSING
+from database.cursors import CursorStore, CursorExpired
+from database.singleflight import SingleFlight
+from database.typeahead import PrefixIndex, normalize, MIN_GRAM
+from database.graph import GraphAssembler
+from database.adjacency import AdjacencyIndex, numpy
+from database.analytics import centrality, top_nodes, MEASURES
+from monitoring.metrics import ASSEMBLY_SECONDS, COALESCED_REQUESTS
+
+# Concurrency and timeouts for the database can be tuned per deployment. The HTTP pool is sized to the number of
+# queries allowed in flight so a worker thread never waits on a socket held by another one
+DB_MAX_CONCURRENCY = int(os.environ.get('ARANGO_MAX_CONCURRENCY', 16))
+DB_TIMEOUT = float(os.environ.get('ARANGO_TIMEOUT', 30))
+# Rows fetched per cursor round trip when assembling neighborhoods
+NEIGHBOR_BATCH_SIZE = int(os.environ.get('ARANGO_BATCH_SIZE', 5000))
+# Rows per batch streamed to websocket clients, small so the first batch is drawn while the rest is still produced
+STREAM_BATCH_SIZE = int(os.environ.get('ARANGO_STREAM_BATCH_SIZE', 500))
+# Upper bounds for user supplied traversal depths and result sizes
+MAX_TRAVERSAL_DEPTH = int(os.environ.get('ARANGO_MAX_TRAVERSAL_DEPTH', 6))
+MAX_TRAVERSAL_RESULTS = int(os.environ.get('ARANGO_MAX_TRAVERSAL_RESULTS', 10000))
+# Nodes expanded by one batch neighbors query
+MAX_BATCH_SEEDS = int(os.environ.get('ARANGO_MAX_BATCH_SEEDS', 100))
+# Results read a page at a time keep their cursor open in ArangoDB between requests, for CURSOR_TTL seconds after
+# the last page was read
+PAGE_SIZE = int(os.environ.get('PAGE_SIZE', 1000))
+MAX_PAGE_SIZE = int(os.environ.get('MAX_PAGE_SIZE', 10000))
+CURSOR_TTL = int(os.environ.get('CURSOR_TTL', 120))
+# Nodes returned by default and at most by the ranking of an expansion
+RANK_TOP = int(os.environ.get('RANK_TOP', 100))
+RANK_MAX_TOP = int(os.environ.get('RANK_MAX_TOP', 1000))
+# Graphs whose adjacency is held in memory to answer neighbors and expansions up to ADJACENCY_MAX_DEPTH hops without
+# a query, comma separated. Each is reloaded every ADJACENCY_REFRESH seconds to pick up deletions and writes that
+# did not go through database.db_arango
+ADJACENCY_GRAPHS = [g.strip() for g in os.environ.get('ADJACENCY_GRAPHS', '').split(',') if g.strip()]
+ADJACENCY_MAX_BYTES = int(os.environ.get('ADJACENCY_MAX_BYTES', 256 * 1024 * 1024))
+ADJACENCY_MAX_DELTA = int(os.environ.get('ADJACENCY_MAX_DELTA', 10000))
+ADJACENCY_MAX_DEPTH = int(os.environ.get('ADJACENCY_MAX_DEPTH', 2))
+ADJACENCY_REFRESH = float(os.environ.get('ADJACENCY_REFRESH', 3600))
+
+
+
+def _connect():
+    return AsyncDatabase(
+        connect_to_db(pool_size=DB_MAX_CONCURRENCY + 1, timeout=DB_TIMEOUT),
+        max_concurrency=DB_MAX_CONCURRENCY,
+        timeout=DB_TIMEOUT
+    )
+
+
+# Connected when the app starts serving or on first use, never at import
+resources.register('arango', _connect, close=AsyncDatabase.close)
+client = resources.proxy('arango')
+
+# Results of the read endpoints are cached per request parameters and dropped when the collections they were read
+# from are written to through database.db_arango
+cache = ResultCache(
+    max_entries=int(os.environ.get('CACHE_MAX_ENTRIES', 2048)),
+    max_bytes=int(os.environ.get('CACHE_MAX_BYTES', 128 * 1024 * 1024)),
+    ttls={
+        'suggestions': float(os.environ.get('CACHE_TTL_SUGGESTIONS', 300)),
+        'neighbors': float(os.environ.get('CACHE_TTL_NEIGHBORS', 60)),
+        'paths': float(os.environ.get('CACHE_TTL_PATHS', 60)),
+        'typeahead': float(os.environ.get('CACHE_TTL_TYPEAHEAD', 300))
+    }
+)
+# Requests that miss the cache while the same result is already being read wait for that read instead of querying
+flights = SingleFlight()
+cursors = CursorStore(ttl=CURSOR_TTL, max_open=int(os.environ.get('CURSOR_MAX_OPEN', 1000)))
+# Typeahead answers the shortest prefixes from the most popular documents of a collection kept in memory and the
+# rest from the edge n-gram index of the search view
+TYPEAHEAD_LIMIT = int(os.environ.get('TYPEAHEAD_LIMIT', 10))
+TYPEAHEAD_MAX_LIMIT = int(os.environ.get('TYPEAHEAD_MAX_LIMIT', 100))
+TYPEAHEAD_POPULAR_COLLECTION = os.environ.get('TYPEAHEAD_POPULAR_COLLECTION', 'Tag')
+TYPEAHEAD_POPULAR_ATTRIBUTE = os.environ.get('TYPEAHEAD_POPULAR_ATTRIBUTE', 'nodesize')
+TYPEAHEAD_POPULAR_COUNT = int(os.environ.get('TYPEAHEAD_POPULAR_COUNT', 5000))
+TYPEAHEAD_INDEX_TTL = float(os.environ.get('TYPEAHEAD_INDEX_TTL', 600))
+prefix_index = PrefixIndex(max_prefix=int(os.environ.get('TYPEAHEAD_MEMORY_PREFIX', 3)), per_prefix=TYPEAHEAD_LIMIT)
+_prefix_index_lock = None
+# Collections linked to the search view, loaded on the first search. None means unknown so every write is assumed
+# to possibly change the search results
+_search_links = None
+
+
+def _collection(doc_id):
+    return doc_id.partition('/')[0]
+
+
+def _graph_tags(graph, *names):
+    tags = set(names)
+    tags.update(_collection(key) for key in graph['index'])
+    tags.update(line['label'] for line in graph['lines'])
+    return tags
+
+
+async def _cached(namespace, key, load, tags):
+    """
+    Get a result from the cache, or read it once for every concurrent request that missed the cache and cache it
+
+    :param namespace: str
+        cache namespace of the result
+    :param key:
+        parameters the result depends on
+    :param load:
+        coroutine function reading the result
+    :param tags:
+        function of the result returning the tags it is cached with
+    :return:
+        the result, shared with the other requests and read only
+    """
+    data = cache.get(namespace, key)
+    if data is MISSING:
+        if (namespace, key) in flights:
+            COALESCED_REQUESTS.inc(namespace=namespace)
+        data = await flights.do((namespace, key), _load, namespace, key, load, tags)
+    return data
+
+
+async def _load(namespace, key, load, tags):
+    # A result a write landed on while it was read may predate the write and is not cached
+    generation = cache.generation()
+    data = await load()
+    cache.set(namespace, key, data, tags=tags(data), generation=generation)
+    return data
+
+
+def invalidate_on_write(col, docs):
+    """
+    Write listener that drops the cached results read from the collection written to. Edges also invalidate the
+    collections of the vertices they connect since a new edge changes the neighborhood of both ends.
+    """
+    tags = {col}
+    for doc in docs:
+        for attr in ('_from', '_to'):
+            if attr in doc:
+                tags.add(_collection(doc[attr]))
+    if _search_links is None or col in _search_links:
+        tags.add(SEARCH_VIEW)
+    if col == TYPEAHEAD_POPULAR_COLLECTION:
+        prefix_index.loaded_at = None
+    dropped = cache.invalidate(*tags)
+    if dropped:
+        logger.debug("Write to %s invalidated %d cached results" % (col, dropped))
+
+
+add_write_listener(invalidate_on_write)
+
+if ADJACENCY_GRAPHS and numpy is None:
+    logger.warning("numpy is not installed, the adjacency of %s is not held in memory" % ', '.join(ADJACENCY_GRAPHS))
+adjacency = {
+    graph: AdjacencyIndex(graph, max_bytes=ADJACENCY_MAX_BYTES, max_delta=ADJACENCY_MAX_DELTA)
+    for graph in (ADJACENCY_GRAPHS if numpy is not None else ())
+}
+# Time of the last load attempt and the load running for each graph
+_adjacency_attempts = {}
+_adjacency_loads = {}
+# A load reads whole collections for as long as that takes, so loads run one at a time on a thread of their own rather
+# than on the query executor and its per query timeout. The thread keeps its own connection of the pool
+_adjacency_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='adjacency')
+_adjacency_threads = {}
+
+
+def update_adjacency_on_write(col, docs):
+    """
+    Write listener applying the documents written to the adjacency of every graph held in memory
+    """
+    for index in adjacency.values():
+        index.apply_write(col, docs)
+
+
+add_write_listener(update_adjacency_on_write)
+
+
+async def _load_search_links():
+    global _search_links
+    try:
+        view = await client.run(client.db.view, SEARCH_VIEW)
+        _search_links = set(view.get('links', {}))
+    except Exception as e:
+        logger.warning("Could not read the links of %s: %s" % (SEARCH_VIEW, e))
+
+
+def _load_adjacency(index):
+    # Runs on a worker thread, the collections are streamed straight into the index so only one copy is held
+    definitions = client.db.graph(index.graph).edge_definitions()
+    edge_collections = [d['edge_collection'] for d in definitions]
+    vertex_collections = sorted({col for d in definitions
+                                 for col in d['from_vertex_collections'] + d['to_vertex_collections']})
+
+    def read(name, col):
+        query, bind_vars = bind(name, collection=col)
+        return client.db.aql.execute(query, bind_vars=bind_vars, batch_size=NEIGHBOR_BATCH_SIZE, stream=True,
+                                      max_runtime=ADJACENCY_REFRESH)
+
+    start = time.perf_counter()
+    vertices = (doc for col in vertex_collections for doc in read('adjacency_vertices', col))
+    edges = ((col, e[0], e[1]) for col in edge_collections for e in read('adjacency_edges', col))
+    if index.load(vertices, edges, edge_collections, vertex_collections):
+        logger.info("Loaded the adjacency of %s in %.1f s: %s" % (index.graph, time.perf_counter() - start,
+                                                                   index.stats()))
+    else:
+        logger.warning("The adjacency of %s does not fit in %d bytes, its expansions are queried" % (
+            index.graph, index.max_bytes))
+
+
+async def load_adjacency(graph=DEFAULT_GRAPH):
+    """
+    Load, or reload, the adjacency of a graph held in memory now rather than in the background
+
+    :param graph: str
+        one of ADJACENCY_GRAPHS
+    :return: bool
+        whether the adjacency is loaded
+    """
+    index = adjacency[graph]
+    _adjacency_attempts[graph] = time.monotonic()
+    try:
+        # A load still running, even one whose caller gave up on it, is waited for rather than started again
+        load = _adjacency_threads.get(graph)
+        if load is None or load.done():
+            load = _adjacency_threads[graph] = _adjacency_executor.submit(_load_adjacency, index)
+        await asyncio.shield(asyncio.wrap_future(load))
+    except Exception as e:
+        # Keep answering from what is loaded, or from the database, and retry after ADJACENCY_REFRESH
+        logger.warning("Could not load the adjacency of %s: %s" % (graph, e))
+    return index.loaded
+
+
+def adjacency_index(graph=DEFAULT_GRAPH):
+    """
+    Get the in memory adjacency of a graph and start loading it in the background when it is not loaded yet or is
+    due for a reload. Requests keep being answered by the database until the first load is done.
+
+    :param graph: str
+    :return: AdjacencyIndex or None
+        None when the graph is not held in memory
+    """
+    index = adjacency.get(graph)
+    if index is None:
+        return None
+    attempt = _adjacency_attempts.get(graph)
+    if graph not in _adjacency_loads and (attempt is None or time.monotonic() - attempt >= ADJACENCY_REFRESH):
+        _adjacency_attempts[graph] = time.monotonic()
+        task = _adjacency_loads[graph] = asyncio.ensure_future(load_adjacency(graph))
+        task.add_done_callback(lambda _: _adjacency_loads.pop(graph, None))
+    return index
+
+
+async def prepare_queries():
+    """
+    Validate and explain the query catalog once before the first request is served
+    """
+    return await client.run(prepare, client.db)
+
+
+async def _refresh_prefix_index():
+    global _prefix_index_lock
+    if _prefix_index_lock is None:
+        _prefix_index_lock = asyncio.Lock()
+    async with _prefix_index_lock:
+        if prefix_index.loaded_at is not None and time.monotonic() - prefix_index.loaded_at < TYPEAHEAD_INDEX_TTL:
+            return
+        try:
+            docs = await client.execute(*bind(
+                'popular_names', collection=TYPEAHEAD_POPULAR_COLLECTION, attribute=TYPEAHEAD_POPULAR_ATTRIBUTE,
+                limit=TYPEAHEAD_POPULAR_COUNT))
+            prefix_index.load(docs)
+            logger.info("Loaded %d typeahead prefixes from %d documents" % (len(prefix_index), len(docs)))
+        except Exception as e:
+            # Keep serving whatever is loaded and retry once the ttl has passed again
+            prefix_index.loaded_at = time.monotonic()
+            logger.warning("Could not load the typeahead prefixes: %s" % e)
+
+
+async def get_typeahead(prefix, limit=TYPEAHEAD_LIMIT):
+    """
+    Get the best documents whose name has words starting with the words typed so far, best ranked first. The first
+    keystrokes are answered from memory and longer prefixes from the edge n-gram index of the search view.
+
+    :param prefix: str
+        text typed so far
+    :param limit: int
+        number of documents returned
+    :return: list
+    """
+    prefix, limit = normalize(prefix), min(int(limit), TYPEAHEAD_MAX_LIMIT)
+    if prefix_index.loaded_at is None or time.monotonic() - prefix_index.loaded_at >= TYPEAHEAD_INDEX_TTL:
+        await _refresh_prefix_index()
+    data = prefix_index.lookup(prefix, limit)
+    # The index only keeps per_prefix documents of a prefix, more come from the view when it can search the prefix,
+    # that is when one of its words is long enough to be in the edge n-gram index
+    words = prefix.split()
+    if not words or max(map(len, words)) < MIN_GRAM or (data and limit <= prefix_index.per_prefix):
+        return data or []
+    short = [w for w in words if len(w) < MIN_GRAM]
+    return await _cached(
+        'typeahead', (prefix, limit),
+        lambda: client.execute(
+            *bind('typeahead', prefix=prefix, short=short, limit=limit), cache=True, fail_on_warning=True),
+        lambda data: {SEARCH_VIEW} | {_collection(d['_id']) for d in data})
+
+
+async def get_suggestions(search_term='sample', mode='exact', limit=TYPEAHEAD_LIMIT):
+    """
+    Search documents by name, either the exact name or as typeahead on a partially typed name
+
+    :param search_term: str
+    :param mode: str
+        exact or typeahead
+    :param limit: int
+        number of documents returned in typeahead mode
+    :return: list
+    """
+    if mode == 'typeahead':
+        return await get_typeahead(search_term, limit=limit)
+    elif mode != 'exact':
+        raise ValueError("Search mode must be exact or typeahead, got %s" % mode)
+
+    async def search():
+        if _search_links is None:
+            await _load_search_links()
+        return await client.execute(*bind('search', term=search_term), cache=True, fail_on_warning=True)
+    return await _cached(
+        'suggestions', search_term, search, lambda data: {SEARCH_VIEW} | {_collection(d['_id']) for d in data})
+
+
+async def get_neighbors(node_key='sample'):
+    """
+    Get all neighbors which are defined by a single depth of traversal in either direction
+    Return the result as a graph formatted for visualization which requires nodes and edges in their own
+    lists, nodes with keys, and lines that consist of source and target. No source or target should have
+    a key that doesn't exist in the nodes
+
+    :param node_key: str
+        ID that is the collection/key of the node being searched
+    :return: graph: dict
+        standard json object that can be translated into any number of visualization libraries
+    """
+    index = adjacency_index(DEFAULT_GRAPH)
+    data = index.neighbors(node_key) if index is not None else None
+    if data is not None:
+        return data
+    return await _cached(
+        'neighbors', node_key, lambda: _assemble(*bind('neighbors', start=node_key)),
+        lambda data: _graph_tags(data, DEFAULT_GRAPH, _collection(node_key)))
+
+
+async def get_neighbors_batch(node_keys):
+    """
+    Get the neighbors of several nodes with a single traversal, merged into one graph in the same format as
+    get_neighbors. Every node and line has a seeds list naming the nodes of node_keys it was reached from.
+
+    :param node_keys: list of str
+        collection/key of the nodes to expand, at most MAX_BATCH_SEEDS
+    :return: graph: dict
+    """
+    # Repeated keys would only repeat the traversal
+    node_keys = list(dict.fromkeys(k for k in node_keys if k))
+    if not node_keys:
+        raise ValueError("No node keys to expand")
+    if len(node_keys) > MAX_BATCH_SEEDS:
+        raise ValueError("At most %d nodes can be expanded at once, got %d" % (MAX_BATCH_SEEDS, len(node_keys)))
+    index = adjacency_index(DEFAULT_GRAPH)
+    data = index.neighbors(node_keys) if index is not None else None
+    if data is not None:
+        return data
+    return await _cached(
+        'neighbors', tuple(node_keys), lambda: _assemble(*bind('neighbors_batch', seeds=node_keys)),
+        lambda data: _graph_tags(data, DEFAULT_GRAPH, *map(_collection, node_keys)))
+
+
+async def _close_cursors(dropped):
+    for cursor in dropped:
+        try:
+            await client.run(cursor.close, ignore_missing=True)
+        except Exception as e:
+            logger.warning("Could not close cursor %s: %s" % (cursor.id, e))
+
+
+async def close_cursors():
+    """
+    Close every cursor kept open for a next page
+    """
+    await _close_cursors(cursors.clear())
+
+
+async def _read_page(kind, token, page_size, open_query):
+    # First page of a query, or the page after a token, with the token of the page after it if there is one
+    await _close_cursors(cursors.expire())
+    if token:
+        cursor, state = cursors.take(token)
+        if state['kind'] != kind:
+            await _close_cursors([cursor])
+            raise CursorExpired("Continuation token %s does not continue %s" % (token, kind))
+        try:
+            rows = await client.fetch(cursor, state['query'])
+        except (CursorNextError, CursorStateError) as e:
+            # ArangoDB dropped the cursor before its ttl, after a restart or for lack of memory, paging starts over
+            await _close_cursors([cursor])
+            raise CursorExpired("Continuation token %s can no longer be read: %s" % (token, e)) from e
+    else:
+        page_size = int(page_size)
+        if page_size < 1:
+            raise ValueError("The page size must be at least 1, got %d" % page_size)
+        query, bind_vars = open_query()
+        cursor, rows = await client.open_cursor(
+            query, bind_vars, batch_size=min(page_size, MAX_PAGE_SIZE), ttl=CURSOR_TTL, stream=True,
+            fail_on_warning=True)
+        state = {'kind': kind, 'query': query, 'nodes': set(), 'lines': set()}
+    if not cursor.has_more():
+        return rows, state, None
+    token, evicted = cursors.add(cursor, state)
+    await _close_cursors(evicted)
+    return rows, state, token
+
+
+async def get_suggestions_page(search_term=None, page_size=PAGE_SIZE, token=None):
+    """
+    Search documents by exact name one page at a time. The first page opens a cursor in ArangoDB and every page
+    comes with the token of the next one, so the first results arrive without waiting for the rest.
+
+    :param search_term: str
+        only read for the first page
+    :param page_size: int
+        documents per page, capped at MAX_PAGE_SIZE and set by the first page for the following ones
+    :param token: str
+        continuation token returned with the previous page, None for the first page
+    :return: tuple
+        (list of documents, token of the next page or None after the last page)
+    :raise CursorExpired:
+        when the token is unknown, already used or has expired
+    """
+    docs, _, token = await _read_page('suggestions', token, page_size, lambda: bind('search', term=search_term))
+    return docs, token
+
+
+async def get_neighbors_page(node_key=None, page_size=PAGE_SIZE, token=None):
+    """
+    Get the neighbors of a node one page at a time, like get_suggestions_page. Every page is a graph in the format
+    of get_neighbors holding what the page adds to the previous ones, nodes and lines already sent are left out.
+
+    :param node_key: str
+        only read for the first page
+    :param page_size: int
+        traversal rows per page, one per edge of the node
+    :return: tuple
+        (graph: dict, token of the next page or None after the last page)
+    """
+    rows, state, token = await _read_page('neighbors', token, page_size, lambda: bind('neighbors', start=node_key))
+    page = GraphAssembler()
+    page.add(rows)
+    graph = page.graph()
+    nodes = [n for n in graph['nodes'] if n['key'] not in state['nodes']]
+    lines = [line for line in graph['lines'] if (line['source'], line['target'], line['label']) not in state['lines']]
+    state['nodes'].update(n['key'] for n in nodes)
+    state['lines'].update((line['source'], line['target'], line['label']) for line in lines)
+    return {'index': [n['key'] for n in nodes], 'nodes': nodes, 'lines': lines}, token
+
+
+async def _assemble(query, bind_vars):
+    graph = GraphAssembler()
+    # Only the time spent in the assembler, not waiting on the cursor
+    spent = 0.0
+    async for batch in client.stream(query, bind_vars, batch_size=NEIGHBOR_BATCH_SIZE, fail_on_warning=True):
+        start = time.perf_counter()
+        graph.add(batch)
+        spent += time.perf_counter() - start
+    ASSEMBLY_SECONDS.observe(spent, query=query_name(query))
+    return graph.graph()
+
+
+async def stream_graph(query, bind_vars, assembler=None, batch_size=STREAM_BATCH_SIZE):
+    """
+    Run a traversal as a streaming query and yield what every cursor batch adds to the graph as soon as ArangoDB has
+    produced it, so the first nodes arrive after the same time whatever the size of the result.
+
+    :param query: str
+    :param bind_vars: dict
+    :param assembler: GraphAssembler
+        graph built so far, elements it already holds are not yielded again
+    :param batch_size: int
+        rows per cursor batch
+    :return: async generator of tuple
+        (new nodes, new lines) of every batch that added something
+    """
+    assembler = GraphAssembler() if assembler is None else assembler
+    async for batch in client.stream(query, bind_vars, batch_size=batch_size, stream=True, fail_on_warning=True):
+        nodes, lines = assembler.add(batch)
+        if nodes or lines:
+            yield nodes, lines
+
+
+def paths_query(start_key, target_key, k=1, graph=DEFAULT_GRAPH, direction='ANY', edge_collections=None,
+                max_depth=MAX_TRAVERSAL_DEPTH):
+    """
+    :return: tuple
+        query and bind variables of the shortest path, or the k shortest paths, between two nodes
+    """
+    max_depth = min(int(max_depth), MAX_TRAVERSAL_DEPTH)
+    if int(k) <= 1:
+        return traversal(
+            'shortest_path_bounded', direction, edge_collections, start=start_key, target=target_key, graph=graph,
+            max_depth=max_depth)
+    return traversal(
+        'k_shortest_paths', direction, edge_collections, start=start_key, target=target_key, graph=graph,
+        k=min(int(k), MAX_TRAVERSAL_RESULTS), max_depth=max_depth)
+
+
+def k_hop_query(node_key, max_depth=2, limit=MAX_TRAVERSAL_RESULTS, graph=DEFAULT_GRAPH, direction='ANY',
+                edge_collections=None):
+    """
+    :return: tuple
+        query and bind variables of the breadth first expansion of a node
+    """
+    max_depth, limit = min(int(max_depth), MAX_TRAVERSAL_DEPTH), min(int(limit), MAX_TRAVERSAL_RESULTS)
+    return traversal(
+        'k_hop', direction, edge_collections, start=node_key, max_depth=max_depth, limit=limit, graph=graph)
+
+
+async def get_paths(start_key, target_key, k=1, graph=DEFAULT_GRAPH, direction='ANY', edge_collections=None,
+                    max_depth=MAX_TRAVERSAL_DEPTH):
+    """
+    Get the shortest path, or the k shortest paths, between two nodes as a graph in the same format as get_neighbors.
+    Vertices shared by several paths appear once.
+
+    :param start_key: str
+        collection/key of the first node
+    :param target_key: str
+        collection/key of the last node
+    :param k: int
+        number of paths, 1 uses SHORTEST_PATH and anything above the shortest of K_PATHS
+    :param graph: str
+        named graph to traverse when no edge collections are given
+    :param direction: str
+        OUTBOUND, INBOUND or ANY
+    :param edge_collections: list of str
+        only follow edges in these collections
+    :param max_depth: int
+        longest path in edges that will be returned, capped at MAX_TRAVERSAL_DEPTH
+    :return: graph: dict
+    """
+    max_depth = min(int(max_depth), MAX_TRAVERSAL_DEPTH)
+    key = (start_key, target_key, int(k), graph, direction, tuple(edge_collections or ()), max_depth)
+    return await _cached(
+        'paths', key,
+        lambda: _assemble(*paths_query(start_key, target_key, k, graph, direction, edge_collections, max_depth)),
+        lambda data: _graph_tags(
+            data, graph, _collection(start_key), _collection(target_key), *(edge_collections or ())))
+
+
+async def get_k_hop_neighbors(node_key, max_depth=2, limit=MAX_TRAVERSAL_RESULTS, graph=DEFAULT_GRAPH,
+                              direction='ANY', edge_collections=None):
+    """
+    Get every node within max_depth hops of a node, including the node itself, as a graph in the same format as
+    get_neighbors. The expansion is breadth first so when the limit cuts it short the closest nodes are kept.
+
+    :param node_key: str
+        collection/key of the node to expand
+    :param max_depth: int
+        number of hops, capped at MAX_TRAVERSAL_DEPTH
+    :param limit: int
+        maximum number of nodes, capped at MAX_TRAVERSAL_RESULTS
+    :return: graph: dict
+    """
+    max_depth, limit = min(int(max_depth), MAX_TRAVERSAL_DEPTH), min(int(limit), MAX_TRAVERSAL_RESULTS)
+    index = adjacency_index(graph) if max_depth <= ADJACENCY_MAX_DEPTH else None
+    data = index.k_hop(node_key, max_depth, limit, graph, direction, edge_collections) if index is not None else None
+    if data is not None:
+        return data
+    return await _cached(
+        'neighbors', (node_key, max_depth, limit, graph, direction, tuple(edge_collections or ())),
+        lambda: _assemble(*k_hop_query(node_key, max_depth, limit, graph, direction, edge_collections)),
+        lambda data: _graph_tags(data, graph, _collection(node_key), *(edge_collections or ())))
+
+
+async def _induced(data, graph, edge_collections):
+    # The expansion only has the edge each node was reached through, centrality needs every edge between its nodes
+    index = adjacency_index(graph)
+    lines = index.lines_between(data['index'], graph, edge_collections) if index is not None else None
+    if lines is None:
+        assembler = GraphAssembler()
+        query, bind_vars = traversal('induced_edges', 'OUTBOUND', edge_collections, vertices=data['index'], graph=graph)
+        async for batch in client.stream(query, bind_vars, batch_size=NEIGHBOR_BATCH_SIZE, fail_on_warning=True):
+            assembler.add(batch)
+        lines = assembler.graph()['lines']
+    return dict(data, lines=lines)
+
+
+def _rank(graph, measures, rank, top, directed):
+    # CPU bound, runs on a thread of the default executor. The seed keeps sampled betweenness the same between calls
+    return top_nodes(graph, centrality(graph, measures, directed, seed=0), rank, top)
+
+
+async def get_ranked_neighbors(node_key, rank='pagerank', top=RANK_TOP, measures=MEASURES, max_depth=2,
+                               limit=MAX_TRAVERSAL_RESULTS, graph=DEFAULT_GRAPH, direction='ANY',
+                               edge_collections=None):
+    """
+    Expand a node like get_k_hop_neighbors and keep only its most central nodes, so the visualizer can show the
+    important part of a huge neighborhood without receiving all of it. Scores are computed on a sparse matrix of
+    every edge between the nodes of the expansion, see database.analytics.
+
+    :param node_key: str
+        collection/key of the node to expand
+    :param rank: str
+        degree, pagerank or betweenness, the measure the nodes are ranked by
+    :param top: int
+        number of nodes kept, capped at RANK_MAX_TOP
+    :param measures: iterable of str
+        scores added to every kept node, the rank is always one of them
+    :param direction: str
+        OUTBOUND or INBOUND also rank along the direction of the edges, ANY ignores it
+    :return: graph: dict
+        the top nodes best first with their scores as attributes and the lines between them
+    """
+    measures = tuple(dict.fromkeys(tuple(measures) + (rank,)))
+    unknown = set(measures) - set(MEASURES)
+    if unknown:
+        raise ValueError("Unknown centrality measures %s, use %s" % (', '.join(sorted(unknown)), ', '.join(MEASURES)))
+    top = min(int(top), RANK_MAX_TOP)
+    if top < 1:
+        raise ValueError("At least one node has to be returned, got top=%d" % top)
+    max_depth, limit = min(int(max_depth), MAX_TRAVERSAL_DEPTH), min(int(limit), MAX_TRAVERSAL_RESULTS)
+    key = ('ranked', node_key, rank, top, measures, max_depth, limit, graph, direction, tuple(edge_collections or ()))
+    # Any write to the expansion can change the ranking so the result is tagged like the whole expansion
+    tags = set()
+
+    async def ranked():
+        expansion = await get_k_hop_neighbors(node_key, max_depth, limit, graph, direction, edge_collections)
+        expansion = await _induced(expansion, graph, edge_collections)
+        tags.update(_graph_tags(expansion, graph, _collection(node_key), *(edge_collections or ())))
+        # A neighborhood expanded in both directions is ranked without regard to the direction of its edges
+        return await asyncio.get_running_loop().run_in_executor(
+            None, _rank, expansion, measures, rank, top, direction != 'ANY')
+    return await _cached('neighbors', key, ranked, lambda data: tags)
@@ -0,0 +1,204 @@
+"""
+Protocol of the /ws websocket. Every message is a JSON object with a type and, for everything but errors about
+unreadable messages, the id the client chose for the subscription it is about.
+
+Client to server
+    {"type": "expand", "id": "a", "node": "Tag/1", "depth": 1, "direction": "ANY", "edges": ["Related"], "limit": 500}
+    {"type": "path", "id": "b", "start": "Tag/1", "target": "Tag/9", "k": 3}
+    {"type": "depth", "id": "a", "depth": 2}
+    {"type": "crawl", "id": "c", "job": "<crawl job id>"}
+    {"type": "cancel", "id": "a"}
+
+Server to client
+    {"type": "batch", "id": "a", "seq": 0, "nodes": [...], "lines": [...]}
+    {"type": "done", "id": "a", "nodes": 120, "lines": 119}
+    {"type": "progress", "id": "c", "job": {...}}
+    {"type": "cancelled", "id": "a"}
+    {"type": "error", "id": "a", "message": "..."}
+
+Nodes and lines have the format of the HTTP endpoints and a batch only holds what the client has not been sent yet for
+that subscription, so increasing the depth of an expansion only sends the nodes further out.
+"""
+import asyncio
+
+from loguru import logger
+
+from database.graph import GraphAssembler
+
+# Seconds between two looks at a crawl job when pushing its progress
+CRAWL_POLL_INTERVAL = 1.0
+
+
+class Subscription:
+    """
+    A query a client subscribed to with the graph sent so far and the task streaming it
+    """
+
+    def __init__(self, sub_id, kind, options):
+        self.id = sub_id
+        self.kind = kind
+        self.options = options
+        self.graph = GraphAssembler()
+        self.task = None
+        self.seq = 0
+
+
+class GraphStream:
+    """
+    Subscriptions of one websocket connection. Each subscription streams on its own task so the connection keeps
+    reading messages, and cancels, while results are being sent.
+
+    :param send: coroutine function
+        sends a message dict to the client
+    :param expand: callable
+        expand(node_key, max_depth=, limit=, graph=, direction=, edge_collections=) returning a query and bind vars
+    :param paths: callable
+        paths(start_key, target_key, k=, max_depth=, graph=, direction=, edge_collections=) returning a query and
+        bind vars
+    :param stream: callable
+        stream(query, bind_vars, assembler) returning an async generator of (nodes, lines)
+    :param get_job: callable
+        returns the crawl job of an id or None
+    """
+
+    def __init__(self, send, expand, paths, stream, get_job=None, poll_interval=CRAWL_POLL_INTERVAL):
+        self.send = send
+        self.expand = expand
+        self.paths = paths
+        self.stream = stream
+        self.get_job = get_job
+        self.poll_interval = poll_interval
+        self.subscriptions = {}
+
+    async def handle(self, message):
+        """
+        Act on a message from the client. Invalid messages are answered with an error and never close the connection.
+
+        :param message: dict
+        """
+        if not isinstance(message, dict):
+            return await self.send({'type': 'error', 'id': None, 'message': 'Messages must be JSON objects'})
+        kind, sub_id = message.get('type'), message.get('id')
+        try:
+            if kind == 'cancel':
+                return await self.cancel(sub_id)
+            if sub_id is None:
+                raise ValueError("Message has no id")
+            if kind == 'expand':
+                options = {'node_key': message['node'], 'max_depth': int(message.get('depth', 1))}
+                options.update(self._traversal_options(message))
+                if message.get('limit'):
+                    options['limit'] = int(message['limit'])
+                return await self.subscribe(sub_id, 'expand', options)
+            if kind == 'path':
+                options = {'start_key': message['start'], 'target_key': message['target'],
+                           'k': int(message.get('k', 1))}
+                options.update(self._traversal_options(message))
+                if message.get('depth'):
+                    options['max_depth'] = int(message['depth'])
+                return await self.subscribe(sub_id, 'path', options)
+            if kind == 'depth':
+                return await self.deepen(sub_id, int(message['depth']))
+            if kind == 'crawl':
+                job = message['job']
+                await self.cancel(sub_id, notify=False)
+                return self._start(Subscription(sub_id, 'crawl', {'job': job}))
+            raise ValueError("Unknown message type %s" % kind)
+        except (KeyError, TypeError, ValueError) as e:
+            error = 'Missing field %s' % e if isinstance(e, KeyError) else str(e)
+            await self.send({'type': 'error', 'id': sub_id, 'message': error})
+
+    @staticmethod
+    def _traversal_options(message):
+        options = {}
+        for field, option in [('graph', 'graph'), ('direction', 'direction')]:
+            if message.get(field):
+                options[option] = message[field]
+        edges = message.get('edges')
+        if edges:
+            # A list or a comma separated string like the edges field of the HTTP endpoints
+            options['edge_collections'] = [e.strip() for e in edges.split(',')] if isinstance(edges, str) else edges
+        return options
+
+    async def subscribe(self, sub_id, kind, options):
+        # Building the query validates the options before anything is streamed
+        (self.expand if kind == 'expand' else self.paths)(**options)
+        await self.cancel(sub_id, notify=False)
+        self._start(Subscription(sub_id, kind, options))
+
+    async def deepen(self, sub_id, depth):
+        """
+        Expand an expansion further out, keeping what was already sent
+        """
+        subscription = self.subscriptions.get(sub_id)
+        if subscription is None or subscription.kind != 'expand':
+            raise ValueError("No expansion %s to deepen" % sub_id)
+        if depth <= subscription.options['max_depth']:
+            raise ValueError("Depth can only increase, %s is already at %d" % (
+                sub_id, subscription.options['max_depth']))
+        await self._stop(subscription)
+        subscription.options['max_depth'] = depth
+        self._start(subscription)
+
+    async def cancel(self, sub_id, notify=True):
+        subscription = self.subscriptions.pop(sub_id, None)
+        if subscription is None:
+            return
+        await self._stop(subscription)
+        if notify:
+            await self.send({'type': 'cancelled', 'id': sub_id})
+
+    async def close(self):
+        """
+        Stop every subscription, called when the client disconnects
+        """
+        for sub_id in list(self.subscriptions):
+            await self.cancel(sub_id, notify=False)
+
+    def _start(self, subscription):
+        self.subscriptions[subscription.id] = subscription
+        run = self._crawl if subscription.kind == 'crawl' else self._graph
+        subscription.task = asyncio.ensure_future(run(subscription))
+
+    async def _stop(self, subscription):
+        task = subscription.task
+        if task is not None and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def _graph(self, subscription):
+        build = self.expand if subscription.kind == 'expand' else self.paths
+        try:
+            query, bind_vars = build(**subscription.options)
+            async for nodes, lines in self.stream(query, bind_vars, subscription.graph):
+                # The assembler already holds the batch so it must reach the client even if the task is cancelled
+                await asyncio.shield(self.send({
+                    'type': 'batch', 'id': subscription.id, 'seq': subscription.seq, 'nodes': nodes, 'lines': lines}))
+                subscription.seq += 1
+            graph = subscription.graph.graph()
+            await self.send({'type': 'done', 'id': subscription.id, 'nodes': len(graph['nodes']),
+                             'lines': len(graph['lines'])})
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error("Streaming %s %s failed: %s" % (subscription.kind, subscription.id, e))
+            await self.send({'type': 'error', 'id': subscription.id, 'message': str(e)})
+
+    async def _crawl(self, subscription):
+        last = None
+        while True:
+            job = self.get_job(subscription.options['job']) if self.get_job else None
+            if job is None:
+                await self.send({'type': 'error', 'id': subscription.id,
+                                 'message': "No crawl job %s" % subscription.options['job']})
+                return
+            state = job.to_dict()
+            if state != last:
+                await self.send({'type': 'progress', 'id': subscription.id, 'job': state})
+                last = state
+            if not job.active:
+                return
+            await asyncio.sleep(self.poll_interval)
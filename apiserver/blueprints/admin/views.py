@@ -1,58 +1,384 @@
-import asyncio
-import threading
-from quart import Blueprint, jsonify, websocket, request
-
-from apiserver.blueprints.admin.models import get_suggestions, get_neighbors
-from collector.web_driver import scroll
-
-
-admin = Blueprint('admin', __name__)
-
-
-@admin.route('/')
-async def home():
-    data = await request.get_json()
-    return jsonify(response=200, message="Base end point", data=data)
-
-
-@admin.route('/get_suggestion_items', methods=['POST'])
-async def get_suggestion_items():
-    req = (await request.form).to_dict()['searchterms']
-    data = get_suggestions(search_term=req)
-    # TODO Kick off thread for collection based on search
-    crawl = threading.Thread(
-        target=scroll, kwargs={'search_ids': [req]})
-    crawl.start()
-    return jsonify(
-        response=200,
-        message="Search for {req} resulted in {count} items".format(req=req, count=len(data)),
-        data=data)
-
-
-@admin.route('/get_neighbors_index', methods=['POST'])
-async def get_neighbors_index():
-    req = (await request.form).to_dict()['nodekey']
-    data = await get_neighbors(node_key=req)
-    return jsonify(
-        response=200,
-        message="{count} neighbors found for {req}".format(count=len(data['nodes']), req=req),
-        data=data)
-
-
-@admin.route('/get_shortest_path', methods=['POST'])
-async def get_shortest_path():
-    form = (await request.form).to_dict()['nodekey']
-    data = get_neighbors(node_key=form)
-    return jsonify(response=200, message="Non Async for search fields", data=data)
-
-
-@admin.websocket("/ws")
-async def ws():
-    print(websocket.headers)
-    while True:
-        try:
-            data = await websocket.receive()
-            await websocket.send(f"Echo {data}")
-        except asyncio.CancelledError:
-            # Handle disconnect
-            raise
+import asyncio
+import os
+import time
+from loguru import logger
+from quart import Blueprint, Response, g, jsonify, websocket, request
+
+from apiserver.resources import resources
+from apiserver.blueprints.admin.models import (
+    get_suggestions, get_suggestions_page, get_neighbors, get_neighbors_page, get_neighbors_batch, get_paths,
+    get_k_hop_neighbors, get_ranked_neighbors, prepare_queries, close_cursors, cache, client, cursors, flights,
+    TYPEAHEAD_LIMIT, RANK_TOP, PAGE_SIZE, k_hop_query, paths_query, stream_graph, adjacency, adjacency_index)
+from apiserver.blueprints.admin.stream import GraphStream
+from apiserver.blueprints.admin.wire import graph_response
+from collector.driver_pool import DriverPool
+from collector.engines import get_engine, DEFAULT_ENGINE
+from collector.sink import ArangoGraphSink
+from collector.scheduler import CrawlScheduler, QueueFull, SchedulerStopped, NORMAL, LOW
+from collector.seen import SeenStore
+from database.cursors import CursorExpired
+from monitoring.metrics import (
+    REGISTRY, REQUEST_SECONDS, CRAWL_JOBS, CACHE_STATS, DRIVER_POOL, ADJACENCY_STATS, CURSOR_STATS, SINGLE_FLIGHT_STATS,
+    SEEN_STATS, add_slow_query_log)
+
+
+admin = Blueprint('admin', __name__)
+
+
+CRAWL_WORKERS = int(os.environ.get('CRAWL_WORKERS', 2))
+# Seconds running crawls are given to finish on shutdown before they are given up on
+CRAWL_STOP_TIMEOUT = float(os.environ.get('CRAWL_STOP_TIMEOUT', 30))
+
+# Queries slower than SLOW_QUERY_SECONDS are written to this file as well as the regular log once the app serves
+SLOW_QUERY_LOG = os.environ.get('SLOW_QUERY_LOG')
+_slow_query_log = None
+
+
+def _new_driver():
+    from collector.web_driver import new_driver
+    return new_driver()
+
+
+def _new_pool():
+    return DriverPool(
+        _new_driver,
+        size=CRAWL_WORKERS,
+        max_pages=int(os.environ.get('CRAWL_DRIVER_MAX_PAGES', 50)),
+        max_memory=float(os.environ.get('CRAWL_DRIVER_MAX_MEMORY_MB', 1024))
+    )
+
+
+# Warm browser sessions the crawls borrow, one per worker. The browsers are only started once the chrome engine needs
+# one and are quit after the crawler has stopped
+resources.register('browsers', _new_pool, close=DriverPool.close)
+drivers = resources.proxy('browsers')
+
+
+# Posts read by earlier crawls, kept on disk so a recrawl only writes what is new or changed. An empty CRAWL_SEEN_DB
+# turns it off and every crawl writes every post it reads
+CRAWL_SEEN_DB = os.environ.get('CRAWL_SEEN_DB', 'crawl_seen.sqlite3')
+# Searches last crawled longer ago than RECRAWL_AFTER seconds are crawled again, looked for every RECRAWL_CHECK seconds.
+# 0 never recrawls
+RECRAWL_AFTER = float(os.environ.get('RECRAWL_AFTER', 0))
+RECRAWL_CHECK = float(os.environ.get('RECRAWL_CHECK', 60))
+RECRAWL_BATCH = int(os.environ.get('RECRAWL_BATCH', 10))
+_recrawler = None
+
+if CRAWL_SEEN_DB:
+    resources.register('seen', lambda: SeenStore(CRAWL_SEEN_DB), close=SeenStore.close)
+    seen = resources.proxy('seen')
+else:
+    seen = None
+
+
+def crawl_to_db(search_ids=None, progress=None):
+    """
+    Crawl the search terms and write what is found to the database as the crawl runs
+    """
+    with ArangoGraphSink(client.db) as sink:
+        return get_engine(DEFAULT_ENGINE, pool=drivers)(graph=sink, search_ids=search_ids, progress=progress,
+                                                        seen=seen)
+
+
+# Crawls started by searches share a fixed number of browsers, the rest wait in a bounded queue
+crawler = CrawlScheduler(
+    crawl_to_db,
+    workers=CRAWL_WORKERS,
+    max_queue=int(os.environ.get('CRAWL_QUEUE_SIZE', 50))
+)
+
+
+def _start_crawler():
+    crawler.start()
+    return crawler
+
+
+resources.register('crawler', _start_crawler, close=lambda scheduler: scheduler.stop(CRAWL_STOP_TIMEOUT))
+
+
+@admin.before_app_serving
+async def startup():
+    global _recrawler, _slow_query_log
+    start = time.perf_counter()
+    if SLOW_QUERY_LOG and _slow_query_log is None:
+        _slow_query_log = add_slow_query_log(SLOW_QUERY_LOG)
+    timings = await resources.startup()
+    await prepare_queries()
+    # The adjacency of the graphs held in memory loads in the background, the database answers until it is ready
+    for graph in adjacency:
+        adjacency_index(graph)
+    if seen is not None and RECRAWL_AFTER > 0:
+        _recrawler = asyncio.ensure_future(recrawl())
+    logger.info("Ready to serve in %.1f ms (%s)" % (
+        (time.perf_counter() - start) * 1000, ', '.join('%s %.1f ms' % item for item in timings.items())))
+
+
+@admin.after_app_serving
+async def shutdown():
+    global _slow_query_log
+    if _recrawler is not None:
+        _recrawler.cancel()
+    if resources.started('arango'):
+        await close_cursors()
+    # Running crawls finish or are given up on before the browsers they use are quit and the database is closed
+    await resources.shutdown()
+    if _slow_query_log is not None:
+        logger.remove(_slow_query_log)
+        _slow_query_log = None
+
+
+async def recrawl():
+    """
+    Queue the searches that are due for a refresh behind the crawls users asked for, for as long as the app serves
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            for term in await loop.run_in_executor(None, seen.claim_due, RECRAWL_AFTER, RECRAWL_BATCH):
+                _submit_crawl(term, LOW)
+        except Exception as e:
+            logger.error("Could not queue the searches due for a recrawl: %s" % e)
+        await asyncio.sleep(RECRAWL_CHECK)
+
+
+@admin.before_app_request
+async def start_timer():
+    g.request_start = time.perf_counter()
+
+
+@admin.after_app_request
+async def record_latency(response):
+    start = getattr(g, 'request_start', None)
+    if start is not None:
+        # The rule rather than the path so requests for different nodes share a series
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        REQUEST_SECONDS.observe(
+            time.perf_counter() - start, method=request.method, route=route, status=response.status_code)
+    return response
+
+
+def _set_gauges(gauge, stats, **labels):
+    for stat, value in stats.items():
+        if isinstance(value, (int, float)):
+            gauge.set(value, stat=stat, **labels)
+
+
+@admin.route('/metrics')
+async def metrics():
+    """
+    Every metric in the Prometheus text format, the pool and queue states are read when scraped
+    """
+    _set_gauges(CRAWL_JOBS, crawler.stats())
+    _set_gauges(CACHE_STATS, cache.stats())
+    _set_gauges(CURSOR_STATS, cursors.stats())
+    _set_gauges(SINGLE_FLIGHT_STATS, flights.stats())
+    if resources.started('browsers'):
+        _set_gauges(DRIVER_POOL, drivers.stats())
+    if resources.started('seen'):
+        _set_gauges(SEEN_STATS, seen.stats())
+    for graph, index in adjacency.items():
+        _set_gauges(ADJACENCY_STATS, index.stats(), graph=graph)
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+
+@admin.route('/')
+async def home():
+    data = await request.get_json()
+    return jsonify(response=200, message="Base end point", data=data)
+
+
+def _submit_crawl(term, priority):
+    try:
+        return crawler.submit(term, priority=priority).to_dict()
+    except (QueueFull, SchedulerStopped) as e:
+        logger.warning("Crawl for {} refused: {}", term, e)
+        return None
+
+
+def _paged(form):
+    # A page size or a continuation token asks for one page of the result
+    return bool(form.get('pagesize') or form.get('pagetoken'))
+
+
+@admin.route('/get_suggestion_items', methods=['POST'])
+async def get_suggestion_items():
+    form = (await request.form).to_dict()
+    if _paged(form):
+        return await get_suggestion_page(form)
+    req = form['searchterms']
+    mode = form.get('mode', 'exact')
+    try:
+        priority = int(form.get('priority', NORMAL))
+        data = await get_suggestions(search_term=req, mode=mode, limit=int(form.get('limit', TYPEAHEAD_LIMIT)))
+    except ValueError as e:
+        return jsonify(response=400, message=str(e)), 400
+    # Typeahead runs on every keystroke so only complete searches are crawled
+    crawl = _submit_crawl(req, priority) if mode == 'exact' else None
+    return jsonify(
+        response=200,
+        message="Search for {req} resulted in {count} items".format(req=req, count=len(data)),
+        data=data,
+        crawl=crawl)
+
+
+async def get_suggestion_page(form):
+    """
+    One page of an exact search, the next field of the answer is the pagetoken of the following page
+    """
+    req = form.get('searchterms')
+    try:
+        if form.get('mode', 'exact') != 'exact':
+            raise ValueError("Only exact searches are paged")
+        if not form.get('pagetoken') and not req:
+            raise ValueError("The first page needs searchterms")
+        priority = int(form.get('priority', NORMAL))
+        data, token = await get_suggestions_page(
+            search_term=req, page_size=form.get('pagesize') or PAGE_SIZE, token=form.get('pagetoken'))
+    except ValueError as e:
+        return jsonify(response=400, message=str(e)), 400
+    except CursorExpired as e:
+        return jsonify(response=410, message=str(e)), 410
+    # The crawl is started by the first page only
+    crawl = _submit_crawl(req, priority) if not form.get('pagetoken') else None
+    return jsonify(
+        response=200,
+        message="Page of {count} items{more}".format(count=len(data), more=" with more to come" if token else ""),
+        data=data,
+        crawl=crawl,
+        next=token)
+
+
+@admin.route('/get_crawl_status', methods=['POST'])
+async def get_crawl_status():
+    form = (await request.form).to_dict()
+    if not form.get('jobid'):
+        # The browsers are not started only to report that none of them are open
+        browsers = drivers.stats() if resources.started('browsers') else dict(
+            size=CRAWL_WORKERS, open=0, idle=0, started=0, recycled=0)
+        return jsonify(response=200, message="Crawl scheduler status", data=dict(crawler.stats(), browsers=browsers))
+    job = crawler.get(form['jobid'])
+    if job is None:
+        return jsonify(response=404, message="No crawl job {}".format(form['jobid'])), 404
+    return jsonify(response=200, message="Crawl for {} is {}".format(job.term, job.status), data=job.to_dict())
+
+
+@admin.route('/get_neighbors_index', methods=['POST'])
+async def get_neighbors_index():
+    form = (await request.form).to_dict()
+    if _paged(form):
+        return await get_neighbors_index_page(form)
+    req = form['nodekey']
+    data = await get_neighbors(node_key=req)
+    return graph_response("{count} neighbors found for {req}".format(count=len(data['nodes']), req=req), data)
+
+
+async def get_neighbors_index_page(form):
+    """
+    One page of the neighbors of a node, the next field of the answer is the pagetoken of the following page
+    """
+    try:
+        if not form.get('pagetoken') and not form.get('nodekey'):
+            raise ValueError("The first page needs a nodekey")
+        data, token = await get_neighbors_page(
+            node_key=form.get('nodekey'), page_size=form.get('pagesize') or PAGE_SIZE, token=form.get('pagetoken'))
+    except ValueError as e:
+        return jsonify(response=400, message=str(e)), 400
+    except CursorExpired as e:
+        return jsonify(response=410, message=str(e)), 410
+    return graph_response("Page of {count} neighbors{more}".format(
+        count=len(data['nodes']), more=" with more to come" if token else ""), data, next=token)
+
+
+@admin.route('/get_neighbors_batch', methods=['POST'])
+async def get_neighbors_batch_index():
+    form = (await request.form).to_dict()
+    node_keys = [k.strip() for k in form.get('nodekeys', '').split(',')]
+    try:
+        data = await get_neighbors_batch(node_keys)
+    except ValueError as e:
+        return jsonify(response=400, message=str(e)), 400
+    return graph_response("{count} neighbors found for {seeds} nodes".format(
+        count=len(data['nodes']), seeds=len(set(filter(None, node_keys)))), data)
+
+
+def traversal_options(form):
+    """
+    Read the optional traversal settings shared by the path endpoints from a request form. Edge collections are
+    given as a comma separated list.
+    """
+    options = {}
+    for field, option in [('graph', 'graph'), ('direction', 'direction'), ('depth', 'max_depth')]:
+        if form.get(field):
+            options[option] = form[field]
+    if form.get('edges'):
+        options['edge_collections'] = [e.strip() for e in form['edges'].split(',') if e.strip()]
+    return options
+
+
+@admin.route('/get_shortest_path', methods=['POST'])
+async def get_shortest_path():
+    form = (await request.form).to_dict()
+    try:
+        data = await get_paths(
+            start_key=form['nodekey'], target_key=form['targetkey'], k=form.get('k', 1), **traversal_options(form))
+    except ValueError as e:
+        return jsonify(response=400, message=str(e)), 400
+    return graph_response("{count} nodes on the paths from {start} to {target}".format(
+        count=len(data['nodes']), start=form['nodekey'], target=form['targetkey']), data)
+
+
+@admin.route('/get_k_hop_neighbors', methods=['POST'])
+async def get_k_hop():
+    form = (await request.form).to_dict()
+    options = traversal_options(form)
+    if form.get('limit'):
+        options['limit'] = form['limit']
+    try:
+        data = await get_k_hop_neighbors(node_key=form['nodekey'], **options)
+    except ValueError as e:
+        return jsonify(response=400, message=str(e)), 400
+    return graph_response("{count} nodes found within {depth} hops of {req}".format(
+        count=len(data['nodes']), depth=options.get('max_depth', 2), req=form['nodekey']), data)
+
+
+@admin.route('/get_ranked_neighbors', methods=['POST'])
+async def get_ranked():
+    form = (await request.form).to_dict()
+    options = traversal_options(form)
+    if form.get('limit'):
+        options['limit'] = form['limit']
+    rank = form.get('rank', 'pagerank')
+    if form.get('measures'):
+        options['measures'] = [m.strip() for m in form['measures'].split(',') if m.strip()]
+    try:
+        data = await get_ranked_neighbors(
+            node_key=form['nodekey'], rank=rank, top=form.get('top', RANK_TOP), **options)
+    except ValueError as e:
+        return jsonify(response=400, message=str(e)), 400
+    return graph_response("Top {count} nodes by {rank} within {depth} hops of {req}".format(
+        count=len(data['nodes']), rank=rank, depth=options.get('max_depth', 2), req=form['nodekey']), data)
+
+
+@admin.route('/get_cache_stats')
+async def get_cache_stats():
+    return jsonify(response=200, message="Result cache statistics", data=cache.stats())
+
+
+@admin.websocket("/ws")
+async def ws():
+    """
+    Stream node expansions, paths and crawl progress, see apiserver.blueprints.admin.stream for the protocol
+    """
+    session = GraphStream(
+        websocket.send_json, expand=k_hop_query, paths=paths_query, stream=stream_graph, get_job=crawler.get)
+    try:
+        while True:
+            try:
+                message = await websocket.receive_json()
+            except ValueError as e:
+                await websocket.send_json({'type': 'error', 'id': None, 'message': "Message is not JSON: %s" % e})
+                continue
+            await session.handle(message)
+    finally:
+        # Runs on disconnect too, when the receive is cancelled
+        await session.close()
@@ -0,0 +1,77 @@
+"""
+Formats the graph endpoints answer in, chosen with the Accept header of the request.
+
+    application/json                          nodes and lines as full objects, the default
+    application/vnd.graph.columnar+json       database.graph.columnar, encoded with orjson when it is installed
+    application/vnd.graph.columnar+msgpack    database.graph.columnar as MessagePack, when msgpack is installed
+
+The columnar formats write every node id once and edges as integer positions in the id table, which makes large
+graphs several times smaller and faster to encode.
+"""
+import json
+import time
+
+from quart import Response, jsonify, request
+
+from database.graph import columnar
+from monitoring.metrics import RESPONSE_ENCODE_SECONDS
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON = 'application/json'
+COLUMNAR_JSON = 'application/vnd.graph.columnar+json'
+COLUMNAR_MSGPACK = 'application/vnd.graph.columnar+msgpack'
+
+
+def formats():
+    """
+    :return: list
+        mimetypes that can be produced, in order of preference when the client accepts several equally
+    """
+    available = [JSON, COLUMNAR_JSON]
+    if msgpack is not None:
+        available.append(COLUMNAR_MSGPACK)
+    return available
+
+
+def dumps(value):
+    """
+    :return: bytes
+        compact JSON of a value, encoded with orjson when it is installed
+    """
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, separators=(',', ':')).encode('utf-8')
+
+
+def graph_response(message, data, **fields):
+    """
+    Answer with a graph in the format the client prefers
+
+    :param message: str
+    :param data: dict
+        graph with index, nodes and lines
+    :param fields:
+        other values sent next to the graph such as the token of the next page
+    :return: quart.Response
+    """
+    mimetype = request.accept_mimetypes.best_match(formats(), default=JSON)
+    start = time.perf_counter()
+    if mimetype == JSON:
+        response = jsonify(response=200, message=message, data=data, **fields)
+    else:
+        body = dict(fields, response=200, message=message, data=columnar(data))
+        payload = msgpack.packb(body, use_bin_type=True) if mimetype == COLUMNAR_MSGPACK else dumps(body)
+        response = Response(payload, mimetype=mimetype)
+    RESPONSE_ENCODE_SECONDS.observe(time.perf_counter() - start, format=mimetype)
+    # Caches must keep the formats apart
+    response.headers['Vary'] = 'Accept'
+    return response
@@ -0,0 +1,109 @@
+"""
+Registry of the expensive resources the API server uses such as the database connection and the crawler. Nothing is
+created when a module registers a resource, it is created the first time it is used or when the app starts serving,
+so importing the app never touches the network and tests can import the views without a database.
+
+    resources.register('arango', connect, close=lambda client: client.close())
+    client = resources.proxy('arango')
+    await resources.startup()
+"""
+import asyncio
+import threading
+import time
+
+from loguru import logger
+
+
+class Resources:
+    """
+    Lazily created named resources. Resources are created at most once, by get or startup, and closed in the reverse
+    order they were registered so a resource is closed before the ones registered ahead of it that it may depend on.
+    The time each one took to create is kept in milliseconds.
+    """
+
+    def __init__(self):
+        self._factories = {}
+        self._closers = {}
+        self._instances = {}
+        self._lock = threading.RLock()
+        self.timings = {}
+
+    def register(self, name, factory, close=None):
+        """
+        :param name: str
+        :param factory: callable
+            creates the resource, called without arguments
+        :param close: callable
+            called with the resource on shutdown
+        """
+        with self._lock:
+            self._factories[name] = factory
+            self._closers[name] = close
+
+    def get(self, name):
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+        with self._lock:
+            if name not in self._instances:
+                start = time.perf_counter()
+                self._instances[name] = self._factories[name]()
+                self.timings[name] = (time.perf_counter() - start) * 1000
+                logger.info("Started %s in %.1f ms" % (name, self.timings[name]))
+            return self._instances[name]
+
+    def started(self, name):
+        return name in self._instances
+
+    def proxy(self, name):
+        return LazyResource(self, name)
+
+    async def startup(self, *names):
+        """
+        Create the resources, all registered ones by default, on a worker thread so the event loop keeps running
+
+        :return: dict
+            milliseconds each resource took to create
+        """
+        loop = asyncio.get_running_loop()
+        for name in names or list(self._factories):
+            await loop.run_in_executor(None, self.get, name)
+        return dict(self.timings)
+
+    async def shutdown(self):
+        """
+        Close every resource that was created, the most recently registered first. A resource that fails to close is
+        logged and the others are still closed.
+        """
+        loop = asyncio.get_running_loop()
+        for name in reversed(list(self._factories)):
+            with self._lock:
+                instance = self._instances.pop(name, None)
+            close = self._closers.get(name)
+            if instance is None or close is None:
+                continue
+            try:
+                await loop.run_in_executor(None, close, instance)
+                logger.info("Closed %s" % name)
+            except Exception as e:
+                logger.error("Could not close %s: %s" % (name, e))
+
+
+class LazyResource:
+    """
+    Stand in for a registered resource that creates it on first attribute access, so module level names such as
+    models.client keep working while the connection is only made when it is first needed
+    """
+
+    def __init__(self, registry, name):
+        self._registry = registry
+        self._name = name
+
+    def __getattr__(self, attr):
+        return getattr(self._registry.get(self._name), attr)
+
+    def __repr__(self):
+        return '<LazyResource %s%s>' % (self._name, '' if self._registry.started(self._name) else ' (not started)')
+
+
+resources = Resources()
@@ -0,0 +1,76 @@
+"""
+Production entry point, the app served by Hypercorn from several worker processes. run.py stays the single process
+development server.
+
+    python -m apiserver.serve --workers 4 --bind 0.0.0.0:5000
+
+Every worker is a process of its own that imports and creates the app, so each one has its own database connection
+pool, result cache, crawl scheduler and browsers, sized by the same settings as a single process. The workers share
+the listening socket and the operating system hands each new connection to one of them.
+
+On SIGTERM or SIGINT the workers stop accepting connections and wait up to the graceful timeout for the requests in
+flight to finish. The app then shuts down as it does in development: open cursors are closed, queued crawls are
+cancelled and running ones given CRAWL_STOP_TIMEOUT seconds, the browsers are quit and the database connections
+closed, see views.shutdown.
+
+State kept in memory is per worker. Page tokens are only known to the worker that issued them and answer 410 on
+another one, clients paging through a result should keep their connection alive or be routed to the same worker.
+"""
+import argparse
+import os
+import sys
+
+from hypercorn.config import Config
+from hypercorn.run import run
+
+APP = 'apiserver.app:create_app()'
+BIND = os.environ.get('BIND', '127.0.0.1:5000')
+WORKERS = int(os.environ.get('WORKERS', os.cpu_count() or 1))
+GRACEFUL_TIMEOUT = float(os.environ.get('GRACEFUL_TIMEOUT', 30))
+KEEP_ALIVE = float(os.environ.get('KEEP_ALIVE_TIMEOUT', 5))
+
+
+def config(app=APP, bind=BIND, workers=WORKERS, graceful_timeout=GRACEFUL_TIMEOUT, keep_alive=KEEP_ALIVE,
+           access_log=None):
+    """
+    :param app: str
+        module:attribute of the ASGI app, an attribute ending in () is called to create it
+    :param bind: str or list of str
+        host:port to listen on
+    :param workers: int
+        worker processes
+    :param graceful_timeout: float
+        seconds the requests in flight are given to finish on shutdown
+    :param keep_alive: float
+        seconds an idle connection is kept open
+    :param access_log: str
+        file the requests are logged to, - for stderr
+    :return: hypercorn.config.Config
+    """
+    if workers < 1:
+        raise ValueError("At least one worker is needed, got %d" % workers)
+    settings = Config()
+    settings.application_path = app
+    settings.bind = [bind] if isinstance(bind, str) else list(bind)
+    settings.workers = workers
+    settings.graceful_timeout = graceful_timeout
+    settings.keep_alive_timeout = keep_alive
+    settings.accesslog = access_log
+    return settings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--app', default=APP)
+    parser.add_argument('--bind', action='append', help='host:port, repeat to listen on several (default %s)' % BIND)
+    parser.add_argument('--workers', type=int, default=WORKERS)
+    parser.add_argument('--graceful-timeout', type=float, default=GRACEFUL_TIMEOUT)
+    parser.add_argument('--keep-alive', type=float, default=KEEP_ALIVE)
+    parser.add_argument('--access-log', help='file to log requests to, - for stderr')
+    options = parser.parse_args(argv)
+    return run(config(options.app, options.bind or BIND, options.workers, options.graceful_timeout,
+                      options.keep_alive, options.access_log))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,100 @@
+"""
+Time the assembly of a neighborhood from traversal rows for hubs of 10 to 1M neighbors.
+
+    python -m benchmarks.bench_graph_assembly
+
+The time per row should stay flat as the neighborhood grows. The list based loop that get_neighbors used before is
+timed as well up to the size where its quadratic cost is still bearable.
+"""
+import gc
+import sys
+import time
+
+from database.graph import GraphAssembler
+
+SIZES = [10, 100, 1000, 10000, 100000, 1000000]
+LEGACY_MAX = 10000
+BATCH_SIZE = 5000
+
+
+def rows(n):
+    # A hub connected to n neighbors, every tenth neighbor also over a parallel edge
+    for i in range(n):
+        v = {'_id': 'Tag/%d' % i, '_key': str(i), '_rev': '_a', 'name': 'tag %d' % i}
+        yield {'v': v, 'e': {'_id': 'Related/%d' % i, '_from': 'Tag/hub', '_to': v['_id']}}
+        if i % 10 == 0:
+            yield {'v': dict(v), 'e': {'_id': 'Related/p%d' % i, '_from': 'Tag/hub', '_to': v['_id']}}
+
+
+def batches(n):
+    batch = []
+    for r in rows(n):
+        batch.append(r)
+        if len(batch) == BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def legacy(results):
+    graph = {'index': [], 'nodes': [], 'lines': []}
+    for r in results:
+        if 'v' in list(r.keys()):
+            if r['v']['_id'] not in graph['index']:
+                node = r['v']
+                node['key'] = r['v']['_id']
+                node.pop('_rev')
+                node.pop('_key')
+                node.pop('_id')
+                graph['index'].append(node['key'])
+                graph['nodes'].append(node)
+        if 'e' in list(r.keys()):
+            edge = {
+                'source': r['e']['_from'],
+                'target': r['e']['_to'],
+                'label': str(r['e']['_id'])[:str(r['e']['_id']).find('/')]}
+            graph['lines'].append(edge)
+    return graph
+
+
+def assemble(data):
+    graph = GraphAssembler()
+    for batch in data:
+        graph.add(batch)
+    return graph.graph()
+
+
+def assemble_legacy(data):
+    return legacy([r for batch in data for r in batch])
+
+
+def timed(fn, n):
+    data = list(batches(n))
+    # Keep the cyclic collector out of the timing, it scans every live row and would dominate the large sizes
+    gc.collect()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        fn(data)
+        return time.perf_counter() - start
+    finally:
+        gc.enable()
+
+
+def main(sizes=SIZES):
+    print('%10s %14s %14s %14s' % ('neighbors', 'assembler s', 'ns/neighbor', 'legacy s'))
+    per_row = []
+    for n in sizes:
+        elapsed = timed(assemble, n)
+        per_row.append(elapsed / n * 1e9)
+        legacy_elapsed = '%14.4f' % timed(assemble_legacy, n) if n <= LEGACY_MAX else '%14s' % '-'
+        print('%10d %14.4f %14.1f %s' % (n, elapsed, per_row[-1], legacy_elapsed))
+    # Ignore the smallest sizes where fixed costs dominate and check the cost per neighbor does not grow with n
+    steady = per_row[2:] or per_row
+    print('ns/neighbor spread from %d to %d neighbors: %.2fx' % (sizes[-len(steady)], sizes[-1],
+                                                                max(steady) / min(steady)))
+
+
+if __name__ == '__main__':
+    main([int(a) for a in sys.argv[1:]] or SIZES)
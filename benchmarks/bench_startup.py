@@ -0,0 +1,38 @@
+"""
+Time the cold start of the API server, from a fresh interpreter to an app ready to serve.
+
+    python -m benchmarks.bench_startup [runs]
+
+Every run starts a new python process that imports the app and calls create_app, the same work run.py does before
+it starts serving. Nothing in that path may touch the network so the times should stay in the low hundreds of
+milliseconds whether or not ArangoDB is reachable.
+"""
+import os
+import statistics
+import subprocess
+import sys
+
+RUNS = 10
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+COLD_START = '''
+import time
+started = time.perf_counter()
+from apiserver import app
+app.create_app()
+print((time.perf_counter() - started) * 1000)
+'''
+
+
+def cold_start():
+    out = subprocess.run([sys.executable, '-c', COLD_START], cwd=ROOT, check=True, capture_output=True, text=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def main(runs=RUNS):
+    times = [cold_start() for _ in range(runs)]
+    print('%6s %10s %10s %10s' % ('runs', 'min ms', 'median ms', 'max ms'))
+    print('%6d %10.1f %10.1f %10.1f' % (runs, min(times), statistics.median(times), max(times)))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else RUNS)
@@ -0,0 +1,229 @@
+"""
+Benchmark the read endpoints, the models behind them and the bulk loader on a synthetic power law graph held by the
+in-memory ArangoDB stand-in, so no server or dataset is needed.
+
+    python -m benchmarks.bench_suite --nodes 100000 --output before.json
+    python -m benchmarks.bench_suite --nodes 100000 --output after.json --compare before.json
+
+Every scenario is run the given number of times with the given number of calls in flight and reports latency
+percentiles in milliseconds and throughput in calls per second. Results are written as JSON with the commit they were
+measured on so runs can be compared between commits.
+"""
+import argparse
+import asyncio
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+
+from loguru import logger
+
+from apiserver.app import create_app
+from apiserver.blueprints.admin import models
+from apiserver.resources import resources
+from benchmarks.fake_arango import FakeDatabase
+from benchmarks.synthetic import power_law_graph, hubs
+from database.adjacency import AdjacencyIndex, numpy
+from database.aql import DEFAULT_GRAPH
+from database.async_arango import AsyncDatabase
+from database.bulk import BulkLoader
+
+NODE_COLLECTION = 'Tag'
+EDGE_COLLECTION = 'Related'
+
+
+def percentiles(latencies):
+    """
+    :param latencies: list of float
+        seconds
+    :return: dict
+        mean, p50, p90, p99 and max in milliseconds
+    """
+    ordered = sorted(latencies)
+
+    def at(q):
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+    return {'mean_ms': sum(ordered) / len(ordered) * 1000, 'p50_ms': at(0.5), 'p90_ms': at(0.9),
+            'p99_ms': at(0.99), 'max_ms': ordered[-1] * 1000}
+
+
+async def scenario(call, arguments, concurrency):
+    """
+    Run call once for each item of arguments with at most concurrency calls in flight
+
+    :param call: coroutine function
+    :param arguments: list
+        argument of each call
+    :return: dict
+        latency percentiles, calls and calls per second
+    """
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def timed(argument):
+        async with semaphore:
+            start = time.perf_counter()
+            await call(argument)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[timed(argument) for argument in arguments])
+    elapsed = time.perf_counter() - start
+    return dict(percentiles(latencies), calls=len(latencies), calls_per_sec=len(latencies) / elapsed)
+
+
+def load(db, nodes, edges, chunk_size):
+    loader = BulkLoader(db, chunk_size=chunk_size)
+    results = {}
+    for col, docs in ((NODE_COLLECTION, nodes), (EDGE_COLLECTION, edges)):
+        stats = loader.load(col, iter(docs))
+        results[col] = {'rows': stats['rows'], 'seconds': stats['seconds'], 'rows_per_sec': stats['rows_per_sec']}
+    return results
+
+
+async def run(db, nodes, options):
+    rng = random.Random(options.seed)
+    keys = ['%s/%s' % (NODE_COLLECTION, d['_key']) for d in nodes]
+    hub_keys = ['%s/%s' % (NODE_COLLECTION, k) for k in hubs(nodes)]
+    names = [d['name'] for d in nodes]
+    n = options.requests
+
+    def sample(values):
+        return [rng.choice(values) for _ in range(n)]
+
+    def prefixes():
+        return [name[:rng.randint(1, 5)] for name in sample(names)]
+
+    def uncached(fn):
+        async def call(argument):
+            models.cache.clear()
+            return await fn(argument)
+        return call
+
+    client = create_app().test_client()
+
+    def post(route, field, **form):
+        async def call(value):
+            response = await client.post(route, form=dict(form, **{field: value}))
+            await response.get_data()
+            if response.status_code != 200:
+                raise RuntimeError("%s answered %s" % (route, response.status_code))
+        return call
+
+    scenarios = {
+        'get_neighbors.random': (uncached(models.get_neighbors), sample(keys)),
+        'get_neighbors.hub': (uncached(models.get_neighbors), sample(hub_keys)),
+        'get_neighbors.cached': (models.get_neighbors, sample(hub_keys)),
+        'get_suggestions.exact': (uncached(models.get_suggestions), sample(names)),
+        'get_suggestions.typeahead': (uncached(lambda p: models.get_suggestions(p, mode='typeahead')), prefixes()),
+        'http.get_neighbors_index': (uncached(post('/get_neighbors_index', 'nodekey')), sample(keys)),
+        'http.get_neighbors_batch': (uncached(post('/get_neighbors_batch', 'nodekeys')),
+                                     [','.join(rng.sample(keys, 10)) for _ in range(n)]),
+        'http.get_suggestion_items.typeahead': (
+            uncached(post('/get_suggestion_items', 'searchterms', mode='typeahead')), prefixes())
+    }
+    scenarios['get_k_hop_neighbors.hub'] = (uncached(models.get_k_hop_neighbors), sample(hub_keys))
+    scenarios['get_ranked_neighbors.hub'] = (uncached(models.get_ranked_neighbors), sample(hub_keys))
+    results = {}
+    for name, (call, arguments) in scenarios.items():
+        results[name] = await scenario(call, arguments, options.concurrency)
+        logger.info("{} p50 {:.2f} ms", name, results[name]['p50_ms'])
+    if numpy is not None:
+        # The same expansions answered from the adjacency held in memory
+        models.adjacency[DEFAULT_GRAPH] = AdjacencyIndex(DEFAULT_GRAPH)
+        try:
+            await models.load_adjacency(DEFAULT_GRAPH)
+            for name in ('get_neighbors.random', 'get_neighbors.hub', 'get_k_hop_neighbors.hub'):
+                call, arguments = scenarios[name]
+                results[name + '.adjacency'] = await scenario(call, arguments, options.concurrency)
+        finally:
+            del models.adjacency[DEFAULT_GRAPH]
+    await resources.shutdown()
+    return results
+
+
+def commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report, baseline):
+    """
+    Print the ratios of a run to an earlier one, above 1 means slower latency or higher throughput
+    """
+    print('%-40s %12s %12s %8s %14s %14s %8s' % (
+        'scenario', 'base p50 ms', 'p50 ms', 'ratio', 'base calls/s', 'calls/s', 'ratio'))
+    for name, result in report['results'].items():
+        base = baseline['results'].get(name)
+        if not base:
+            continue
+        print('%-40s %12.3f %12.3f %8.2f %14.1f %14.1f %8.2f' % (
+            name, base['p50_ms'], result['p50_ms'], result['p50_ms'] / base['p50_ms'], base['calls_per_sec'],
+            result['calls_per_sec'], result['calls_per_sec'] / base['calls_per_sec']))
+    for col, stats in report['bulk_load'].items():
+        base = baseline.get('bulk_load', {}).get(col)
+        if base:
+            print('%-40s %14.0f rows/s %14.0f rows/s %8.2f' % (
+                'bulk load %s' % col, base['rows_per_sec'], stats['rows_per_sec'],
+                stats['rows_per_sec'] / base['rows_per_sec']))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--nodes', type=int, default=10000)
+    parser.add_argument('--edges-per-node', type=int, default=3)
+    parser.add_argument('--requests', type=int, default=200, help='calls per scenario')
+    parser.add_argument('--concurrency', type=int, default=8, help='calls in flight')
+    parser.add_argument('--chunk-size', type=int, default=10000, help='documents per bulk import')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--compare', help='results file of an earlier run to compare with')
+    options = parser.parse_args(argv)
+
+    logger.remove()
+    logger.add(sys.stderr, level='WARNING')
+    if resources.started('arango'):
+        raise RuntimeError("The database is already connected, run the suite in its own process")
+
+    start = time.perf_counter()
+    nodes, edges = power_law_graph(options.nodes, options.edges_per_node, seed=options.seed,
+                                   col=NODE_COLLECTION, edge_col=EDGE_COLLECTION)
+    generated = time.perf_counter() - start
+    db = FakeDatabase()
+    db.create_collection(NODE_COLLECTION)
+    db.create_collection(EDGE_COLLECTION, edge=True)
+    bulk_load = load(db, nodes, edges, options.chunk_size)
+    # Importing the app connects nothing, replacing the database before its first use is enough
+    resources.register('arango', lambda: AsyncDatabase(db), close=AsyncDatabase.close)
+    results = asyncio.run(run(db, nodes, options))
+
+    report = {
+        'commit': commit(),
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'params': vars(options),
+        'graph': {'nodes': len(nodes), 'edges': len(edges), 'seconds': generated},
+        'bulk_load': bulk_load,
+        'results': results
+    }
+    with open(options.output, 'w') as fd:
+        json.dump(report, fd, indent=2)
+    print('%-40s %10s %10s %10s %12s' % ('scenario', 'p50 ms', 'p90 ms', 'p99 ms', 'calls/s'))
+    for name, result in results.items():
+        print('%-40s %10.3f %10.3f %10.3f %12.1f' % (
+            name, result['p50_ms'], result['p90_ms'], result['p99_ms'], result['calls_per_sec']))
+    for col, stats in bulk_load.items():
+        print('bulk load %-30s %10d rows %12.0f rows/s' % (col, stats['rows'], stats['rows_per_sec']))
+    if options.compare:
+        with open(options.compare) as fd:
+            compare(report, json.load(fd))
+    return report
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""
+Compare the size and encoding time of the standard and columnar graph formats for graphs of 1k to 1M elements.
+
+    python -m benchmarks.bench_wire_format
+
+The standard format is encoded with the json module like Quart's jsonify, the columnar one with the encoder
+apiserver.blueprints.admin.wire uses, orjson when it is installed. Columnar times include the conversion.
+"""
+import gc
+import json
+import sys
+import time
+
+from apiserver.blueprints.admin import wire
+from database.graph import columnar
+
+SIZES = [1000, 10000, 100000, 1000000]
+
+
+def graph(n):
+    # n elements split between nodes and the edges of a scale free looking graph with long ids
+    nodes = n // 3
+    index = ['Article/%040d' % i for i in range(nodes)]
+    return {
+        'index': index,
+        'nodes': [{'key': key, 'description': 'article %d' % i, 'count': i % 100} for i, key in enumerate(index)],
+        'lines': [{'source': index[i % nodes], 'target': index[(i * 7 + 1) % nodes],
+                   'label': ('Posted', 'PostedOn', 'FromSearch')[i % 3]} for i in range(n - nodes)]
+    }
+
+
+def timed(fn, data):
+    gc.collect()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        payload = fn(data)
+        return time.perf_counter() - start, len(payload)
+    finally:
+        gc.enable()
+
+
+def standard(data):
+    return json.dumps({'response': 200, 'message': '', 'data': data}).encode('utf-8')
+
+
+def compact(data):
+    return wire.dumps({'response': 200, 'message': '', 'data': columnar(data)})
+
+
+def main(sizes=SIZES):
+    print('encoder: %s' % ('orjson' if wire.orjson is not None else 'json'))
+    print('%10s %12s %12s %12s %12s %8s %8s' % (
+        'elements', 'json MB', 'json s', 'columnar MB', 'columnar s', 'size x', 'time x'))
+    for n in sizes:
+        data = graph(n)
+        json_s, json_size = timed(standard, data)
+        columnar_s, columnar_size = timed(compact, data)
+        print('%10d %12.2f %12.4f %12.2f %12.4f %8.1f %8.1f' % (
+            n, json_size / 2 ** 20, json_s, columnar_size / 2 ** 20, columnar_s, json_size / columnar_size,
+            json_s / columnar_s))
+
+
+if __name__ == '__main__':
+    main([int(a) for a in sys.argv[1:]] or SIZES)
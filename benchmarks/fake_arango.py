@@ -0,0 +1,300 @@
+"""
+In-memory stand-in for the parts of python-arango's StandardDatabase the application uses, so benchmarks run without
+an ArangoDB server. Queries are recognized by their name in the database.aql catalog and answered by plain Python
+implementations with the same results, rows come back through a cursor in batches like the real one.
+
+    db = FakeDatabase()
+    db.create_collection('Tag')
+    db.collection('Tag').import_bulk(docs)
+    client = AsyncDatabase(db)
+
+Timings are only meaningful relative to each other, they measure the application code around the database rather
+than ArangoDB itself.
+"""
+import itertools
+from collections import deque, defaultdict
+
+from database.aql import QUERIES
+from database.typeahead import MIN_GRAM, MAX_GRAM
+
+_cursor_ids = itertools.count(1)
+
+
+class FakeCursor:
+    """
+    Cursor over a generator of rows handing them out batch_size at a time like arango.cursor.Cursor
+    """
+
+    def __init__(self, rows, batch_size=1000):
+        self.id = str(next(_cursor_ids))
+        self._rows = iter(rows)
+        self._batch_size = batch_size or 1000
+        self._batch = deque()
+        self._more = True
+        self.fetch()
+
+    def __iter__(self):
+        while True:
+            while self._batch:
+                yield self._batch.popleft()
+            if not self._more:
+                return
+            self.fetch()
+
+    def batch(self):
+        return self._batch
+
+    def has_more(self):
+        return self._more
+
+    def fetch(self):
+        self._batch.extend(itertools.islice(self._rows, self._batch_size))
+        # Peek so has_more is false as soon as the last batch has been handed out, like ArangoDB reports it
+        try:
+            self._rows = itertools.chain([next(self._rows)], self._rows)
+        except StopIteration:
+            self._more = False
+        return {'count': len(self._batch)}
+
+    def close(self, ignore_missing=False):
+        self._more = False
+        return True
+
+
+class FakeCollection:
+
+    def __init__(self, db, name, edge=False):
+        self.db = db
+        self.name = name
+        self.edge = edge
+        self.docs = {}
+
+    def __len__(self):
+        return len(self.docs)
+
+    def count(self):
+        return len(self.docs)
+
+    def import_bulk(self, documents, halt_on_error=True, details=True, on_duplicate='error', **kwargs):
+        result = {'created': 0, 'updated': 0, 'ignored': 0, 'errors': 0, 'empty': 0}
+        for doc in documents:
+            key = doc.get('_key') or str(len(self.docs))
+            exists = key in self.docs
+            if exists and on_duplicate == 'error':
+                result['errors'] += 1
+                continue
+            if exists and on_duplicate == 'ignore':
+                result['ignored'] += 1
+                continue
+            stored = dict(self.docs[key], **doc) if exists and on_duplicate == 'update' else dict(doc)
+            stored.update(_key=key, _id='%s/%s' % (self.name, key), _rev='_fake')
+            if exists:
+                self.db._unlink(self.docs[key])
+            self.docs[key] = stored
+            self.db._link(self.name, stored)
+            result['updated' if exists else 'created'] += 1
+        return result
+
+    def get(self, key):
+        return self.docs.get(key)
+
+
+class FakeAQL:
+
+    def __init__(self, db):
+        self.db = db
+        self._names = {query.text: query.name for query in QUERIES.values()}
+
+    def validate(self, query):
+        if query not in self._names:
+            raise ValueError("Query is not part of the catalog")
+        return {'error': False}
+
+    def explain(self, query, bind_vars=None, **kwargs):
+        return {'estimatedCost': 1.0, 'nodes': [{'type': 'SingletonNode'}, {'type': 'ReturnNode'}], 'rules': []}
+
+    def execute(self, query, bind_vars=None, batch_size=1000, **options):
+        try:
+            name = self._names[query]
+        except KeyError:
+            raise NotImplementedError("The fake database only runs catalog queries")
+        kind, _, variant = name.partition('.')
+        handler = getattr(self.db, '_q_%s' % kind, None)
+        if handler is None:
+            raise NotImplementedError("The fake database does not implement %s" % name)
+        bind_vars = dict(bind_vars or {})
+        if variant:
+            direction, _, edges = variant.partition('.')
+            bind_vars['direction'] = direction.upper()
+            if edges:
+                bind_vars['edges'] = [bind_vars.pop('@edge%d' % i) for i in range(int(edges[len('edges'):]))]
+        return FakeCursor(handler(bind_vars), batch_size)
+
+
+class FakeGraph:
+    """
+    Every edge collection of the database connecting every vertex collection
+    """
+
+    def __init__(self, db, name):
+        self.db = db
+        self.name = name
+
+    def edge_definitions(self):
+        vertices = sorted(col.name for col in self.db.collections.values() if not col.edge)
+        return [{'edge_collection': col.name, 'from_vertex_collections': vertices, 'to_vertex_collections': vertices}
+                for col in self.db.collections.values() if col.edge]
+
+
+class FakeDatabase:
+    """
+    Collections held in dicts with an adjacency list per vertex. Every collection is linked to the search view and
+    every edge collection is part of every graph.
+    """
+
+    def __init__(self, name='fake'):
+        self.name = name
+        self.collections = {}
+        self.aql = FakeAQL(self)
+        self._out = defaultdict(list)
+        self._in = defaultdict(list)
+
+    def create_collection(self, name, edge=False, **kwargs):
+        if name not in self.collections:
+            self.collections[name] = FakeCollection(self, name, edge)
+        return self.collections[name]
+
+    def has_collection(self, name):
+        return name in self.collections
+
+    def collection(self, name):
+        return self.collections[name]
+
+    def graph(self, name):
+        return FakeGraph(self, name)
+
+    def view(self, name):
+        return {'name': name, 'links': {col: {'includeAllFields': True} for col in self.collections}}
+
+    def document(self, doc_id):
+        col, _, key = doc_id.partition('/')
+        return self.collections[col].docs.get(key) if col in self.collections else None
+
+    def _link(self, col, doc):
+        if '_from' in doc:
+            self.collections[col].edge = True
+            self._out[doc['_from']].append(doc)
+            self._in[doc['_to']].append(doc)
+
+    def _unlink(self, doc):
+        if '_from' in doc:
+            self._out[doc['_from']].remove(doc)
+            self._in[doc['_to']].remove(doc)
+
+    def _vertices(self):
+        for col in self.collections.values():
+            if not col.edge:
+                yield from col.docs.values()
+
+    def _edges(self, vertex, direction='ANY', edges=None):
+        # Pairs of (edge, other end) in the order they were written
+        if direction in ('OUTBOUND', 'ANY'):
+            for e in self._out.get(vertex, ()):
+                if edges is None or e['_id'].partition('/')[0] in edges:
+                    yield e, e['_to']
+        if direction in ('INBOUND', 'ANY'):
+            for e in self._in.get(vertex, ()):
+                if edges is None or e['_id'].partition('/')[0] in edges:
+                    yield e, e['_from']
+
+    @staticmethod
+    def _copy(doc):
+        # Rows are modified by the graph assembler, hand out copies like documents fresh off the wire
+        return dict(doc) if doc is not None else None
+
+    def _q_search(self, bind_vars):
+        term = bind_vars['term']
+        return (self._copy(d) for d in self._vertices() if d.get('name') == term)
+
+    def _q_typeahead(self, bind_vars):
+        # Like the view, words shorter than MIN_GRAM only match through @short
+        words = [w[:MAX_GRAM] for w in bind_vars['prefix'].lower().split() if len(w) >= MIN_GRAM]
+        words += bind_vars['short']
+        found = [d for d in self._vertices() if isinstance(d.get('name'), str) and all(
+            any(w.startswith(p) for w in d['name'].lower().split()) for p in words)]
+        found.sort(key=lambda d: d['name'])
+        return (self._copy(d) for d in found[:bind_vars['limit']])
+
+    def _q_popular_names(self, bind_vars):
+        docs = sorted(self.collections[bind_vars['@collection']].docs.values(),
+                      key=lambda d: d.get(bind_vars['attribute']) or 0, reverse=True)
+        return (self._copy(d) for d in docs[:bind_vars['limit']])
+
+    def _q_adjacency_vertices(self, bind_vars):
+        return (self._copy(d) for d in self.collections[bind_vars['@collection']].docs.values())
+
+    def _q_adjacency_edges(self, bind_vars):
+        return ([e['_from'], e['_to']] for e in self.collections[bind_vars['@collection']].docs.values())
+
+    def _q_neighbors(self, bind_vars):
+        for e, other in self._edges(bind_vars['start']):
+            yield {'v': self._copy(self.document(other)), 'e': self._copy(e)}
+
+    def _q_neighbors_batch(self, bind_vars):
+        for seed in bind_vars['seeds']:
+            for e, other in self._edges(seed):
+                yield {'seed': seed, 'v': self._copy(self.document(other)), 'e': self._copy(e)}
+
+    def _q_k_hop(self, bind_vars):
+        start, direction, edges = bind_vars['start'], bind_vars['direction'], bind_vars.get('edges')
+        if self.document(start) is None:
+            return
+        seen, frontier, produced = {start}, [start], 1
+        yield {'v': self._copy(self.document(start)), 'e': None}
+        for _ in range(bind_vars['max_depth']):
+            following = []
+            for vertex in frontier:
+                for e, other in self._edges(vertex, direction, edges):
+                    if other in seen:
+                        continue
+                    if produced >= bind_vars['limit']:
+                        return
+                    seen.add(other)
+                    following.append(other)
+                    produced += 1
+                    yield {'v': self._copy(self.document(other)), 'e': self._copy(e)}
+            frontier = following
+
+    def _q_induced_edges(self, bind_vars):
+        members = set(bind_vars['vertices'])
+        for vertex in bind_vars['vertices']:
+            for e, other in self._edges(vertex, bind_vars['direction'], bind_vars.get('edges')):
+                if other in members:
+                    yield {'e': {'_id': e['_id'], '_from': e['_from'], '_to': e['_to']}}
+
+    def _q_shortest_path_bounded(self, bind_vars):
+        start, target = bind_vars['start'], bind_vars['target']
+        direction, edges = bind_vars['direction'], bind_vars.get('edges')
+        parents, frontier = {start: None}, [start]
+        while frontier and target not in parents:
+            following = []
+            for vertex in frontier:
+                for e, other in self._edges(vertex, direction, edges):
+                    if other not in parents:
+                        parents[other] = (vertex, e)
+                        following.append(other)
+            frontier = following
+        if target not in parents or self.document(start) is None:
+            return
+        path, vertex = [], target
+        while parents[vertex] is not None:
+            previous, e = parents[vertex]
+            path.append({'v': self._copy(self.document(vertex)), 'e': self._copy(e)})
+            vertex = previous
+        if len(path) > bind_vars.get('max_depth', len(path)):
+            return
+        yield {'v': self._copy(self.document(start)), 'e': None}
+        yield from reversed(path)
+
+    _q_shortest_path = _q_shortest_path_bounded
+
@@ -0,0 +1,176 @@
+"""
+Load test of the production server, requests per second against the number of worker processes.
+
+    python -m benchmarks.load_test --workers 1 2 4 --duration 20 --output load.json
+
+For every worker count the server is started with apiserver.serve on a synthetic power law graph held by the in-memory
+ArangoDB stand-in of each worker, loaded with concurrent neighbor and k-hop requests for random nodes over HTTP for
+the given duration, then stopped with SIGTERM the way a deployment stops it. The result cache is turned off so every
+request assembles its graph, which is the work that is bound to one core per process.
+
+Throughput should grow with the workers up to the number of cores, beyond that the workers only share them.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+import aiohttp
+
+from benchmarks.bench_suite import percentiles, commit, NODE_COLLECTION, EDGE_COLLECTION
+from benchmarks.synthetic import power_law_graph
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = 'benchmarks.load_test:fake_app()'
+
+
+def fake_app():
+    """
+    The app with every worker's database replaced by the in-memory stand-in, the graph is built from the
+    LOAD_TEST_NODES and LOAD_TEST_SEED settings so every worker holds the same one
+    """
+    from apiserver.app import create_app
+    from apiserver.resources import resources
+    from benchmarks.fake_arango import FakeDatabase
+    from database.async_arango import AsyncDatabase
+
+    nodes, edges = power_law_graph(int(os.environ['LOAD_TEST_NODES']), seed=int(os.environ['LOAD_TEST_SEED']),
+                                   col=NODE_COLLECTION, edge_col=EDGE_COLLECTION)
+    db = FakeDatabase()
+    db.create_collection(NODE_COLLECTION).import_bulk(nodes)
+    db.create_collection(EDGE_COLLECTION, edge=True).import_bulk(edges)
+    app = create_app()
+    resources.register('arango', lambda: AsyncDatabase(db), close=AsyncDatabase.close)
+    return app
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(workers, port, options):
+    env = dict(os.environ, LOAD_TEST_NODES=str(options.nodes), LOAD_TEST_SEED=str(options.seed),
+               CACHE_MAX_ENTRIES='0', CRAWL_SEEN_DB='')
+    return subprocess.Popen(
+        [sys.executable, '-m', 'apiserver.serve', '--app', APP, '--bind', '127.0.0.1:%d' % port,
+         '--workers', str(workers)], cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+async def wait_ready(session, url, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            async with session.get(url + '/metrics') as response:
+                if response.status == 200:
+                    return
+        except aiohttp.ClientError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("The server did not answer within %d seconds" % timeout)
+
+
+async def load(url, keys, options):
+    """
+    :return: dict
+        latency percentiles, requests, errors and requests per second over the measured duration
+    """
+    rng = random.Random(options.seed)
+    latencies, errors = [], 0
+    connector = aiohttp.TCPConnector(limit=options.concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        await wait_ready(session, url)
+
+        async def request():
+            route = rng.choice(('/get_neighbors_index', '/get_k_hop_neighbors'))
+            async with session.post(url + route, data={'nodekey': rng.choice(keys), 'depth': 2}) as response:
+                await response.read()
+                return response.status
+
+        async def user(until, record):
+            nonlocal errors
+            while time.monotonic() < until:
+                start = time.perf_counter()
+                try:
+                    status = await request()
+                except aiohttp.ClientError:
+                    status = None
+                if record:
+                    if status == 200:
+                        latencies.append(time.perf_counter() - start)
+                    else:
+                        errors += 1
+
+        # Every worker has to build its graph before it answers as fast as the others
+        warm = time.monotonic() + options.warmup
+        await asyncio.gather(*[user(warm, False) for _ in range(options.concurrency)])
+        start = time.monotonic()
+        await asyncio.gather(*[user(start + options.duration, True) for _ in range(options.concurrency)])
+        elapsed = time.monotonic() - start
+    if not latencies:
+        raise RuntimeError("No request succeeded, %d failed" % errors)
+    return dict(percentiles(latencies), requests=len(latencies), errors=errors,
+                requests_per_sec=len(latencies) / elapsed)
+
+
+def measure(workers, keys, options):
+    port = free_port()
+    server = start_server(workers, port, options)
+    try:
+        result = asyncio.run(load('http://127.0.0.1:%d' % port, keys, options))
+    finally:
+        server.send_signal(signal.SIGTERM)
+        try:
+            exit_code = server.wait(options.graceful_timeout + 10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+            exit_code = None
+    return dict(result, workers=workers, exit_code=exit_code)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, nargs='+', default=sorted({1, 2, os.cpu_count() or 1}))
+    parser.add_argument('--nodes', type=int, default=20000)
+    parser.add_argument('--concurrency', type=int, default=32, help='requests in flight')
+    parser.add_argument('--duration', type=float, default=20, help='seconds measured per worker count')
+    parser.add_argument('--warmup', type=float, default=5, help='seconds of unmeasured requests first')
+    parser.add_argument('--graceful-timeout', type=float, default=30)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', default='load_results.json')
+    options = parser.parse_args(argv)
+
+    nodes, _ = power_law_graph(options.nodes, seed=options.seed, col=NODE_COLLECTION, edge_col=EDGE_COLLECTION)
+    keys = ['%s/%s' % (NODE_COLLECTION, d['_key']) for d in nodes]
+    results = [measure(workers, keys, options) for workers in options.workers]
+    report = {
+        'commit': commit(),
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'params': vars(options),
+        'results': results
+    }
+    with open(options.output, 'w') as fd:
+        json.dump(report, fd, indent=2)
+    base = results[0]['requests_per_sec']
+    print('%8s %12s %10s %10s %10s %8s %8s' % ('workers', 'requests/s', 'speedup', 'p50 ms', 'p99 ms', 'errors',
+                                               'exit'))
+    for result in results:
+        print('%8d %12.1f %9.2fx %10.2f %10.2f %8d %8s' % (
+            result['workers'], result['requests_per_sec'], result['requests_per_sec'] / base,
+            result['p50_ms'], result['p99_ms'], result['errors'], result['exit_code']))
+    return report
+
+
+if __name__ == '__main__':
+    main()
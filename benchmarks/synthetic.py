@@ -0,0 +1,51 @@
+"""
+Synthetic graphs shaped like the crawled and imported data: a few hubs with a huge number of neighbors and a long
+tail of nodes with only a few. Nodes get pronounceable multi word names so the search and typeahead queries have
+something to match.
+
+    nodes, edges = power_law_graph(10000, edges_per_node=3, seed=1)
+"""
+import random
+
+import networkx
+
+SYLLABLES = ['ja', 'va', 'py', 'thon', 'ru', 'by', 'go', 'lang', 're', 'act', 'no', 'de', 'sql', 'graph', 'ar', 'an',
+             'go', 'db', 'ker', 'nel', 'li', 'nux', 'web', 'pack', 'type', 'script', 'net', 'work', 'data', 'base']
+
+
+def word(rng):
+    return ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(1, 3)))
+
+
+def power_law_graph(nodes, edges_per_node=3, seed=None, col='Tag', edge_col='Related'):
+    """
+    Generate a graph whose degrees follow a power law with the Barabasi-Albert preferential attachment model
+
+    :param nodes: int
+        number of nodes
+    :param edges_per_node: int
+        edges every new node attaches with, the graph has about nodes * edges_per_node edges
+    :param seed: int
+        makes the graph and the names reproducible
+    :param col: str
+        vertex collection the nodes belong to
+    :param edge_col: str
+        edge collection the edges belong to
+    :return: tuple
+        (node documents, edge documents) ready for import_bulk, nodes carry their degree as nodesize
+    """
+    rng = random.Random(seed)
+    graph = networkx.barabasi_albert_graph(nodes, min(edges_per_node, nodes - 1), seed=seed)
+    node_docs = [{'_key': str(n), 'name': ' '.join(word(rng) for _ in range(rng.randint(1, 3))),
+                  'nodesize': graph.degree(n), 'group': n % 10} for n in graph.nodes]
+    edge_docs = [{'_key': '%d-%d' % (a, b), '_from': '%s/%d' % (col, a), '_to': '%s/%d' % (col, b),
+                  'value': rng.random()} for a, b in graph.edges]
+    return node_docs, edge_docs
+
+
+def hubs(node_docs, count=10):
+    """
+    :return: list
+        keys of the nodes with the highest degree, the slowest nodes to expand
+    """
+    return [d['_key'] for d in sorted(node_docs, key=lambda d: d['nodesize'], reverse=True)[:count]]
@@ -0,0 +1,217 @@
+"""
+Pool of warm headless browser sessions shared by the crawls. A crawl checks a session out, uses it for its searches
+and checks it back in, so the browser cold start is paid once per session instead of once per crawl and every
+browser started is eventually quit.
+
+    pool = DriverPool(new_driver, size=2)
+    with pool.session() as session:
+        session.driver.get(url)
+        session.pages += 1
+    pool.close()
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+from loguru import logger
+from selenium.common.exceptions import WebDriverException
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+class PoolTimeout(Exception):
+    """
+    Raised when no session is free before the checkout timeout
+    """
+
+
+class PoolClosed(Exception):
+    """
+    Raised when a session is checked out of a pool that has been closed
+    """
+
+
+def driver_memory(driver):
+    """
+    Memory used by a browser session in MB. With psutil installed this is the resident memory of the chromedriver
+    process and every browser process it started, otherwise the JavaScript heap of the current page.
+
+    :param driver: selenium.webdriver.Chrome
+    :return: float or None
+        None when it cannot be measured
+    """
+    try:
+        if psutil is not None:
+            process = psutil.Process(driver.service.process.pid)
+            processes = [process] + process.children(recursive=True)
+            return sum(p.memory_info().rss for p in processes) / 2 ** 20
+        used = driver.execute_script('return window.performance.memory && window.performance.memory.usedJSHeapSize;')
+        return used / 2 ** 20 if used else None
+    except Exception as e:
+        logger.debug("Could not measure browser memory: %s" % e)
+        return None
+
+
+class PooledDriver:
+    """
+    A browser session of the pool with the number of pages it has loaded. Crawls add to pages for every page they
+    load so the pool knows when to recycle it.
+    """
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.pages = 0
+        self.created = time.monotonic()
+        self.healthy = True
+
+
+class DriverPool:
+    """
+    Thread safe pool of browser sessions. Sessions are started on demand up to size, checked with a trivial script
+    before being handed out and recycled once they have loaded max_pages pages or grown past max_memory MB, which
+    bounds the memory a long lived browser leaks.
+
+    :param factory: callable
+        returns a new webdriver
+    :param size: int
+        browser sessions open at the same time
+    :param max_pages: int
+        pages a session loads before it is replaced, 0 never replaces it
+    :param max_memory: float
+        MB a session may use before it is replaced, 0 never measures it
+    :param checkout_timeout: float
+        seconds to wait for a free session, None waits for as long as it takes
+    """
+
+    def __init__(self, factory, size=2, max_pages=50, max_memory=1024, checkout_timeout=None):
+        self.factory = factory
+        self.size = size
+        self.max_pages = max_pages
+        self.max_memory = max_memory
+        self.checkout_timeout = checkout_timeout
+        self._idle = []
+        self._open = 0
+        self._closed = False
+        self._lock = threading.Condition()
+        self.started = 0
+        self.recycled = 0
+
+    def checkout(self, timeout=None):
+        """
+        Take a healthy session out of the pool, starting one if none is idle and the pool is not full
+
+        :param timeout: float
+            seconds to wait for a free session, the pool's checkout_timeout by default
+        :return: PooledDriver
+        """
+        timeout = self.checkout_timeout if timeout is None else timeout
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                while not self._idle and self._open >= self.size and not self._closed:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise PoolTimeout("All %d browser sessions are busy" % self.size)
+                    self._lock.wait(remaining)
+                if self._closed:
+                    raise PoolClosed("The browser pool is closed")
+                session = self._idle.pop() if self._idle else None
+                if session is None:
+                    # Reserve the slot before starting the browser outside the lock
+                    self._open += 1
+            if session is None:
+                return self._start()
+            if self._check(session):
+                return session
+            self._discard(session, 'failed its health check')
+
+    def checkin(self, session):
+        """
+        Return a session to the pool, quitting it instead when it is broken, has loaded too many pages or uses too much
+        memory
+        """
+        reason = None
+        if not session.healthy:
+            reason = 'is broken'
+        elif self.max_pages and session.pages >= self.max_pages:
+            reason = 'loaded %d pages' % session.pages
+        elif self.max_memory:
+            memory = driver_memory(session.driver)
+            if memory is not None and memory > self.max_memory:
+                reason = 'uses %.0f MB' % memory
+        with self._lock:
+            if reason is None and not self._closed:
+                self._idle.append(session)
+                self._lock.notify()
+                return
+        self._discard(session, reason or 'was returned to a closed pool')
+
+    @contextmanager
+    def session(self, timeout=None):
+        """
+        Check a session out for the duration of a with block. A session whose block raises a WebDriverException is
+        considered broken and replaced.
+        """
+        session = self.checkout(timeout)
+        try:
+            yield session
+        except WebDriverException:
+            session.healthy = False
+            raise
+        finally:
+            self.checkin(session)
+
+    def close(self):
+        """
+        Quit the idle sessions and every session checked in from now on
+        """
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._lock.notify_all()
+        for session in idle:
+            self._discard(session, 'was idle when the pool closed')
+        logger.info("Browser pool closed")
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': self.size,
+                'open': self._open,
+                'idle': len(self._idle),
+                'started': self.started,
+                'recycled': self.recycled
+            }
+
+    def _start(self):
+        try:
+            session = PooledDriver(self.factory())
+        except Exception:
+            with self._lock:
+                self._open -= 1
+                self._lock.notify()
+            raise
+        with self._lock:
+            self.started += 1
+        logger.info("Started browser session %d of %d" % (self._open, self.size))
+        return session
+
+    def _check(self, session):
+        try:
+            return session.driver.execute_script('return 1;') == 1
+        except Exception:
+            return False
+
+    def _discard(self, session, reason):
+        logger.info("Quitting browser session after %d pages, it %s" % (session.pages, reason))
+        try:
+            session.driver.quit()
+        except Exception as e:
+            logger.warning("Browser session did not quit cleanly: %s" % e)
+        with self._lock:
+            self._open -= 1
+            self.recycled += 1
+            self._lock.notify()
@@ -0,0 +1,30 @@
+"""
+Choose how the collector reads search result pages. The chrome engine drives a headless browser and sees the pages
+exactly as a visitor does, the http engine fetches the pages directly and is much cheaper but only sees what the
+server renders. Both are called the same way and produce the same graph.
+"""
+import os
+from functools import partial
+
+ENGINES = ('chrome', 'http')
+DEFAULT_ENGINE = os.environ.get('COLLECTOR_ENGINE', 'chrome')
+
+
+def get_engine(name=None, pool=None):
+    """
+    :param name: str
+        chrome or http, the COLLECTOR_ENGINE environment variable by default
+    :param pool: collector.driver_pool.DriverPool
+        browser sessions the chrome engine borrows from instead of starting a browser per crawl
+    :return: callable
+        crawl function called as crawl(search_ids=list, graph=graph, progress=dict)
+    """
+    name = (name or DEFAULT_ENGINE).lower()
+    if name == 'chrome':
+        # Imported on demand so the http engine never needs selenium or a chromedriver
+        from collector.web_driver import scroll
+        return scroll if pool is None else partial(scroll, pool=pool)
+    if name == 'http':
+        from collector.http_engine import crawl
+        return crawl
+    raise ValueError("Collector engine must be one of %s, got %s" % (', '.join(ENGINES), name))
@@ -0,0 +1,216 @@
+"""
+Browserless collector engine. Search result pages are fetched over plain async HTTP and the posts are read from the
+HTML with the standard library parser, so a crawl costs a few requests instead of a headless Chrome session. It
+produces the same graph as collector.web_driver.scroll.
+"""
+import asyncio
+import time
+from html.parser import HTMLParser
+from urllib.parse import urljoin
+
+import aiohttp
+from loguru import logger
+from networkx import DiGraph
+
+from collector.posts import SEARCH_URL, add_site, add_search, add_posts, search_terms, written
+from collector.rate_limit import site_limits
+from monitoring.metrics import CRAWL_PAGES, CRAWL_POSTS, CRAWL_PAGE_SECONDS
+
+HEADERS = {'User-Agent': 'Mozilla/5.0 (compatible; quarango-collector)', 'Accept': 'text/html'}
+# Elements without an end tag, they never hold text and must not be pushed on the open element stack
+VOID_ELEMENTS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'track', 'wbr'}
+
+
+class PostParser(HTMLParser):
+    """
+    Read the posts of a search result page. Every element with the postArticle class is a post and its author link,
+    date, title and clap count are the text of the first .ds-link, time, h3 and .multirecommend elements inside it,
+    the same fields collector.web_driver.EXTRACT_POSTS reads in the browser.
+    """
+
+    def __init__(self, base_url=''):
+        super().__init__(convert_charrefs=True)
+        self.base_url = base_url
+        self.posts = []
+        self._post = None
+        self._stack = []
+        self._text = {}
+
+    def _field(self, tag, classes):
+        if 'ds-link' in classes:
+            return 'author'
+        if tag == 'time':
+            return 'date'
+        if tag == 'h3':
+            return 'title'
+        if 'multirecommend' in classes:
+            return 'claps'
+        return None
+
+    def handle_starttag(self, tag, attrs):
+        if tag in VOID_ELEMENTS:
+            return
+        attrs = dict(attrs)
+        classes = (attrs.get('class') or '').split()
+        roles = []
+        if 'postArticle' in classes and self._post is None:
+            self._post = {'author': None, 'link': None, 'date': None, 'title': None, 'claps': None}
+            self._text = {}
+            roles.append('post')
+        elif self._post is not None:
+            field = self._field(tag, classes)
+            # Only the first element of each field counts, like querySelector
+            if field and field not in self._text:
+                self._text[field] = []
+                roles.append(field)
+                if field == 'author' and attrs.get('href'):
+                    self._post['link'] = urljoin(self.base_url, attrs['href'])
+        self._stack.append((tag, roles))
+
+    def handle_endtag(self, tag):
+        if tag in VOID_ELEMENTS or not any(open_tag == tag for open_tag, roles in self._stack):
+            return
+        # Close everything left open inside the element as browsers do
+        while self._stack:
+            open_tag, roles = self._stack.pop()
+            for role in roles:
+                self._close(role)
+            if open_tag == tag:
+                break
+
+    def _close(self, role):
+        if role == 'post':
+            self.posts.append(self._post)
+            self._post = None
+        else:
+            self._post[role] = ' '.join(''.join(self._text[role]).split()) or None
+
+    def handle_data(self, data):
+        if self._post is None:
+            return
+        for tag, roles in self._stack:
+            for role in roles:
+                if role != 'post' and self._post[role] is None:
+                    self._text[role].append(data)
+
+    def close(self):
+        super().close()
+        while self._stack:
+            for role in self._stack.pop()[1]:
+                self._close(role)
+        return self.posts
+
+
+def parse_posts(html, base_url=''):
+    """
+    :return: list
+        post records with the author, link, date, title and claps of each post
+    """
+    parser = PostParser(base_url)
+    parser.feed(html)
+    return parser.close()
+
+
+async def fetch_posts(session, url, semaphore, limiter=site_limits):
+    async with semaphore:
+        await limiter.wait_async(url)
+        start = time.perf_counter()
+        async with session.get(url) as response:
+            response.raise_for_status()
+            html = await response.text()
+    posts = parse_posts(html, str(response.url))
+    CRAWL_PAGE_SECONDS.observe(time.perf_counter() - start, engine='http')
+    CRAWL_PAGES.inc(engine='http')
+    CRAWL_POSTS.inc(len(posts), engine='http')
+    return posts
+
+
+async def collect(search_ids=None, graph=None, progress=None, search_url=SEARCH_URL, pages=1, concurrency=4,
+                  timeout=10, limiter=site_limits, seen=None):
+    """
+    Fetch the result pages of every search at the same time, page by page, and add their posts to the graph
+
+    Parameters
+    ----------
+    search_ids (list)
+        search terms to crawl
+    graph (DiGraph or collector.sink.ArangoGraphSink)
+        receives the nodes and edges, a new DiGraph by default
+    progress (dict)
+        updated with the search being crawled and the number of posts collected
+    search_url (str)
+        url of the search with a %s for the search term
+    pages (int)
+        result pages read per search, pages after the first are requested with a page parameter
+    concurrency (int)
+        requests in flight at the same time
+    timeout (float)
+        seconds allowed for each request
+    limiter (collector.rate_limit.RateLimiter)
+        spaces out the requests made to each site
+    seen (collector.seen.SeenStore)
+        posts read by earlier crawls, only the new or changed ones are added to the graph and a search stops at its
+        first page without any
+    Returns
+    -------
+    graph
+    """
+    if graph is None:
+        graph = DiGraph()
+    if progress is None:
+        progress = {}
+    index = {add_site(graph)}
+    search_ids = search_terms(search_ids)
+    semaphore = asyncio.Semaphore(concurrency)
+    read, new = dict.fromkeys(search_ids, 0), dict.fromkeys(search_ids, 0)
+    crawled, incomplete = set(), set()
+    active = list(search_ids)
+    async with aiohttp.ClientSession(headers=HEADERS, timeout=aiohttp.ClientTimeout(total=timeout)) as session:
+        for page in range(1, pages + 1):
+            urls = [search_url % search_id if page == 1 else '%s&page=%d' % (search_url % search_id, page)
+                    for search_id in active]
+            results = await asyncio.gather(
+                *[fetch_posts(session, url, semaphore, limiter) for url in urls], return_exceptions=True)
+            # Results come back in the order they were requested
+            following, pending = [], []
+            for search_id, url, posts in zip(active, urls, results):
+                search_node = add_search(graph, search_id)
+                if isinstance(posts, Exception):
+                    logger.error("Fetching %s failed: %s" % (url, posts))
+                    continue
+                fresh = posts if seen is None else seen.new_or_changed(search_id, posts)
+                logger.info('Collected %s posts, %d new or changed, from %s' % (len(posts), len(fresh), url))
+                progress['search'] = search_node
+                progress['posts'] = progress.get('posts', 0) + len(posts)
+                if seen is not None:
+                    progress['new'] = progress.get('new', 0) + len(fresh)
+                add_posts(graph, fresh, search_node, index)
+                pending.append((search_id, search_node, posts))
+                crawled.add(search_id)
+                read[search_id] += len(posts)
+                new[search_id] += len(fresh)
+                # The following pages of a recrawl only hold older posts once a page has nothing new
+                if seen is None or fresh:
+                    following.append(search_id)
+            failed = graph.flush() if hasattr(graph, 'flush') else None
+            if seen is not None:
+                # Once written, and before the next page is read so the posts it repeats are not new again. Posts
+                # that could not be written stay new for the next crawl
+                for search_id, search_node, posts in pending:
+                    seen.record(search_id, written(posts, search_node, failed))
+                    if failed:
+                        incomplete.add(search_id)
+            active = following
+    if seen is not None:
+        # A search none of whose pages could be read or written is left due for its recrawl
+        for search_id in search_ids:
+            if search_id in crawled and search_id not in incomplete:
+                seen.crawled(search_id, posts=read[search_id], new=new[search_id])
+    return graph
+
+
+def crawl(search_ids=None, graph=None, progress=None, **kwargs):
+    """
+    Blocking entry point with the same signature as collector.web_driver.scroll for the crawl scheduler's threads
+    """
+    return asyncio.run(collect(search_ids=search_ids, graph=graph, progress=progress, **kwargs))
@@ -0,0 +1,129 @@
+"""
+Turn the posts found on search result pages into the author, article and search graph. Shared by the collector
+engines so they all produce the same graph whatever way they read the pages.
+"""
+from loguru import logger
+
+SITE_ID = 'mediumcom'
+SEARCH_URL = 'https://medium.com/search?q=%s'
+DEFAULT_SEARCH = 'network%20graph%20visualization'
+
+
+def search_terms(search_ids):
+    """
+    List the searches to run for the requested terms. Several terms are also searched together first.
+
+    Parameters
+    ----------
+    search_ids (list or str)
+        url encoded search terms
+    Returns
+    -------
+    list
+    """
+    if not search_ids:
+        return [DEFAULT_SEARCH]
+    elif isinstance(search_ids, list):
+        # Create a search that consists of all the terms and put it at the beginning of the list
+        if len(search_ids) > 1:
+            return ['%20'.join(search_ids)] + search_ids
+        return list(search_ids)
+    return [search_ids]
+
+
+def add_site(graph):
+    if not graph.has_node(SITE_ID):
+        graph.add_node(SITE_ID, category='Site', description='Site with blogs')
+    return SITE_ID
+
+
+def add_search(graph, search_id):
+    """
+    Add the node of a search and return its normalized id
+    """
+    search_id = search_id.replace('%20', '_')
+    if not graph.has_node(search_id):
+        graph.add_node(search_id, category='SearchTerm', description='Search term used to search blogs')
+    return search_id
+
+
+def node_id(text):
+    return ''.join(e for e in text if e.isalnum()).lower()
+
+
+def add_posts(graph, posts, search_id, index=None):
+    """
+    Turn post records into nodes and edges. Each post adds its author and the article, linked to each other, to the
+    site and to the search that found it.
+
+    Parameters
+    ----------
+    graph (DiGraph)
+        graph the nodes and edges are added to
+    posts (list)
+        records with the author, link, date, title and claps of each post
+    search_id (str)
+        normalized id of the search node
+    index (set)
+        ids of the nodes already created, updated with the new ones
+    Returns
+    -------
+    int
+        number of posts turned into nodes
+    """
+    if index is None:
+        index = set()
+    added = 0
+    # Go through each post and extract an author (a_id), the post (b_id) and then create the edges
+    for post in posts:
+        author, title = post.get('author'), post.get('title')
+        if not author or not title:
+            logger.error("Scrolling skipped a post without an author or title: %s" % post)
+            continue
+        link = post.get('link')
+        # Create the author node
+        a_id = node_id(author)
+        if a_id not in index:
+            graph.add_node(a_id, category='Author', description=author, link=link)
+            index.add(a_id)
+        # Create the article node
+        b_id = node_id(title)
+        if b_id not in index:
+            graph.add_node(b_id, category='Article', description="%s by %s" % (title, author), link=link,
+                           count=post.get('claps'), date=post.get('date'))
+            index.add(b_id)
+        graph.add_edge(a_id, b_id, label='Posted')
+        graph.add_edge(b_id, SITE_ID, label='PostedOn')
+        graph.add_edge(search_id, b_id, label='FromSearch')
+        added += 1
+    return added
+
+
+def written(posts, search_id, failed):
+    """
+    The posts whose nodes and edges all made it to the graph
+
+    Parameters
+    ----------
+    posts (list)
+        records given to add_posts
+    search_id (str)
+        normalized id of the search node
+    failed (set)
+        node ids and (source, target) edges a sink could not write, see collector.sink.ArangoGraphSink.flush
+    Returns
+    -------
+    list
+    """
+    if not failed:
+        return list(posts)
+    if SITE_ID in failed or search_id in failed:
+        return []
+    kept = []
+    for post in posts:
+        if not post.get('author') or not post.get('title'):
+            continue
+        a_id, b_id = node_id(post['author']), node_id(post['title'])
+        if failed.isdisjoint((a_id, b_id, (a_id, b_id), (b_id, SITE_ID), (search_id, b_id))):
+            kept.append(post)
+    return kept
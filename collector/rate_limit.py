@@ -0,0 +1,86 @@
+"""
+Per site rate limits shared by every crawl of the process, whichever engine and thread or task it runs on, so crawls
+running at the same time together stay within what a site tolerates.
+
+    delay = site_limits.reserve(url)
+    time.sleep(delay)  # or await asyncio.sleep(delay)
+"""
+import asyncio
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+
+def parse_rates(text):
+    """
+    :param text: str
+        comma separated host=requests per second pairs such as medium.com=1,example.com=5
+    :return: dict
+    """
+    rates = {}
+    for pair in (text or '').split(','):
+        host, _, rate = pair.partition('=')
+        if host.strip() and rate.strip():
+            rates[host.strip().lower()] = float(rate)
+    return rates
+
+
+class RateLimiter:
+    """
+    Spaces out the requests to each site so that after an initial burst at most rate requests per second are made
+    to it. Callers reserve a slot and wait the returned delay themselves, so the same limiter serves threads and
+    asyncio tasks.
+
+    :param rate: float
+        requests per second to any site not listed in rates, 0 does not limit them
+    :param burst: int
+        requests a site may receive at once before they are spaced out
+    :param rates: dict
+        requests per second of particular hosts
+    """
+
+    def __init__(self, rate=2.0, burst=1, rates=None, clock=time.monotonic):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.rates = dict(rates or {})
+        self._clock = clock
+        self._lock = threading.Lock()
+        # Time the next request to each host is due at if requests were perfectly spaced
+        self._due = {}
+        self.delayed = 0
+
+    def reserve(self, url):
+        """
+        Reserve the next slot of the site of a url
+
+        :param url: str
+        :return: float
+            seconds to wait before making the request
+        """
+        host = urlsplit(url).hostname or url
+        rate = self.rates.get(host, self.rate)
+        if not rate:
+            return 0.0
+        interval = 1.0 / rate
+        with self._lock:
+            now = self._clock()
+            due = max(self._due.get(host, now), now)
+            delay = max(0.0, due - (self.burst - 1) * interval - now)
+            self._due[host] = due + interval
+            if delay:
+                self.delayed += 1
+        return delay
+
+    def wait(self, url):
+        time.sleep(self.reserve(url))
+
+    async def wait_async(self, url):
+        await asyncio.sleep(self.reserve(url))
+
+
+site_limits = RateLimiter(
+    rate=float(os.environ.get('CRAWL_SITE_RATE', 2)),
+    burst=int(os.environ.get('CRAWL_SITE_BURST', 2)),
+    rates=parse_rates(os.environ.get('CRAWL_SITE_RATES'))
+)
@@ -0,0 +1,229 @@
+import itertools
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from loguru import logger
+
+# Lower runs first
+HIGH, NORMAL, LOW = 0, 5, 10
+
+
+class QueueFull(Exception):
+    """
+    Raised when a crawl is submitted while the queue is at capacity
+    """
+
+
+class SchedulerStopped(Exception):
+    """
+    Raised when a crawl is submitted to a scheduler that was not started or has been stopped, nothing would run it
+    """
+
+
+def normalize_term(term):
+    return ' '.join(str(term).lower().split())
+
+
+class CrawlJob:
+    """
+    State of one crawl as seen by the API. Progress is a free form dict the crawl updates while it runs such as the
+    number of posts collected so far.
+    """
+
+    def __init__(self, term, priority=NORMAL):
+        self.id = uuid.uuid4().hex
+        self.term = term
+        self.priority = priority
+        self.status = 'queued'
+        self.progress = {}
+        self.result = None
+        self.error = None
+        self.requests = 1
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+
+    @property
+    def active(self):
+        return self.status in ('queued', 'running')
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'term': self.term,
+            'priority': self.priority,
+            'status': self.status,
+            'progress': dict(self.progress),
+            'result': self.result,
+            'error': self.error,
+            'requests': self.requests,
+            'created': self.created,
+            'started': self.started,
+            'finished': self.finished
+        }
+
+
+class CrawlScheduler:
+    """
+    Run crawls on a fixed number of worker threads fed by a bounded priority queue so the number of browsers open at
+    once never exceeds the number of workers however many searches come in. A search for a term that is already
+    queued or being crawled joins the existing job instead of starting another one, and when the queue is full new
+    terms are refused with QueueFull rather than piling up.
+
+    :param crawl: callable
+        called as crawl(search_ids=[term], progress=dict) on a worker thread, the progress dict is the job's and can
+        be updated while the crawl runs. Whatever it returns is summarized as the job result
+    :param workers: int
+        crawls running at the same time
+    :param max_queue: int
+        crawls waiting to run before new terms are refused
+    :param max_history: int
+        finished jobs remembered for the status endpoint
+    """
+
+    def __init__(self, crawl, workers=2, max_queue=50, max_history=1000):
+        self.crawl = crawl
+        self.workers = workers
+        self.max_queue = max_queue
+        self.max_history = max_history
+        self._queue = queue.PriorityQueue()
+        self._queued = 0
+        self._jobs = OrderedDict()
+        self._active = {}
+        self._lock = threading.Lock()
+        self._order = itertools.count()
+        self._threads = []
+        self._running = False
+
+    def start(self):
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+            self._threads = [
+                threading.Thread(target=self._work, name='crawl-%d' % i, daemon=True) for i in range(self.workers)]
+        for thread in self._threads:
+            thread.start()
+        logger.info("Crawl scheduler started with %d workers" % self.workers)
+
+    def stop(self, timeout=None):
+        """
+        Stop taking jobs, cancel the queued ones and wait up to timeout seconds for the running crawls to finish
+        """
+        with self._lock:
+            if not self._running:
+                return
+            self._running = False
+            for job in self._active.values():
+                if job.status == 'queued':
+                    self._finish(job, 'cancelled')
+            self._active.clear()
+        for _ in self._threads:
+            self._queue.put((float('inf'), next(self._order), None))
+        # One deadline for all the workers rather than timeout seconds each
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+        running = sum(thread.is_alive() for thread in self._threads)
+        if running:
+            logger.warning("Crawl scheduler stopped with %d crawls still running" % running)
+        else:
+            logger.info("Crawl scheduler stopped")
+
+    def submit(self, term, priority=NORMAL):
+        """
+        Queue a crawl for a search term or join the crawl already queued or running for it. Joining with a higher
+        priority moves a queued crawl up.
+
+        :param term: str
+            search term
+        :param priority: int
+            HIGH, NORMAL, LOW or any number, lower runs first
+        :return: CrawlJob
+        """
+        key = normalize_term(term)
+        with self._lock:
+            if not self._running:
+                raise SchedulerStopped("The crawl scheduler is not running")
+            job = self._active.get(key)
+            if job is not None:
+                job.requests += 1
+                if job.status == 'queued' and priority < job.priority:
+                    # The older queue entry is skipped by the worker once the job has run
+                    job.priority = priority
+                    self._queue.put((priority, next(self._order), job))
+                return job
+            if self._queued >= self.max_queue:
+                raise QueueFull("%d crawls are already waiting" % self._queued)
+            job = CrawlJob(term, priority)
+            self._active[key] = job
+            self._remember(job)
+            self._queued += 1
+            self._queue.put((priority, next(self._order), job))
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def stats(self):
+        with self._lock:
+            statuses = [job.status for job in self._jobs.values()]
+            return {
+                'workers': self.workers,
+                'queued': self._queued,
+                'max_queue': self.max_queue,
+                'running': statuses.count('running'),
+                'done': statuses.count('done'),
+                'failed': statuses.count('failed')
+            }
+
+    def _remember(self, job):
+        self._jobs[job.id] = job
+        while len(self._jobs) > self.max_history:
+            oldest = next(iter(self._jobs.values()))
+            if oldest.active:
+                break
+            self._jobs.popitem(last=False)
+
+    def _finish(self, job, status, error=None):
+        if job.status == 'queued':
+            self._queued -= 1
+        job.status = status
+        job.error = error
+        job.finished = time.time()
+
+    def _work(self):
+        while True:
+            priority, order, job = self._queue.get()
+            if job is None:
+                return
+            with self._lock:
+                if job.status != 'queued':
+                    # Stale entry of a job that was moved up or cancelled
+                    continue
+                self._queued -= 1
+                job.status = 'running'
+                job.started = time.time()
+            try:
+                result = self.crawl(search_ids=[job.term], progress=job.progress)
+                job.result = _summarize(result)
+                status, error = 'done', None
+            except Exception as e:
+                logger.error("Crawl for %s failed: %s" % (job.term, e))
+                status, error = 'failed', str(e)
+            with self._lock:
+                job.status = status
+                job.error = error
+                job.finished = time.time()
+                self._active.pop(normalize_term(job.term), None)
+
+
+def _summarize(result):
+    # Crawls return a graph, only its size is kept on the job
+    if hasattr(result, 'number_of_nodes'):
+        return {'nodes': result.number_of_nodes(), 'edges': result.number_of_edges()}
+    return result if isinstance(result, (dict, list, str, int, float, type(None))) else str(result)
@@ -0,0 +1,206 @@
+"""
+Posts the collector has already read, kept in a local SQLite file so every crawl, in every process, knows what the
+earlier ones found. A recrawl only turns the posts that are new or changed into nodes and edges, and the time each
+search was last crawled tells which ones are due for a refresh.
+
+    seen = SeenStore('crawl_seen.sqlite3')
+    fresh = seen.new_or_changed('graphs', posts)
+    add_posts(graph, fresh, search_id, index)
+    seen.record('graphs', posts)
+    seen.crawled('graphs', posts=len(posts), new=len(fresh))
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+from collector.posts import node_id
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS posts (
+    article TEXT PRIMARY KEY,
+    author TEXT,
+    link TEXT,
+    fingerprint TEXT NOT NULL,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    last_changed REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS found (
+    search TEXT NOT NULL,
+    article TEXT NOT NULL,
+    last_seen REAL NOT NULL,
+    PRIMARY KEY (search, article)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS searches (
+    term TEXT PRIMARY KEY,
+    last_crawled REAL NOT NULL,
+    posts INTEGER NOT NULL,
+    new INTEGER NOT NULL,
+    claimed REAL
+);
+CREATE INDEX IF NOT EXISTS searches_last_crawled ON searches (last_crawled);
+'''
+UPSERT_POST = '''
+INSERT INTO posts (article, author, link, fingerprint, first_seen, last_seen, last_changed)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (article) DO UPDATE SET
+    author = excluded.author,
+    link = excluded.link,
+    last_changed = CASE WHEN fingerprint != excluded.fingerprint THEN excluded.last_seen ELSE last_changed END,
+    fingerprint = excluded.fingerprint,
+    last_seen = excluded.last_seen
+'''
+UPSERT_FOUND = '''
+INSERT INTO found (search, article, last_seen) VALUES (?, ?, ?)
+ON CONFLICT (search, article) DO UPDATE SET last_seen = excluded.last_seen
+'''
+UPSERT_SEARCH = '''
+INSERT INTO searches (term, last_crawled, posts, new, claimed) VALUES (?, ?, ?, ?, NULL)
+ON CONFLICT (term) DO UPDATE SET
+    last_crawled = excluded.last_crawled, posts = excluded.posts, new = excluded.new, claimed = NULL
+'''
+# Keeps the number of bound parameters of a query well below SQLite's limit
+CHUNK = 500
+
+
+def fingerprint(post):
+    """
+    :return: str
+        digest of every field of a post, it changes when any of them does
+    """
+    fields = [post.get(field) for field in ('author', 'link', 'title', 'date', 'claps')]
+    return hashlib.sha1(json.dumps(fields).encode('utf-8')).hexdigest()
+
+
+class SeenStore:
+    """
+    Every post read is kept with the normalized id of its article and author, its link, a fingerprint of its fields
+    and when it was first seen, last seen and last changed, as well as which searches found it. A post is new or
+    changed for a search until it has been recorded for that search with the same fingerprint, so a search that
+    finds an article another search already wrote still links it.
+
+    Several threads may share a store and several processes the same file, writes are serialized by SQLite.
+
+    :param path: str
+        SQLite database file, created when missing, :memory: keeps it for the life of the store only
+    :param timeout: float
+        seconds to wait for another process to finish writing
+    """
+
+    def __init__(self, path=':memory:', timeout=10.0, clock=time.time):
+        self.path = path
+        self._clock = clock
+        self._lock = threading.Lock()
+        # Autocommit, the writes of several rows open their own transaction
+        self._db = sqlite3.connect(path, timeout=timeout, isolation_level=None, check_same_thread=False)
+        if path != ':memory:':
+            self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def new_or_changed(self, term, posts):
+        """
+        :param term: str
+            search the posts were found by
+        :param posts: list of dict
+            post records as read from the result page
+        :return: list
+            the posts not yet recorded for the search with the same fields, in their order. Posts without an author
+            or title are left out, they are neither nodes nor recorded so they would never stop being new
+        """
+        keyed = [(post, node_id(post['title'])) for post in posts if post.get('title') and post.get('author')]
+        articles = list({article for _, article in keyed})
+        known, found = {}, set()
+        with self._lock:
+            for start in range(0, len(articles), CHUNK):
+                chunk = articles[start:start + CHUNK]
+                marks = ','.join('?' * len(chunk))
+                known.update(self._db.execute(
+                    'SELECT article, fingerprint FROM posts WHERE article IN (%s)' % marks, chunk))
+                found.update(row[0] for row in self._db.execute(
+                    'SELECT article FROM found WHERE search = ? AND article IN (%s)' % marks, [term] + chunk))
+        return [post for post, article in keyed
+                if article not in found or known.get(article) != fingerprint(post)]
+
+    def record(self, term, posts):
+        """
+        Remember the posts a search found and when. Recorded posts are no longer new to the search, so the pages of
+        a search can be recorded as they are read.
+        """
+        now = self._clock()
+        rows, found = [], []
+        for post in posts:
+            if not post.get('title') or not post.get('author'):
+                continue
+            article = node_id(post['title'])
+            rows.append((article, node_id(post['author']), post.get('link'), fingerprint(post), now, now, now))
+            found.append((term, article, now))
+        with self._lock:
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                self._db.executemany(UPSERT_POST, rows)
+                self._db.executemany(UPSERT_FOUND, found)
+                self._db.execute('COMMIT')
+            except Exception:
+                self._db.execute('ROLLBACK')
+                raise
+
+    def crawled(self, term, posts=0, new=0):
+        """
+        Remember that a search was crawled now, which makes it due for a recrawl again after max_age
+
+        :param posts: int
+            posts the crawl read
+        :param new: int
+            how many of them were new or changed
+        """
+        with self._lock:
+            self._db.execute(UPSERT_SEARCH, (term, self._clock(), posts, new))
+
+    def last_seen(self, article):
+        """
+        :param article: str
+            normalized article id, see collector.posts.node_id
+        :return: float or None
+            timestamp the article was last found at
+        """
+        with self._lock:
+            row = self._db.execute('SELECT last_seen FROM posts WHERE article = ?', (article,)).fetchone()
+        return row[0] if row else None
+
+    def claim_due(self, max_age, limit=10):
+        """
+        Take the searches last crawled more than max_age seconds ago, oldest first. A claimed search is not handed out
+        again, to this or another process sharing the file, until it has been crawled again or max_age has passed.
+
+        :return: list of str
+            search terms to recrawl
+        """
+        now = self._clock()
+        with self._lock:
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                terms = [row[0] for row in self._db.execute(
+                    'SELECT term FROM searches WHERE last_crawled <= ? AND (claimed IS NULL OR claimed <= ?) '
+                    'ORDER BY last_crawled LIMIT ?', (now - max_age, now - max_age, limit))]
+                self._db.executemany('UPDATE searches SET claimed = ? WHERE term = ?', [(now, t) for t in terms])
+                self._db.execute('COMMIT')
+            except Exception:
+                self._db.execute('ROLLBACK')
+                raise
+        return terms
+
+    def stats(self):
+        with self._lock:
+            posts, = self._db.execute('SELECT COUNT(*) FROM posts').fetchone()
+            searches, oldest = self._db.execute('SELECT COUNT(*), MIN(last_crawled) FROM searches').fetchone()
+        return {
+            'posts': posts,
+            'searches': searches,
+            'oldest_search_age': self._clock() - oldest if oldest is not None else 0.0
+        }
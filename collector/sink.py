@@ -0,0 +1,163 @@
+import time
+from collections import OrderedDict
+
+from loguru import logger
+
+from database.bulk import BulkLoader, document_key
+
+CRAWL_GRAPH = 'medium'
+# Collection of the nodes of each category the collector creates
+NODE_COLLECTIONS = {
+    'Site': 'Site',
+    'SearchTerm': 'SearchTerm',
+    'Author': 'Author',
+    'Article': 'Article'
+}
+# Edge collection of each label with the categories of the nodes it connects
+EDGE_DEFINITIONS = {
+    'Posted': ('Author', 'Article'),
+    'PostedOn': ('Article', 'Site'),
+    'FromSearch': ('SearchTerm', 'Article')
+}
+
+
+def ensure_crawl_graph(db, graph=CRAWL_GRAPH):
+    """
+    Create the collections and the named graph crawled data is written to when they do not exist yet
+
+    :param db: arango.database.StandardDatabase
+    :param graph: str
+        name of the graph
+    :return: arango.graph.Graph
+    """
+    graph_db = db.graph(graph) if db.has_graph(graph) else db.create_graph(graph)
+    for label, (source, target) in EDGE_DEFINITIONS.items():
+        if not graph_db.has_edge_definition(label):
+            graph_db.create_edge_definition(
+                edge_collection=label,
+                from_vertex_collections=[NODE_COLLECTIONS[source]],
+                to_vertex_collections=[NODE_COLLECTIONS[target]]
+            )
+    for col in NODE_COLLECTIONS.values():
+        if not graph_db.has_vertex_collection(col):
+            graph_db.create_vertex_collection(col)
+    return graph_db
+
+
+class ArangoGraphSink:
+    """
+    Stand in for the networkx DiGraph the collector fills that writes nodes and edges to ArangoDB as the crawl runs.
+    Nodes and edges are buffered and written as batched upserts keyed on the normalized ids, so crawling the same post
+    twice updates it instead of duplicating it and memory only holds the current batch whatever the length of the
+    crawl.
+
+    Nodes must carry a category attribute naming one of NODE_COLLECTIONS and edges a label naming one of
+    EDGE_DEFINITIONS. A batch that cannot be written is logged and the crawl goes on, flush returns the nodes and
+    edges that were lost so they are not taken as written. Like the DiGraph, number_of_nodes and number_of_edges
+    count the distinct nodes and edges of the crawl, here the ones written.
+
+    :param db: arango.database.StandardDatabase
+    :param batch_size: int
+        buffered nodes and edges that trigger a write
+    :param flush_interval: float
+        seconds after which buffered documents are written even if the batch is not full
+    :param remember: int
+        number of recently written node ids and edges kept to answer has_node and to count each of them once.
+        Forgetting one only costs a redundant upsert, counted again
+    """
+
+    def __init__(self, db, batch_size=500, flush_interval=5.0, remember=100000, create=True):
+        if create:
+            ensure_crawl_graph(db)
+        self.loader = BulkLoader(db, on_duplicate='update')
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.remember = remember
+        self._buffer = {}
+        self._buffered = 0
+        self._recent = OrderedDict()
+        self._failed = set()
+        self._last_flush = time.monotonic()
+        self.nodes_written = 0
+        self.edges_written = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.flush()
+
+    def has_node(self, node_id):
+        return node_id in self._recent
+
+    def add_node(self, node_id, category='Article', **attributes):
+        doc = dict(attributes, _key=document_key(node_id), category=category)
+        self._add(NODE_COLLECTIONS[category], doc, node_id)
+
+    def add_edge(self, source, target, label=None, **attributes):
+        source_col, target_col = EDGE_DEFINITIONS[label]
+        doc = dict(
+            attributes,
+            _key=document_key('%s-%s' % (source, target)),
+            _from='%s/%s' % (NODE_COLLECTIONS[source_col], document_key(source)),
+            _to='%s/%s' % (NODE_COLLECTIONS[target_col], document_key(target)),
+            label=label
+        )
+        self._add(label, doc, (source, target))
+
+    def _add(self, col, doc, element):
+        # Keep the last version of a document seen in the batch so a batch never holds the same key twice, with the
+        # node id or (source, target) pair it was added as
+        self._buffer.setdefault(col, OrderedDict())[doc['_key']] = (element, doc)
+        self._buffered += 1
+        if self._buffered >= self.batch_size or time.monotonic() - self._last_flush >= self.flush_interval:
+            self._write()
+
+    def flush(self):
+        """
+        Write everything buffered, nodes first so edges never point at a node that has not been written yet
+
+        :return: set
+            node ids and (source, target) edges that could not be written, by this flush or by the ones batches
+            triggered since the previous call
+        """
+        self._write()
+        failed, self._failed = self._failed, set()
+        return failed
+
+    def _write(self):
+        buffer, self._buffer, self._buffered = self._buffer, {}, 0
+        self._last_flush = time.monotonic()
+        ordered = sorted(buffer.items(), key=lambda item: item[0] in EDGE_DEFINITIONS)
+        for col, docs in ordered:
+            try:
+                result = self.loader.write(col, [doc for _, doc in docs.values()])
+            except Exception as e:
+                logger.error("Could not write %d crawled documents to %s: %s" % (len(docs), col, e))
+                self._failed.update(element for element, _ in docs.values())
+                continue
+            if result.get('errors'):
+                # Which ones is not reported, the whole batch is taken as lost
+                logger.error("%d crawled documents were rejected by %s" % (result['errors'], col))
+                self._failed.update(element for element, _ in docs.values())
+                continue
+            written = sum(self._remember(element) for element, _ in docs.values())
+            if col in EDGE_DEFINITIONS:
+                self.edges_written += written
+            else:
+                self.nodes_written += written
+
+    def _remember(self, element):
+        # Whether the node id or (source, target) edge is written for the first time as far as _recent knows
+        new = element not in self._recent
+        self._recent[element] = True
+        self._recent.move_to_end(element)
+        while len(self._recent) > self.remember:
+            self._recent.popitem(last=False)
+        return new
+
+    def number_of_nodes(self):
+        return self.nodes_written
+
+    def number_of_edges(self):
+        return self.edges_written
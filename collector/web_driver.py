@@ -1,118 +1,263 @@
-import platform
-import requests
-import os
-import time
-from loguru import logger
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-import selenium.common.exceptions as scroll_errors
-from networkx import DiGraph
-
-cds = 'https://chromedriver.storage.googleapis.com/index.html?path=81.0.4044.138/'
-win = '%schromedriver_win32.zip' % cds
-mac = '%schromedriver_mac64.zip' % cds
-lnx = '%schromedriver_linux64.zip' % cds
-cd_exe = 'chromedriver.exe'
-driver_path = os.path.join(os.path.dirname(__file__), cd_exe)
-
-if cd_exe not in os.listdir(os.path.dirname(__file__)):
-    this_platform = {'os': platform.system(), 'ver': platform.release(), 'cpu': platform.machine()}
-    if this_platform['os'].upper() == 'WINDOWS':
-        driver_zip = requests.get(win, stream=True)
-    elif this_platform['os'].upper() == 'LINUX':
-        driver_zip = requests.get(lnx, stream=True)
-    else:
-        driver_zip = requests.get(mac, stream=True)
-    # Need this to extract but it's not TODO
-    with open(driver_path, 'wb') as fd:
-        for chunk in driver_zip.iter_content(chunk_size=500):
-            fd.write(chunk)
-
-else:
-    print("%s exists" % driver_path)
-
-
-def scroll(webdriver_path=driver_path, timeout=3, graph=DiGraph(), search_ids=None):
-    """
-    Use a more complex method to gather data that uses a web driver to scrape a page. It must go to the page and then
-    scroll to the bottom so it can gather all the posts, their authors and dates published so it can also be turned into
-    a graph
-    Parameters
-    ----------
-    webdriver_path (str)
-        where the chrome web driver is stored for establishing the driver
-    timeout (int)
-        how many seconds the driver should wait for the page to complete the re-load when scrolling
-    Returns
-    -------
-    """
-    # Driver is currently set for version 8.1 on windows
-    chrome_options = Options()
-    chrome_options.add_argument("--headless")
-    driver = webdriver.Chrome(executable_path=webdriver_path, chrome_options=chrome_options)
-    # Node and Edge containers which will be returned starting with the base site which is being collected
-    index = ['mediumcom']
-    if not graph.has_node('mediumcom'):
-        graph.add_node('mediumcom', description='Site with blogs')
-    # Start the driver on the url and the query if it exists.
-    if not search_ids:
-        search_ids = ['network%20graph%20visualization']
-    elif isinstance(search_ids, list):
-        # Create a search that consists of all the terms and put it at the beginning of the list
-        if len(search_ids) > 1:
-            search_ids.insert(0, '%20'.join(search_ids))
-    else:
-        search_ids = [search_ids]
-    # Get scroll height
-    last_height = driver.execute_script("return document.body.scrollHeight")
-    driver.find_elements_by_class_name('postArticle')
-    for search_id in search_ids:
-        # Set the driver on the search_id in the query
-        driver.get('https://medium.com/search?q=%s' % search_id)
-        # Normalize the ID now that the url is set
-        search_id = search_id.replace('%20', '_')
-        if not graph.has_node(search_id):
-            graph.add_node(search_id, description='Search term used to search blogs')
-        while True:
-            # Scroll down to bottom
-            driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-            # Wait to load page
-            logger.info(
-                'Collected %d posts. Scrolling for more...' % len(driver.find_elements_by_class_name('postArticle')))
-            time.sleep(timeout)
-            # Calculate new scroll height and compare with last scroll height
-            new_height = driver.execute_script("return document.body.scrollHeight")
-            if new_height == last_height or len(driver.find_elements_by_class_name('postArticle')) > 100:
-                # If heights are the same it will exit the function
-                break
-            last_height = new_height
-        # Collect all the posts to iterate through and assign to nodes and edges
-        posts = driver.find_elements_by_class_name('postArticle')
-        logger.info('Collected %s posts' % len(posts))
-        # Go through each post and extract an author (a_id), the post (b_id) and then create the edges
-        for post in posts:
-            try:
-                author = post.find_element_by_class_name('ds-link').text
-                link = post.find_element_by_class_name('ds-link').get_attribute("href")
-                date = post.find_element_by_tag_name('time').text
-                title = post.find_element_by_tag_name('h3').text
-                claps = post.find_element_by_class_name('multirecommend').text
-                # Create the author node
-                a_id = ''.join(e for e in author if e.isalnum()).lower()
-                if a_id not in index:
-                    graph.add_node(a_id, description=author, link=link)
-                    index.append(a_id)
-                # Create the article node
-                b_id = ''.join(e for e in title if e.isalnum()).lower()
-                if b_id not in index:
-                    graph.add_node(b_id, description="%s by %s" % (title, author), link=link, count=claps, date=date)
-                    index.append(b_id)
-                    graph.has_node(a_id)
-                if graph.has_node(a_id) and graph.has_node(b_id):
-                    graph.add_edge(a_id, b_id, label='Posted')
-                    graph.add_edge(b_id, 'mediumcom', label='PostedOn')
-                    graph.add_edge(search_id, b_id, label='FromSearch')
-            except scroll_errors.NoSuchElementException as error:
-                logger.error("Scrolling %s" % error.msg)
-
-    return graph
+import json
+import platform
+import requests
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from loguru import logger
+from selenium import webdriver
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.chrome.service import Service
+from selenium.webdriver.support.wait import WebDriverWait
+from networkx import DiGraph
+
+from collector.driver_pool import DriverPool
+from collector.posts import SEARCH_URL, add_site, add_search, add_posts, search_terms, node_id, written
+from collector.rate_limit import site_limits
+from monitoring.metrics import CRAWL_PAGES, CRAWL_POSTS, CRAWL_PAGE_SECONDS
+
+cds = 'https://chromedriver.storage.googleapis.com/index.html?path=81.0.4044.138/'
+win = '%schromedriver_win32.zip' % cds
+mac = '%schromedriver_mac64.zip' % cds
+lnx = '%schromedriver_linux64.zip' % cds
+cd_exe = 'chromedriver.exe'
+driver_path = os.path.join(os.path.dirname(__file__), cd_exe)
+
+# Most seconds to wait for more posts after a scroll and how often to look for them
+SCROLL_TIMEOUT = float(os.environ.get('SCROLL_TIMEOUT', 3))
+SCROLL_POLL = float(os.environ.get('SCROLL_POLL', 0.1))
+# When a search stops scrolling
+SCROLL_MAX_POSTS = int(os.environ.get('SCROLL_MAX_POSTS', 100))
+SCROLL_MAX_SCROLLS = int(os.environ.get('SCROLL_MAX_SCROLLS', 50))
+SCROLL_STOP_AT_KNOWN = os.environ.get('SCROLL_STOP_AT_KNOWN', '').lower() in ('1', 'true', 'yes')
+# Searches of a crawl read at the same time, each with a browser session
+SCROLL_CONCURRENCY = int(os.environ.get('SCROLL_CONCURRENCY', 2))
+
+# Height of the page and number of posts loaded so far
+MEASURE_PAGE = """
+return {height: document.body.scrollHeight, posts: document.getElementsByClassName('postArticle').length};
+"""
+
+# Read the posts on the page from the index given as the first argument inside the browser and return them as one JSON
+# array so they are extracted in a single round trip instead of one per field of every post
+EXTRACT_POSTS = '''
+var articles = Array.prototype.slice.call(document.getElementsByClassName('postArticle'), arguments[0] || 0);
+return JSON.stringify(articles.map(function (post) {
+    function text(selector) {
+        var element = post.querySelector(selector);
+        return element ? element.innerText : null;
+    }
+    var link = post.querySelector('.ds-link');
+    return {
+        author: text('.ds-link'),
+        link: link ? link.href : null,
+        date: text('time'),
+        title: text('h3'),
+        claps: text('.multirecommend')
+    };
+}));
+'''
+
+
+def ensure_driver(webdriver_path=driver_path):
+    """
+    Download chromedriver for this platform unless it is already there. Called when the first browser is started
+    rather than at import so importing the collector never needs the network.
+
+    :return: str
+        path of the driver
+    """
+    if os.path.exists(webdriver_path):
+        return webdriver_path
+    this_platform = {'os': platform.system(), 'ver': platform.release(), 'cpu': platform.machine()}
+    if this_platform['os'].upper() == 'WINDOWS':
+        driver_zip = requests.get(win, stream=True)
+    elif this_platform['os'].upper() == 'LINUX':
+        driver_zip = requests.get(lnx, stream=True)
+    else:
+        driver_zip = requests.get(mac, stream=True)
+    logger.info("Downloading chromedriver to %s" % webdriver_path)
+    # Need this to extract but it's not TODO
+    with open(webdriver_path, 'wb') as fd:
+        for chunk in driver_zip.iter_content(chunk_size=500):
+            fd.write(chunk)
+    return webdriver_path
+
+
+def new_driver(webdriver_path=driver_path):
+    # Driver is currently set for version 8.1 on windows
+    chrome_options = Options()
+    chrome_options.add_argument("--headless")
+    return webdriver.Chrome(service=Service(ensure_driver(webdriver_path)), options=chrome_options)
+
+
+def scroll(webdriver_path=driver_path, timeout=SCROLL_TIMEOUT, graph=None, search_ids=None, progress=None, pool=None,
+           concurrency=SCROLL_CONCURRENCY, max_posts=SCROLL_MAX_POSTS, max_scrolls=SCROLL_MAX_SCROLLS,
+           stop_at_known=SCROLL_STOP_AT_KNOWN, limiter=site_limits, seen=None):
+    """
+    Use a more complex method to gather data that uses a web driver to scrape a page. It must go to the page and then
+    scroll to the bottom so it can gather all the posts, their authors and dates published so it can also be turned into
+    a graph. Every search is read by a browser session of its own, several searches at the same time.
+    Parameters
+    ----------
+    webdriver_path (str)
+        where the chrome web driver is stored for establishing the driver
+    timeout (float)
+        most seconds to wait for more posts after a scroll, the wait ends as soon as they are there. Nothing new
+        within that time means the end of the results was reached
+    graph (DiGraph or collector.sink.ArangoGraphSink)
+        receives the nodes and edges, a new DiGraph by default. A sink writes them to the database page by page
+    search_ids (list)
+        search terms to crawl
+    progress (dict)
+        updated with the search being crawled and the number of posts collected so callers can report on the crawl
+    pool (collector.driver_pool.DriverPool)
+        browser sessions to borrow from, browsers are started for this crawl and quit when it ends by default
+    concurrency (int)
+        searches read at the same time, each needs a browser session
+    max_posts (int)
+        posts read per search, scrolling stops once that many are loaded
+    max_scrolls (int)
+        scrolls per search
+    stop_at_known (bool)
+        stop scrolling a search once a scroll only loads posts that are already known, to the seen store or else to
+        the graph
+    limiter (collector.rate_limit.RateLimiter)
+        spaces out the page loads and scrolls made to the site
+    seen (collector.seen.SeenStore)
+        posts read by earlier crawls, only the new or changed ones are added to the graph and every post read is
+        recorded in it
+    Returns
+    -------
+    graph
+    """
+    if graph is None:
+        graph = DiGraph()
+    if progress is None:
+        progress = {}
+    search_ids = search_terms(search_ids)
+    concurrency = max(1, min(concurrency, len(search_ids)))
+    crawl = Crawl(graph, progress, timeout, max_posts, max_scrolls, stop_at_known, limiter, seen)
+    if pool is not None:
+        return crawl.run(pool, search_ids, concurrency)
+    # Without a pool the browsers only live for this crawl
+    pool = DriverPool(partial(new_driver, webdriver_path), size=concurrency, max_pages=0, max_memory=0)
+    try:
+        return crawl.run(pool, search_ids, concurrency)
+    finally:
+        pool.close()
+
+
+class Crawl:
+    """
+    The searches of one scroll call. Browsers read pages in parallel while the graph, which is not thread safe, is
+    only touched under a lock.
+    """
+
+    def __init__(self, graph, progress, timeout, max_posts, max_scrolls, stop_at_known, limiter, seen=None):
+        self.graph = graph
+        self.progress = progress
+        self.timeout = timeout
+        self.max_posts = max_posts
+        self.max_scrolls = max_scrolls
+        self.stop_at_known = stop_at_known
+        self.limiter = limiter
+        self.seen = seen
+        self._lock = threading.Lock()
+        # Node and Edge containers which will be returned starting with the base site which is being collected
+        with self._lock:
+            self.index = {add_site(graph)}
+
+    def run(self, pool, search_ids, concurrency):
+        def read(search_id):
+            with pool.session() as session:
+                self.search(session, search_id)
+        if concurrency == 1:
+            for search_id in search_ids:
+                read(search_id)
+        else:
+            with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='scroll') as executor:
+                # Raise the first failure once every search has finished
+                for future in [executor.submit(read, search_id) for search_id in search_ids]:
+                    future.result()
+        return self.graph
+
+    def fresh(self, search_id, posts):
+        # Posts to turn into nodes and edges, all of them without a seen store
+        return posts if self.seen is None else self.seen.new_or_changed(search_id, posts)
+
+    def all_known(self, search_id, posts):
+        if self.seen is not None:
+            return not self.seen.new_or_changed(search_id, posts)
+        with self._lock:
+            return all(post.get('title') and self.graph.has_node(node_id(post['title'])) for post in posts)
+
+    def wait(self, driver, posts, height=None):
+        """
+        Wait until the page holds more than posts posts or its height changed, at most timeout seconds
+
+        Returns
+        -------
+        dict
+            the new height and number of posts, None when nothing changed in time
+        """
+        def grown(driver):
+            page = driver.execute_script(MEASURE_PAGE)
+            return page if page['posts'] > posts or (height is not None and page['height'] != height) else False
+        try:
+            return WebDriverWait(driver, self.timeout, poll_frequency=SCROLL_POLL).until(grown)
+        except TimeoutException:
+            return None
+
+    def search(self, session, search_id):
+        driver = session.driver
+        started = time.perf_counter()
+        url = SEARCH_URL % search_id
+        # Set the driver on the search_id in the query
+        self.limiter.wait(url)
+        driver.get(url)
+        session.pages += 1
+        # Measured on this search's page, the first posts may still be loading
+        page = self.wait(driver, 0) or driver.execute_script(MEASURE_PAGE)
+        posts = json.loads(driver.execute_script(EXTRACT_POSTS, 0))
+        scrolls = 0
+        while len(posts) < self.max_posts and scrolls < self.max_scrolls:
+            self.limiter.wait(url)
+            # Scroll down to bottom
+            driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+            scrolls += 1
+            page = self.wait(driver, page['posts'], page['height'])
+            if page is None:
+                # Nothing more loaded, the end of the results
+                break
+            # Only the posts the scroll added are read
+            new = json.loads(driver.execute_script(EXTRACT_POSTS, len(posts)))
+            posts.extend(new)
+            logger.info('Collected %d posts. Scrolling for more...' % len(posts))
+            if self.stop_at_known and new and self.all_known(search_id, new):
+                logger.info('Search %s reached posts that are already known' % search_id)
+                break
+        posts = posts[:self.max_posts]
+        fresh = self.fresh(search_id, posts)
+        logger.info('Collected %s posts, %d new or changed, in %d scrolls' % (len(posts), len(fresh), scrolls))
+        CRAWL_PAGE_SECONDS.observe(time.perf_counter() - started, engine='chrome')
+        CRAWL_PAGES.inc(engine='chrome')
+        CRAWL_POSTS.inc(len(posts), engine='chrome')
+        with self._lock:
+            # Normalize the ID now that the url is set
+            search_node = add_search(self.graph, search_id)
+            self.progress['search'] = search_node
+            self.progress['posts'] = self.progress.get('posts', 0) + len(posts)
+            if self.seen is not None:
+                self.progress['new'] = self.progress.get('new', 0) + len(fresh)
+            add_posts(self.graph, fresh, search_node, self.index)
+            # Sinks write what the page added before the next search is crawled
+            failed = self.graph.flush() if hasattr(self.graph, 'flush') else None
+        if self.seen is not None:
+            # Posts that could not be written stay new and the search due for the next crawl
+            self.seen.record(search_id, written(posts, search_node, failed))
+            if not failed:
+                self.seen.crawled(search_id, posts=len(posts), new=len(fresh))
@@ -0,0 +1,466 @@
+"""
+In process adjacency of a whole graph for the hottest lookups, the neighbors of a node and its two hop expansion.
+Vertex ids are interned in a table and the edges of both directions are held as compressed sparse rows in NumPy
+arrays: the neighbors of vertex i are targets[offsets[i]:offsets[i + 1]] with the edge collection of each in labels.
+Vertex documents are kept next to the table so an expansion never goes to the database.
+
+    index = AdjacencyIndex('test_graph2', max_bytes=256 * 2 ** 20)
+    index.load(vertices, edges)
+    index.neighbors('Tag/1')
+
+Writes made through database.db_arango are applied as they happen with apply_write. Edges the index does not hold
+yet go to a small delta that is merged into the arrays once it holds max_delta edges, deletions and writes that
+bypass db_arango are only seen by the next load.
+"""
+import json
+import threading
+import time
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+DIRECTIONS = ('OUTBOUND', 'INBOUND', 'ANY')
+# Attributes holding the graph, swapped as a whole when a new graph is loaded
+_STATE = ('_ids', '_position', '_id_bytes', '_docs', '_doc_bytes', '_labels', '_label_position', '_out', '_in',
+          '_delta')
+
+
+def _convert(doc):
+    # Same node as GraphAssembler.add_node makes of the document
+    node = {k: v for k, v in doc.items() if k not in ('_id', '_key', '_rev')}
+    node['key'] = doc['_id']
+    return node
+
+
+def _doc_id(col, doc):
+    if doc.get('_id'):
+        return doc['_id']
+    if doc.get('_key'):
+        return '%s/%s' % (col, doc['_key'])
+    return None
+
+
+class _Rows:
+    """
+    One direction of the adjacency as compressed sparse rows
+    """
+
+    def __init__(self, ends, others, labels, vertices):
+        order = numpy.argsort(ends, kind='stable')
+        self.offsets = numpy.zeros(vertices + 1, dtype=numpy.int64)
+        numpy.cumsum(numpy.bincount(ends, minlength=vertices), out=self.offsets[1:])
+        self.targets = others[order]
+        self.labels = labels[order]
+
+    @property
+    def nbytes(self):
+        return self.offsets.nbytes + self.targets.nbytes + self.labels.nbytes
+
+    def expand(self, frontier):
+        """
+        :param frontier: numpy.ndarray
+            vertex positions, all below the number of vertices the rows were built for
+        :return: tuple of numpy.ndarray
+            (position in frontier of the vertex each edge starts from, other end, label) of every edge
+        """
+        starts, ends = self.offsets[frontier], self.offsets[frontier + 1]
+        counts = ends - starts
+        total = int(counts.sum())
+        parents = numpy.repeat(numpy.arange(len(frontier)), counts)
+        # Position of every edge in the flat arrays, the start of its row plus its rank within the row
+        first = numpy.cumsum(counts) - counts
+        positions = numpy.repeat(starts - first, counts) + numpy.arange(total)
+        return parents, self.targets[positions], self.labels[positions]
+
+
+class AdjacencyIndex:
+    """
+    Adjacency of one named graph held in memory. Expansions return the same graph as the traversal queries, in the
+    format of GraphAssembler.graph, or None when the index cannot answer and the database has to be asked: the index
+    is not loaded, the start vertex is unknown or an edge leads to a vertex whose document was never loaded.
+
+    Returned nodes are copies and can be modified by the caller.
+
+    :param graph: str
+        named graph the index holds
+    :param max_bytes: int
+        approximate size of the arrays and the JSON size of the documents together. A graph that does not fit is
+        not loaded and a delta that makes it outgrow the bound unloads it
+    :param max_delta: int
+        edges written since the last load that are kept aside before the arrays are rebuilt with them
+    """
+
+    def __init__(self, graph, max_bytes=256 * 2 ** 20, max_delta=10000):
+        if numpy is None:
+            raise RuntimeError("The adjacency index needs numpy")
+        self.graph = graph
+        self.max_bytes = max_bytes
+        self.max_delta = max_delta
+        self.loaded_at = None
+        self.edge_collections = frozenset()
+        self.vertex_collections = frozenset()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # Writes seen while a new graph is being loaded, None when no load is running
+        self._writes = None
+        self._clear()
+
+    def _clear(self):
+        self._ids = []
+        self._position = {}
+        self._id_bytes = 0
+        self._docs = []
+        self._doc_bytes = 0
+        self._labels = []
+        self._label_position = {}
+        self._out = self._in = None
+        # Edges written since the load as (source, target, label) positions, a dict keeps them in order and once each
+        self._delta = {}
+
+    def __len__(self):
+        return len(self._ids)
+
+    @property
+    def loaded(self):
+        return self.loaded_at is not None
+
+    @property
+    def nbytes(self):
+        arrays = self._out.nbytes + self._in.nbytes if self._out is not None else 0
+        return arrays + self._id_bytes + self._doc_bytes
+
+    def _intern(self, vertex_id):
+        position = self._position.get(vertex_id)
+        if position is None:
+            position = self._position[vertex_id] = len(self._ids)
+            self._ids.append(vertex_id)
+            self._docs.append(None)
+            # The id with its share of the position dict and the tables
+            self._id_bytes += len(vertex_id) + 100
+        return position
+
+    def _label(self, col):
+        position = self._label_position.get(col)
+        if position is None:
+            position = self._label_position[col] = len(self._labels)
+            self._labels.append(col)
+        return position
+
+    def _set_doc(self, doc, merge=False):
+        position = self._intern(doc['_id'])
+        previous = self._docs[position]
+        node = _convert(doc)
+        if previous is not None:
+            self._doc_bytes -= len(json.dumps(previous, default=str))
+            if merge:
+                node = dict(previous, **node)
+        self._docs[position] = node
+        self._doc_bytes += len(json.dumps(node, default=str))
+
+    def _has_edge(self, source, target, label):
+        if (source, target, label) in self._delta:
+            return True
+        out = self._out
+        if source >= len(out.offsets) - 1:
+            return False
+        start, end = out.offsets[source], out.offsets[source + 1]
+        return bool(numpy.any((out.targets[start:end] == target) & (out.labels[start:end] == label)))
+
+    def _build(self, sources, targets, labels):
+        count = len(self._ids)
+        self._out = _Rows(sources, targets, labels, count)
+        self._in = _Rows(targets, sources, labels, count)
+
+    def load(self, vertices, edges, edge_collections=None, vertex_collections=None):
+        """
+        Replace the index with a graph. The new graph is built aside so expansions keep being answered from the
+        current one meanwhile, writes made during the load are applied to the new graph before it is swapped in.
+
+        :param vertices: iterable of dict
+            vertex documents with their _id
+        :param edges: iterable of tuple
+            (edge collection, _from, _to) of every edge
+        :param edge_collections: iterable of str
+            collections of the graph, writes to them are applied to the index. Defaults to those seen in edges
+        :param vertex_collections: iterable of str
+            defaults to the collections of the vertices
+        :return: bool
+            whether the graph fits in max_bytes and was loaded
+        """
+        with self._lock:
+            self._writes = []
+        staged = AdjacencyIndex(self.graph, self.max_bytes, self.max_delta)
+        fits = staged._fill(vertices, edges)
+        with self._lock:
+            writes, self._writes = self._writes, None
+            if not fits:
+                return self._unload()
+            for name in _STATE:
+                setattr(self, name, getattr(staged, name))
+            self.edge_collections = frozenset(edge_collections if edge_collections is not None else self._labels)
+            self.vertex_collections = frozenset(
+                vertex_collections if vertex_collections is not None else {i.partition('/')[0] for i in self._ids})
+            self.loaded_at = time.monotonic()
+            for col, docs in writes:
+                self._apply(col, docs)
+            return self.loaded
+
+    def _fill(self, vertices, edges):
+        for doc in vertices:
+            self._set_doc(doc)
+            if self._doc_bytes > self.max_bytes:
+                return False
+        sources, targets, labels = [], [], []
+        for col, source, target in edges:
+            sources.append(self._intern(source))
+            targets.append(self._intern(target))
+            labels.append(self._label(col))
+            # Give up early on a graph that is too big, an edge costs about 30 bytes in the arrays of both directions
+            if not len(sources) % 65536 and self._id_bytes + self._doc_bytes + len(sources) * 30 > self.max_bytes:
+                return False
+        self._build(numpy.array(sources, dtype=numpy.int32), numpy.array(targets, dtype=numpy.int32),
+                    numpy.array(labels, dtype=numpy.int16))
+        return self.nbytes <= self.max_bytes
+
+    def _unload(self):
+        self._clear()
+        self.loaded_at = None
+        return False
+
+    def apply_write(self, col, docs):
+        """
+        Write listener for database.db_arango keeping a loaded index up to date with the documents written.
+        Written fields are merged into the vertex documents and edges the index does not hold yet are added to the
+        delta, so upserting the same edges again leaves the index as it is.
+        """
+        with self._lock:
+            if self._writes is not None:
+                self._writes.append((col, list(docs)))
+            if self.loaded:
+                self._apply(col, docs)
+
+    def _apply(self, col, docs):
+        if col in self.edge_collections:
+            for doc in docs:
+                if '_from' in doc and '_to' in doc:
+                    edge = (self._intern(doc['_from']), self._intern(doc['_to']), self._label(col))
+                    if not self._has_edge(*edge):
+                        self._delta[edge] = None
+            if len(self._delta) >= self.max_delta:
+                self._merge()
+        elif col in self.vertex_collections:
+            for doc in docs:
+                doc_id = _doc_id(col, doc)
+                if doc_id is not None:
+                    # Updates carry only the fields written
+                    self._set_doc(dict(doc, _id=doc_id), merge=True)
+        else:
+            return
+        if self.nbytes > self.max_bytes:
+            self._unload()
+
+    def _merge(self):
+        # Rebuild the rows with the delta, the edges already held are read back from the outbound rows
+        out = self._out
+        held = len(out.offsets) - 1
+        sources = numpy.repeat(numpy.arange(held, dtype=numpy.int32), numpy.diff(out.offsets))
+        delta = numpy.array(list(self._delta), dtype=numpy.int64).reshape(-1, 3)
+        self._build(numpy.concatenate([sources, delta[:, 0].astype(numpy.int32)]),
+                    numpy.concatenate([out.targets, delta[:, 1].astype(numpy.int32)]),
+                    numpy.concatenate([out.labels, delta[:, 2].astype(numpy.int16)]))
+        self._delta = {}
+
+    def _step(self, frontier, direction, mask):
+        # Every edge leaving the frontier as arrays of (position in frontier, other end, label, outbound)
+        held = len(self._out.offsets) - 1
+        rows = [(self._out, True), (self._in, False)]
+        if direction != 'ANY':
+            rows = rows[:1] if direction == 'OUTBOUND' else rows[1:]
+        parts = []
+        in_rows = numpy.flatnonzero(frontier < held)
+        for adjacency, outbound in rows:
+            parents, others, labels = adjacency.expand(frontier[in_rows])
+            parts.append((in_rows[parents], others, labels, numpy.full(len(others), outbound)))
+        if self._delta:
+            where = {v: i for i, v in enumerate(frontier.tolist())}
+            delta = []
+            for source, target, label in self._delta:
+                if direction != 'INBOUND' and source in where:
+                    delta.append((where[source], target, label, True))
+                if direction != 'OUTBOUND' and target in where:
+                    delta.append((where[target], source, label, False))
+            if delta:
+                columns = list(zip(*delta))
+                parts.append(tuple(numpy.array(c) for c in columns))
+        parents, others, labels, outbound = (numpy.concatenate(c) for c in zip(*parts))
+        if mask is not None:
+            keep = mask[labels]
+            parents, others, labels, outbound = parents[keep], others[keep], labels[keep], outbound[keep]
+        return parents, others, labels, outbound
+
+    def _mask(self, edge_collections):
+        if not edge_collections:
+            return None
+        mask = numpy.zeros(len(self._labels), dtype=bool)
+        for col in edge_collections:
+            if col in self._label_position:
+                mask[self._label_position[col]] = True
+        return mask
+
+    def _can_answer(self, graph, vertex_ids, edge_collections):
+        if not self.loaded or graph != self.graph:
+            return False
+        if edge_collections and not set(edge_collections) <= self.edge_collections:
+            return False
+        return all(vertex_id in self._position and self._docs[self._position[vertex_id]] is not None
+                   for vertex_id in vertex_ids)
+
+    def _lines(self, frontier, parents, others, labels, outbound):
+        lines = {}
+        ids, names = self._ids, self._labels
+        for parent, other, label, out in zip(frontier[parents].tolist(), others.tolist(), labels.tolist(),
+                                              outbound.tolist()):
+            source, target = (parent, other) if out else (other, parent)
+            line_id = (ids[source], ids[target], names[label])
+            if line_id not in lines:
+                lines[line_id] = {'source': line_id[0], 'target': line_id[1], 'label': line_id[2]}
+        return lines
+
+    def _nodes(self, positions):
+        nodes = []
+        for position in positions:
+            doc = self._docs[position]
+            if doc is None:
+                return None
+            nodes.append(dict(doc))
+        return nodes
+
+    def _answer(self, graph):
+        if graph is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return graph
+
+    def neighbors(self, vertex_ids, graph=None):
+        """
+        Nodes one edge away in either direction like the neighbors and neighbors_batch queries. The start vertices
+        are not part of the nodes unless they are neighbors themselves.
+
+        :param vertex_ids: str or list of str
+            one vertex or several, with several every node and line gets the seeds list of get_neighbors_batch
+        :param graph: str
+            named graph of the request, only the graph of the index is answered
+        :return: graph: dict or None
+        """
+        seeds = [vertex_ids] if isinstance(vertex_ids, str) else list(vertex_ids)
+        with self._lock:
+            if not self._can_answer(self.graph if graph is None else graph, seeds, None):
+                return self._answer(None)
+            frontier = numpy.array([self._position[s] for s in seeds], dtype=numpy.int64)
+            parents, others, labels, outbound = self._step(frontier, 'ANY', None)
+            # First appearance of every neighbor in the order the edges were found
+            found, first = numpy.unique(others, return_index=True)
+            positions = others[numpy.sort(first)].tolist()
+            nodes = self._nodes(positions)
+            if nodes is None:
+                return self._answer(None)
+            lines = self._lines(frontier, parents, others, labels, outbound)
+            if not isinstance(vertex_ids, str):
+                self._seed(seeds, nodes, positions, lines, frontier, parents, others, labels, outbound)
+        return self._answer({'index': [n['key'] for n in nodes], 'nodes': nodes, 'lines': list(lines.values())})
+
+    def _seed(self, seeds, nodes, positions, lines, frontier, parents, others, labels, outbound):
+        node_at = dict(zip(positions, nodes))
+        ids, names = self._ids, self._labels
+        for parent, other, label, out in zip(parents.tolist(), others.tolist(), labels.tolist(), outbound.tolist()):
+            seed = seeds[parent]
+            start = int(frontier[parent])
+            source, target = (start, other) if out else (other, start)
+            for element in (node_at[other], lines[(ids[source], ids[target], names[label])]):
+                element_seeds = element.setdefault('seeds', [])
+                if seed not in element_seeds:
+                    element_seeds.append(seed)
+
+    def k_hop(self, vertex_id, max_depth=2, limit=None, graph=None, direction='ANY', edge_collections=None):
+        """
+        Breadth first expansion like the k_hop query: the start vertex and every vertex within max_depth edges,
+        each reached once through the first edge found to it, closest first and at most limit of them
+
+        :param vertex_id: str
+        :param max_depth: int
+        :param limit: int
+        :param graph: str
+        :param direction: str
+            OUTBOUND, INBOUND or ANY
+        :param edge_collections: list of str
+            only follow edges in these collections
+        :return: graph: dict or None
+        """
+        if direction not in DIRECTIONS:
+            raise ValueError("Direction must be one of %s, got %s" % (', '.join(DIRECTIONS), direction))
+        with self._lock:
+            if not self._can_answer(self.graph if graph is None else graph, [vertex_id], edge_collections):
+                return self._answer(None)
+            start = self._position[vertex_id]
+            limit = len(self._ids) if limit is None else int(limit)
+            visited = numpy.zeros(len(self._ids), dtype=bool)
+            visited[start] = True
+            positions, lines = [start], {}
+            frontier = numpy.array([start], dtype=numpy.int64)
+            mask = self._mask(edge_collections)
+            for _ in range(int(max_depth)):
+                if len(positions) >= limit or not len(frontier):
+                    break
+                parents, others, labels, outbound = self._step(frontier, direction, mask)
+                new = numpy.flatnonzero(~visited[others])
+                # The first edge to each vertex not seen yet reaches it
+                _, first = numpy.unique(others[new], return_index=True)
+                reached = new[numpy.sort(first)][:limit - len(positions)]
+                visited[others[reached]] = True
+                positions.extend(others[reached].tolist())
+                lines.update(self._lines(frontier, parents[reached], others[reached], labels[reached],
+                                         outbound[reached]))
+                frontier = others[reached].astype(numpy.int64)
+            nodes = self._nodes(positions[:limit])
+            if nodes is None:
+                return self._answer(None)
+        return self._answer({'index': [n['key'] for n in nodes], 'nodes': nodes, 'lines': list(lines.values())})
+
+    def lines_between(self, vertex_ids, graph=None, edge_collections=None):
+        """
+        Every line between the given vertices, the subgraph they induce, like the induced_edges query
+
+        :param vertex_ids: list of str
+        :param graph: str
+        :param edge_collections: list of str
+            only lines of these collections
+        :return: list or None
+        """
+        with self._lock:
+            if not self._can_answer(self.graph if graph is None else graph, vertex_ids, edge_collections):
+                return self._answer(None)
+            frontier = numpy.array([self._position[v] for v in vertex_ids], dtype=numpy.int64)
+            members = numpy.zeros(len(self._ids), dtype=bool)
+            members[frontier] = True
+            parents, others, labels, outbound = self._step(frontier, 'OUTBOUND', self._mask(edge_collections))
+            keep = members[others]
+            lines = self._lines(frontier, parents[keep], others[keep], labels[keep], outbound[keep])
+        return self._answer(list(lines.values()))
+
+    def stats(self):
+        with self._lock:
+            return {
+                'graph': self.graph,
+                'loaded': self.loaded,
+                'vertices': len(self._ids),
+                'edges': (len(self._out.targets) if self._out is not None else 0) + len(self._delta),
+                'delta': len(self._delta),
+                'bytes': self.nbytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses
+            }
@@ -1,11 +1,267 @@
-def search(term):
-    return '''
-    FOR d in v_search_test SEARCH d.name == '%s' RETURN d
-    ''' % term
-
-
-def neighbors(node_key):
-    return '''
-    FOR v, e, p IN 1 ANY '%s' GRAPH 'test_graph2'
-      RETURN {v, e}
-    ''' % node_key
+"""
+Catalog of every AQL query the application runs. Queries are registered once under a name with constant text and
+all values, including collection and view names, are passed as bind parameters. ArangoDB can then reuse the plan and
+the query result cache for a query whatever the user typed, and user input is never spliced into AQL.
+
+    query, bind_vars = bind('search', term='python')
+    db.aql.execute(query, bind_vars=bind_vars)
+
+prepare(db) validates every query and logs the optimizer plan and estimated cost of each, it is meant to be run once
+when the application starts.
+"""
+import re
+from collections import namedtuple
+
+from loguru import logger
+
+SEARCH_VIEW = 'v_search_test'
+DEFAULT_GRAPH = 'test_graph2'
+TYPEAHEAD_ANALYZER = 'edge_ngram'
+DIRECTIONS = ('OUTBOUND', 'INBOUND', 'ANY')
+# Traversals restricted to edge collections get one query per number of collections, up to this many
+MAX_EDGE_COLLECTIONS = 4
+
+# Values used to explain the queries at startup, queries with a parameter not listed here are only validated
+EXPLAIN_VALUES = {
+    'view': SEARCH_VIEW,
+    'graph': DEFAULT_GRAPH,
+    'term': 'sample',
+    'start': 'Tag/sample',
+    'seeds': ['Tag/sample'],
+    'vertices': ['Tag/sample'],
+    'target': 'Tag/sample',
+    'k': 3,
+    'max_depth': 2,
+    'limit': 100,
+    'prefix': 'sam',
+    'short': [],
+    'analyzer': TYPEAHEAD_ANALYZER,
+    'collection': 'Tag',
+    'attribute': 'name'
+}
+
+Query = namedtuple('Query', ['name', 'text', 'params'])
+
+QUERIES = {}
+# Name of every registered query text, to recognize the query behind a cursor in logs and metrics
+_NAMES = {}
+
+_BIND_PARAM = re.compile(r'(?<![@\w])@(@?\w+)')
+
+
+def register(name, text):
+    """
+    Add a query to the catalog. Its bind parameters are read from the text, @name for values and @@name for
+    collections and views which are both passed to bind as name=value.
+
+    :param name: str
+        unique name the models use to run the query
+    :param text: str
+        AQL query text
+    :return: Query
+    """
+    if name in QUERIES:
+        raise ValueError("Query %s is already registered" % name)
+    params = {p.lstrip('@'): p for p in _BIND_PARAM.findall(text)}
+    QUERIES[name] = Query(name, text, params)
+    _NAMES[text] = name
+    return QUERIES[name]
+
+
+def query_name(text):
+    """
+    :return: str
+        name of a registered query text, adhoc for queries that are not part of the catalog
+    """
+    return _NAMES.get(text, 'adhoc')
+
+
+def bind(name, **values):
+    """
+    Get the text and bind variables to run a catalog query with
+
+    :param name: str
+        name the query was registered with
+    :param values:
+        value for every bind parameter of the query, view, graph and analyzer default to SEARCH_VIEW,
+        DEFAULT_GRAPH and TYPEAHEAD_ANALYZER
+    :return: tuple
+        (query, bind_vars)
+    """
+    try:
+        query = QUERIES[name]
+    except KeyError:
+        raise ValueError("Unknown query %s" % name)
+    values = dict({'view': SEARCH_VIEW, 'graph': DEFAULT_GRAPH, 'analyzer': TYPEAHEAD_ANALYZER}, **values)
+    missing = set(query.params) - set(values)
+    if missing:
+        raise ValueError("Query %s is missing bind parameters %s" % (name, ', '.join(sorted(missing))))
+    return query.text, {query.params[p]: values[p] for p in query.params}
+
+
+def _direction(direction):
+    direction = str(direction).upper()
+    if direction not in DIRECTIONS:
+        raise ValueError("Direction must be one of %s, got %s" % (', '.join(DIRECTIONS), direction))
+    return direction
+
+
+def _traversal_name(kind, direction, edge_count):
+    name = '%s.%s' % (kind, direction.lower())
+    return '%s.edges%d' % (name, edge_count) if edge_count else name
+
+
+def traversal(kind, direction='ANY', edge_collections=None, **values):
+    """
+    Bind one of the traversal queries. A direction cannot be a bind parameter and a list of edge collections has to
+    be spelled out in the query, so each combination of direction and number of edge collections is its own query.
+    Restricting the edge collections in the traversal itself means ArangoDB never follows the other edges, rather
+    than following them and filtering later.
+
+    :param kind: str
+        shortest_path, shortest_path_bounded, k_shortest_paths, k_hop or induced_edges
+    :param direction: str
+        OUTBOUND, INBOUND or ANY
+    :param edge_collections: list of str
+        only follow edges in these collections instead of the whole graph
+    :return: tuple
+        (query, bind_vars)
+    """
+    edge_collections = list(edge_collections or ())
+    if len(edge_collections) > MAX_EDGE_COLLECTIONS:
+        raise ValueError("At most %d edge collections can be given" % MAX_EDGE_COLLECTIONS)
+    values.update(('edge%d' % i, col) for i, col in enumerate(edge_collections))
+    return bind(_traversal_name(kind, _direction(direction), len(edge_collections)), **values)
+
+
+def prepare(db):
+    """
+    Validate every query in the catalog and log the plan the optimizer picks for it with its estimated cost. A query
+    that does not parse stops the application from starting. A query that cannot be explained, usually because a
+    collection does not exist yet, is only logged.
+
+    :param db: arango.database.StandardDatabase
+    :return: dict
+        estimated cost of each query that could be explained
+    """
+    costs = {}
+    for query in QUERIES.values():
+        db.aql.validate(query.text)
+        if not set(query.params) <= set(EXPLAIN_VALUES):
+            logger.info("Query %s validated" % query.name)
+            continue
+        try:
+            plan = db.aql.explain(query.text, bind_vars={query.params[p]: EXPLAIN_VALUES[p] for p in query.params})
+        except Exception as e:
+            logger.warning("Query %s validated but could not be explained: %s" % (query.name, e))
+            continue
+        costs[query.name] = plan.get('estimatedCost')
+        logger.info("Query %s estimated cost %s, plan: %s, rules: %s" % (
+            query.name, costs[query.name], ' > '.join(node['type'] for node in plan.get('nodes', [])),
+            ', '.join(plan.get('rules', [])) or 'none'))
+    return costs
+
+
+register('search', '''
+    FOR d IN @@view SEARCH d.name == @term RETURN d
+    ''')
+
+# Every word typed must be the start of a word in the name. The prefix is split into the same edge n-grams the
+# names were indexed with so each word is a term lookup in the view. Words shorter than the shortest n-gram have no
+# tokens, @short lists them and they are matched against the words of the names the view found
+register('typeahead', '''
+    FOR d IN @@view
+      SEARCH ANALYZER(TOKENS(@prefix, @analyzer) ALL == d.name, @analyzer)
+      FILTER LENGTH(FOR s IN @short FOR w IN SPLIT(LOWER(d.name), ' ') FILTER STARTS_WITH(w, s) RETURN DISTINCT s)
+        == LENGTH(@short)
+      SORT BM25(d) DESC, d.name
+      LIMIT @limit
+      RETURN d
+    ''')
+
+register('popular_names', '''
+    FOR d IN @@collection
+      SORT d[@attribute] DESC
+      LIMIT @limit
+      RETURN d
+    ''')
+
+register('neighbors', '''
+    FOR v, e IN 1 ANY @start GRAPH @graph
+      RETURN {v, e}
+    ''')
+
+# Whole collections read to load the adjacency index of a graph, edges as [_from, _to] pairs to keep them small
+register('adjacency_vertices', '''
+    FOR v IN @@collection
+      RETURN v
+    ''')
+
+register('adjacency_edges', '''
+    FOR e IN @@collection
+      RETURN [e._from, e._to]
+    ''')
+
+# Neighbors of several nodes in one query. Every row names the seed it was reached from so the merged graph can
+# tell which expansion each element belongs to
+register('neighbors_batch', '''
+    FOR seed IN @seeds
+      FOR v, e IN 1 ANY seed GRAPH @graph
+        RETURN {seed, v, e}
+    ''')
+
+# Single shortest path returned as {v, e} rows where e is the edge used to reach v
+_SHORTEST_PATH = '''
+    FOR v, e IN {direction} SHORTEST_PATH @start TO @target {over}
+      RETURN {{v, e}}
+    '''
+
+# Same path but empty when it has more than max_depth edges
+_SHORTEST_PATH_BOUNDED = '''
+    LET path = (
+      FOR v, e IN {direction} SHORTEST_PATH @start TO @target {over}
+        RETURN {{v, e}}
+    )
+    FILTER LENGTH(path) - 1 <= @max_depth
+    FOR r IN path
+      RETURN r
+    '''
+
+# K_PATHS only enumerates paths of at most max_depth edges, so the search ends however few of them there are, which
+# K_SHORTEST_PATHS never does on its own. Sorted shortest first before LIMIT keeps the k shortest. Every vertex of
+# every path is returned as a {v, e} row
+_K_SHORTEST_PATHS = '''
+    FOR p IN 1..@max_depth {direction} K_PATHS @start TO @target {over}
+      SORT LENGTH(p.edges)
+      LIMIT @k
+      FOR i IN 0..LENGTH(p.vertices) - 1
+        RETURN {{v: p.vertices[i], e: i > 0 ? p.edges[i - 1] : null}}
+    '''
+
+# Breadth first expansion including the start vertex. Each vertex is visited once and LIMIT ends the traversal in
+# the database once enough rows have been produced
+_K_HOP = '''
+    FOR v, e IN 0..@max_depth {direction} @start {over}
+      OPTIONS {{bfs: true, uniqueVertices: 'global'}}
+      LIMIT @limit
+      RETURN {{v, e}}
+    '''
+
+# Edges between a set of vertices, the subgraph they induce. The vertices are also turned into an object so the
+# membership test is a hash lookup rather than a scan of the list
+_INDUCED_EDGES = '''
+    LET members = ZIP(@vertices, @vertices)
+    FOR start IN @vertices
+      FOR v, e IN 1 {direction} start {over}
+        FILTER HAS(members, v._id)
+        RETURN {{e: KEEP(e, '_id', '_from', '_to')}}
+    '''
+
+for _kind, _template in [('shortest_path', _SHORTEST_PATH), ('shortest_path_bounded', _SHORTEST_PATH_BOUNDED),
+                         ('k_shortest_paths', _K_SHORTEST_PATHS), ('k_hop', _K_HOP),
+                         ('induced_edges', _INDUCED_EDGES)]:
+    for _direction_name in DIRECTIONS:
+        for _count in range(MAX_EDGE_COLLECTIONS + 1):
+            _over = ', '.join('@@edge%d' % i for i in range(_count)) if _count else 'GRAPH @graph'
+            register(_traversal_name(_kind, _direction_name, _count),
+                     _template.format(direction=_direction_name, over=_over))
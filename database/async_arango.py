@@ -0,0 +1,207 @@
+import asyncio
+import functools
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from loguru import logger
+
+from database.aql import query_name
+from database.db_arango import received_bytes, close_db_connection
+from monitoring.metrics import QUERY_SECONDS, CURSOR_FETCH_SECONDS, QUERY_PROFILE_SAMPLE, record_query
+
+
+class AsyncDatabase:
+    """
+    Awaitable access to an arango.database.StandardDatabase for the Quart handlers. python-arango is a blocking
+    client so every call is run on a bounded pool of worker threads that share the pooled HTTP session created by
+    connect_to_db. The event loop is never blocked by a query and the number of queries in flight at any time is
+    capped by max_concurrency, extra callers wait their turn on the semaphore instead of piling up on ArangoDB.
+
+    :param db: arango.database.StandardDatabase
+        database created by connect_to_db, ideally with pool_size >= max_concurrency
+    :param max_concurrency: int
+        number of queries that may run against the database at the same time
+    :param timeout: float
+        seconds a caller waits for a query (including the time spent queued) before asyncio.TimeoutError is raised.
+        The same value is sent to ArangoDB as max_runtime so the server also gives up on the query
+    """
+
+    def __init__(self, db, max_concurrency=16, timeout=30.0):
+        self.db = db
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='arango')
+        self._semaphore = None
+
+    def _limit(self):
+        # The semaphore binds to the loop that first uses it so create it on first use rather than at import
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def run(self, fn, *args, **kwargs):
+        """
+        Run any blocking python-arango call on the worker pool and wait for it without blocking the event loop
+
+        :param fn: callable
+            blocking function such as db.collection('Tag').get
+        :return:
+            whatever fn returns
+        """
+        loop = asyncio.get_running_loop()
+        call = functools.partial(fn, *args, **kwargs)
+
+        async def _queued():
+            async with self._limit():
+                return await loop.run_in_executor(self._executor, call)
+        return await asyncio.wait_for(_queued(), self.timeout)
+
+    def _execute(self, query, bind_vars, kwargs):
+        # Runs on a worker thread. A sample of the queries is profiled so the metrics show where their time goes
+        kwargs.setdefault('max_runtime', self.timeout)
+        if QUERY_PROFILE_SAMPLE and random.random() < QUERY_PROFILE_SAMPLE:
+            kwargs.setdefault('profile', True)
+        received_bytes()
+        start = time.perf_counter()
+        cursor = self.db.aql.execute(query, bind_vars=bind_vars, **kwargs)
+        QUERY_SECONDS.observe(time.perf_counter() - start, query=query_name(query))
+        return cursor
+
+    async def execute(self, query, bind_vars=None, **kwargs):
+        """
+        Execute an AQL query and return every document of the result. Cursor batches are fetched on the worker thread
+        so the whole round trip happens off the event loop.
+
+        :param query: str
+            AQL query text
+        :param bind_vars: dict
+            bind parameters for the query
+        :param kwargs:
+            any other option accepted by arango.aql.AQL.execute
+        :return: list
+        """
+        def _fetch_all():
+            start = time.perf_counter()
+            cursor = self._execute(query, bind_vars, kwargs)
+            docs = [doc for doc in cursor]
+            record_query(query_name(query), time.perf_counter() - start, len(docs), received_bytes(), bind_vars,
+                         _profile(cursor, kwargs))
+            return docs
+        return await self.run(_fetch_all)
+
+    async def stream(self, query, bind_vars=None, batch_size=1000, **kwargs):
+        """
+        Execute an AQL query and yield the result one cursor batch at a time so callers can start working on the
+        first rows while ArangoDB is still producing the rest and never hold more than a batch in memory.
+
+        :param query: str
+            AQL query text
+        :param bind_vars: dict
+            bind parameters for the query
+        :param batch_size: int
+            number of documents ArangoDB sends per round trip
+        :return: async generator of lists
+        """
+        name = query_name(query)
+        options = dict(kwargs, batch_size=batch_size)
+
+        def _first():
+            cursor = self._execute(query, bind_vars, options)
+            return cursor, _drain(cursor), received_bytes()
+
+        def _next(cursor):
+            received_bytes()
+            start = time.perf_counter()
+            cursor.fetch()
+            CURSOR_FETCH_SECONDS.observe(time.perf_counter() - start, query=name)
+            return _drain(cursor), received_bytes()
+
+        start = time.perf_counter()
+        cursor, batch, size = await self.run(_first)
+        rows = len(batch)
+        try:
+            if batch:
+                yield batch
+            while cursor.has_more():
+                batch, received = await self.run(_next, cursor)
+                rows += len(batch)
+                size += received
+                if batch:
+                    yield batch
+        finally:
+            if cursor.has_more():
+                # The consumer stopped early so release the server side cursor instead of waiting for its ttl
+                try:
+                    await self.run(cursor.close, ignore_missing=True)
+                except Exception as e:
+                    logger.warning("Could not close cursor %s: %s" % (cursor.id, e))
+            record_query(name, time.perf_counter() - start, rows, size, bind_vars, _profile(cursor, options))
+
+    async def open_cursor(self, query, bind_vars=None, batch_size=1000, **kwargs):
+        """
+        Execute an AQL query and return its cursor with the first batch, for results read one batch at a time
+        over several requests. Give the cursor a ttl so ArangoDB drops it if it is never read to the end.
+
+        :param batch_size: int
+            documents per batch
+        :return: tuple
+            (arango.cursor.Cursor, list)
+        """
+        def _open():
+            start = time.perf_counter()
+            cursor = self._execute(query, bind_vars, dict(kwargs, batch_size=batch_size))
+            batch = _drain(cursor)
+            record_query(query_name(query), time.perf_counter() - start, len(batch), received_bytes(), bind_vars)
+            return cursor, batch
+        return await self.run(_open)
+
+    async def fetch(self, cursor, query=None):
+        """
+        Fetch the next batch of a cursor returned by open_cursor
+
+        :param query: str
+            text of the query, only used to name it in the metrics
+        :return: list
+            empty once the cursor is exhausted
+        """
+        name = query_name(query) if query else 'adhoc'
+
+        def _fetch():
+            if not cursor.has_more():
+                return []
+            received_bytes()
+            start = time.perf_counter()
+            cursor.fetch()
+            CURSOR_FETCH_SECONDS.observe(time.perf_counter() - start, query=name)
+            batch = _drain(cursor)
+            record_query(name, time.perf_counter() - start, len(batch), received_bytes())
+            return batch
+        return await self.run(_fetch)
+
+    def close(self):
+        """
+        Cancel the queued calls, wait for the running ones and close the HTTP sessions of the database. Blocks for up
+        to timeout seconds so call it from a worker thread, as resources.shutdown does.
+        """
+        logger.info("Shutting down database worker pool")
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        close_db_connection(self.db)
+
+
+def _profile(cursor, options):
+    # Phase durations of a profiled query, the profile is complete once the last batch has been fetched
+    if not options.get('profile') or not hasattr(cursor, 'profile'):
+        return None
+    try:
+        return {phase: seconds for phase, seconds in (cursor.profile() or {}).items()
+                if isinstance(seconds, (int, float))}
+    except Exception as e:
+        logger.debug("Could not read the query profile: %s" % e)
+        return None
+
+
+def _drain(cursor):
+    batch = list(cursor.batch())
+    cursor.batch().clear()
+    return batch
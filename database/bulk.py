@@ -0,0 +1,240 @@
+"""
+Streaming bulk ingestion of nodes and edges from CSV or JSON lines files.
+
+Input is read a chunk at a time and every chunk is written with a single import_bulk call, several chunks at once on
+a small pool of threads. Node keys are derived from a field of the row so the _id of any node is known without asking
+the database, which lets edges be written straight from their source and target names:
+
+    loader = BulkLoader(db)
+    loader.load_nodes('stack_network_nodes.csv', 'Tag', key_field='name')
+    loader.load_edges('stack_network_links.csv', 'Related', from_col='Tag', to_col='Tag')
+"""
+import csv
+import hashlib
+import io
+import json
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from loguru import logger
+
+from database.db_arango import notify_write
+
+# Characters ArangoDB accepts in a document key
+_KEY = re.compile(r"^[a-zA-Z0-9_\-:.@()+,=;$!*'%]{1,254}$")
+_NUMBER = re.compile(r'^-?\d+(\.\d+)?([eE][-+]?\d+)?$')
+
+
+def document_key(value):
+    """
+    Deterministic document key for a value. Values that are valid keys are used as they are so keys stay readable,
+    anything else is hashed.
+
+    :param value:
+        any value that identifies the document such as a name
+    :return: str
+    """
+    value = str(value)
+    if _KEY.match(value):
+        return value
+    return hashlib.sha1(value.encode('utf-8')).hexdigest()
+
+
+def document_id(col, value):
+    return '%s/%s' % (col, document_key(value))
+
+
+def _convert(value):
+    # CSV gives every value as a string, turn numbers back into numbers
+    if isinstance(value, str) and _NUMBER.match(value):
+        return float(value) if any(c in value for c in '.eE') else int(value)
+    return value
+
+
+def _open(source):
+    if isinstance(source, str):
+        return open(source, encoding='utf-8', newline=''), True
+    if isinstance(source, io.TextIOBase):
+        return source, False
+    # Binary streams such as the members of a zip file
+    return io.TextIOWrapper(source, encoding='utf-8', newline=''), False
+
+
+def read_rows(source, fmt=None, raw=()):
+    """
+    Read rows one at a time from a CSV or JSON lines file
+
+    :param source: str or file
+        path or open file, binary or text
+    :param fmt: str
+        csv or jsonl, guessed from the file name by default
+    :param raw: iterable of str
+        CSV fields kept as the strings read, such as names that look like numbers
+    :return: generator of dict
+    """
+    raw = set(raw)
+    if fmt is None:
+        name = source if isinstance(source, str) else getattr(source, 'name', '')
+        fmt = 'jsonl' if str(name).endswith(('.jsonl', '.json')) else 'csv'
+    handle, owned = _open(source)
+    try:
+        if fmt == 'csv':
+            for row in csv.DictReader(handle):
+                yield {k: v if k in raw else _convert(v) for k, v in row.items()}
+        elif fmt == 'jsonl':
+            for line in handle:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            raise ValueError("Format must be csv or jsonl, got %s" % fmt)
+    finally:
+        if owned:
+            handle.close()
+
+
+def read_chunks(rows, chunk_size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class BulkLoader:
+    """
+    Write nodes and edges to ArangoDB with batched import_bulk calls running on a pool of threads
+
+    :param db: arango.database.StandardDatabase
+        database holding the target collections, create it with a pool_size of at least workers
+    :param chunk_size: int
+        documents per import_bulk call
+    :param workers: int
+        import_bulk calls running at the same time
+    :param on_duplicate: str
+        what ArangoDB does with a key that already exists: error, update, replace or ignore. Update makes loads
+        repeatable
+    """
+
+    def __init__(self, db, chunk_size=10000, workers=4, on_duplicate='update'):
+        self.db = db
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self.on_duplicate = on_duplicate
+
+    def write(self, col, docs):
+        """
+        Write one batch of documents with a single import_bulk call on the calling thread
+
+        :param col: str
+            name of an existing collection
+        :param docs: list of dict
+        :return: dict
+            counts reported by ArangoDB
+        """
+        result = self.db.collection(col).import_bulk(
+            docs, halt_on_error=False, details=False, on_duplicate=self.on_duplicate)
+        notify_write(col, docs)
+        return result
+
+    def load(self, col, docs):
+        """
+        Write documents to a collection in chunks. At most two chunks per worker are held in memory at any time so
+        the input can be much bigger than memory.
+
+        :param col: str
+            name of an existing collection
+        :param docs: iterable of dict
+            documents ready to be written
+        :return: dict
+            counts reported by ArangoDB with the number of rows, seconds taken and rows per second
+        """
+        stats = {'rows': 0, 'created': 0, 'updated': 0, 'ignored': 0, 'errors': 0}
+        start = time.perf_counter()
+
+        def collect(done):
+            for future in done:
+                result = future.result()
+                for count in ('created', 'updated', 'ignored', 'errors'):
+                    stats[count] += result.get(count, 0)
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='bulk-%s' % col) as pool:
+            pending = set()
+            for chunk in read_chunks(docs, self.chunk_size):
+                if len(pending) >= self.workers * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(done)
+                pending.add(pool.submit(self.write, col, chunk))
+                stats['rows'] += len(chunk)
+            collect(wait(pending)[0])
+        stats['seconds'] = time.perf_counter() - start
+        stats['rows_per_sec'] = stats['rows'] / stats['seconds'] if stats['seconds'] else 0.0
+        logger.info("Loaded %d rows into %s in %.2fs (%.0f rows/sec, %d errors)" % (
+            stats['rows'], col, stats['seconds'], stats['rows_per_sec'], stats['errors']))
+        return stats
+
+    def load_nodes(self, source, col, key_field='name', fmt=None):
+        """
+        Load nodes from a file, every row becomes a document keyed on document_key(row[key_field]). The key field is
+        read as it is written, rows without it are skipped and counted as invalid.
+
+        :param source: str or file
+            CSV or JSON lines input
+        :param col: str
+            vertex collection
+        :param key_field: str
+            field naming the node, edges refer to nodes by this value
+        :return: dict
+            load statistics
+        """
+        invalid = []
+
+        def docs():
+            for row in read_rows(source, fmt, raw=(key_field,)):
+                if row.get(key_field) in (None, ''):
+                    invalid.append(row)
+                    continue
+                row['_key'] = document_key(row[key_field])
+                yield row
+        return self._invalid(col, self.load(col, docs()), len(invalid), key_field)
+
+    def load_edges(self, source, col, from_col, to_col, from_field='source', to_field='target', fmt=None):
+        """
+        Load edges from a file whose rows name their source and target nodes by the key_field the nodes were loaded
+        with. Other fields of the row are kept on the edge. Edges are keyed on their source and target unless the row
+        has a _key, so loading a file again updates its edges and rows repeating a pair are merged into one edge.
+        Rows without a source or a target are skipped and counted as invalid.
+
+        :param source: str or file
+            CSV or JSON lines input
+        :param col: str
+            edge collection
+        :param from_col: str
+            collection of the source nodes
+        :param to_col: str
+            collection of the target nodes
+        :return: dict
+            load statistics
+        """
+        invalid = []
+
+        def docs():
+            for row in read_rows(source, fmt, raw=(from_field, to_field)):
+                if row.get(from_field) in (None, '') or row.get(to_field) in (None, ''):
+                    invalid.append(row)
+                    continue
+                row['_from'] = document_id(from_col, row.pop(from_field))
+                row['_to'] = document_id(to_col, row.pop(to_field))
+                row.setdefault('_key', document_key('%s-%s' % (row['_from'], row['_to'])))
+                yield row
+        return self._invalid(col, self.load(col, docs()), len(invalid), '%s and %s' % (from_field, to_field))
+
+    @staticmethod
+    def _invalid(col, stats, invalid, fields):
+        stats['invalid'] = invalid
+        if invalid:
+            logger.warning("Skipped %d rows for %s without %s" % (invalid, col, fields))
+        return stats
@@ -0,0 +1,188 @@
+import itertools
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+MISSING = object()
+# Items of a list or dict measured to estimate the size of the rest
+SIZE_SAMPLE = 16
+
+
+def approximate_size(value, sample=SIZE_SAMPLE):
+    """
+    Approximate JSON size of a value in bytes. Lists and dicts longer than sample are extrapolated from a sample of
+    their items, so the cost does not grow with the size of the result.
+
+    :return: int
+    """
+    if isinstance(value, str):
+        return len(value) + 2
+    if isinstance(value, (bool, type(None))):
+        return 5
+    if isinstance(value, (int, float)):
+        return 8
+    if isinstance(value, dict):
+        items = list(itertools.islice(value.items(), sample))
+        measured = sum(approximate_size(k, sample) + approximate_size(v, sample) + 2 for k, v in items)
+    elif isinstance(value, (list, tuple)):
+        step = max(1, len(value) // sample)
+        items = value[::step][:sample]
+        measured = sum(approximate_size(item, sample) + 1 for item in items)
+    else:
+        return len(str(value)) + 2
+    return 2 + (measured * len(value) // len(items) if items else 0)
+
+
+class ResultCache:
+    """
+    Least recently used cache for query results bounded by both the number of entries and their approximate size
+    in bytes. Every namespace (one per endpoint such as 'suggestions' or 'neighbors') has its own time to live and
+    every entry carries tags, the names of the collections, views and graphs it was read from, so a write to a
+    collection can drop exactly the results that might have changed.
+
+    Cached values are shared between callers and must be treated as read only. A result read while one of its tags
+    was invalidated may predate the write, set refuses it when given the generation taken before the read.
+
+    :param max_entries: int
+        number of results kept before the least recently used one is evicted
+    :param max_bytes: int
+        approximate JSON size of all results kept together, see approximate_size. A single result bigger than this is
+        never cached
+    :param ttls: dict
+        seconds each namespace keeps a result for, namespaces not listed use default_ttl
+    :param default_ttl: float
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=64 * 1024 * 1024, ttls=None, default_ttl=60, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttls = dict(ttls or {})
+        self.default_ttl = default_ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._tags = defaultdict(set)
+        self._bytes = 0
+        # Generation each tag was last invalidated at
+        self._generation = 0
+        self._invalidated = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.stale = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, namespace, key):
+        """
+        :return:
+            the cached value or MISSING
+        """
+        cache_key = (namespace, key)
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is None:
+                self.misses += 1
+                return MISSING
+            value, size, expires, tags = entry
+            if expires <= self._clock():
+                self._remove(cache_key)
+                self.expirations += 1
+                self.misses += 1
+                return MISSING
+            self._entries.move_to_end(cache_key)
+            self.hits += 1
+            return value
+
+    def generation(self):
+        """
+        :return: int
+            current generation, take it before reading a result and pass it to set
+        """
+        with self._lock:
+            return self._generation
+
+    def set(self, namespace, key, value, tags=(), generation=None):
+        """
+        Store a result and evict the least recently used ones until the cache is back within its bounds
+
+        :param tags: iterable of str
+            names of the collections, views or graphs the value was read from
+        :param generation: int
+            generation taken before the value was read, the value is not cached when any of its tags has been
+            invalidated since
+        :return: bool
+            whether the value was cached
+        """
+        size = approximate_size(value)
+        if size > self.max_bytes:
+            return False
+        cache_key = (namespace, key)
+        tags = frozenset(tags)
+        expires = self._clock() + self.ttls.get(namespace, self.default_ttl)
+        with self._lock:
+            if generation is not None and any(self._invalidated.get(tag, -1) >= generation for tag in tags):
+                self.stale += 1
+                return False
+            if cache_key in self._entries:
+                self._remove(cache_key)
+            self._entries[cache_key] = (value, size, expires, tags)
+            self._bytes += size
+            for tag in tags:
+                self._tags[tag].add(cache_key)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+        return True
+
+    def invalidate(self, *tags):
+        """
+        Drop every result read from any of the tags
+
+        :return: int
+            number of results dropped
+        """
+        with self._lock:
+            keys = set()
+            for tag in tags:
+                self._invalidated[tag] = self._generation
+                keys.update(self._tags.get(tag, ()))
+            self._generation += 1
+            for cache_key in keys:
+                self._remove(cache_key)
+            self.invalidations += len(keys)
+        return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+            self._bytes = 0
+
+    def _remove(self, cache_key):
+        value, size, expires, tags = self._entries.pop(cache_key)
+        self._bytes -= size
+        for tag in tags:
+            keys = self._tags[tag]
+            keys.discard(cache_key)
+            if not keys:
+                del self._tags[tag]
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'bytes': self._bytes,
+            'max_entries': self.max_entries,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'invalidations': self.invalidations,
+            'stale': self.stale
+        }
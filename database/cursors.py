@@ -0,0 +1,126 @@
+import secrets
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+
+class CursorExpired(Exception):
+    """
+    Raised for a continuation token that is unknown, already used or whose cursor has expired
+    """
+
+
+Page = namedtuple('Page', ['cursor', 'state'])
+
+
+class CursorStore:
+    """
+    Server side cursors kept open between the pages of a result, each behind an opaque random token handed to the
+    client. Reading a page takes the cursor out of the store and the next page gets a new token, so a token is only
+    good once and two requests can never read the same cursor at the same time.
+
+    Cursors that are not continued within ttl seconds are dropped, the same ttl should be given to ArangoDB so it
+    releases them too. Dropped and evicted cursors are returned to the caller to be closed, closing one is a request
+    to the database and is left to the caller's worker threads.
+
+    Tokens belong to the process that issued them.
+
+    :param ttl: float
+        seconds a cursor is kept after its last page was read
+    :param max_open: int
+        cursors kept at most, the least recently used ones are evicted beyond that
+    """
+
+    def __init__(self, ttl=120, max_open=1000, clock=time.monotonic):
+        self.ttl = ttl
+        self.max_open = max_open
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._pages = OrderedDict()
+        self.opened = 0
+        self.expirations = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._pages)
+
+    def add(self, cursor, state=None):
+        """
+        Keep a cursor for its next page
+
+        :param cursor: arango.cursor.Cursor
+        :param state:
+            anything the next page needs besides the cursor
+        :return: tuple
+            (token, list of the cursors evicted to make room, to be closed)
+        """
+        token = secrets.token_urlsafe(16)
+        with self._lock:
+            evicted = self._expire()
+            while len(self._pages) >= self.max_open:
+                _, (page, _) = self._pages.popitem(last=False)
+                evicted.append(page.cursor)
+                self.evictions += 1
+            self._pages[token] = (Page(cursor, state), self._clock() + self.ttl)
+            self.opened += 1
+        return token, evicted
+
+    def take(self, token):
+        """
+        :return: Page
+            the cursor and state of the token, which is no longer valid
+        :raise CursorExpired:
+        """
+        with self._lock:
+            entry = self._pages.pop(token, None)
+        if entry is None:
+            raise CursorExpired("Continuation token %s is unknown or was already used" % token)
+        page, expires = entry
+        if expires <= self._clock():
+            # ArangoDB was given the same ttl so the cursor is already gone there
+            self.expirations += 1
+            raise CursorExpired("Continuation token %s has expired" % token)
+        return page
+
+    def expire(self):
+        """
+        Drop the cursors past their ttl
+
+        :return: list
+            the cursors dropped, to be closed
+        """
+        with self._lock:
+            return self._expire()
+
+    def _expire(self):
+        now, expired = self._clock(), []
+        # Entries are in the order they were added with the same ttl so the expired ones are at the front
+        while self._pages:
+            token, (page, expires) = next(iter(self._pages.items()))
+            if expires > now:
+                break
+            del self._pages[token]
+            expired.append(page.cursor)
+            self.expirations += 1
+        return expired
+
+    def clear(self):
+        """
+        :return: list
+            every cursor, to be closed
+        """
+        with self._lock:
+            cursors = [page.cursor for page, _ in self._pages.values()]
+            self._pages.clear()
+        return cursors
+
+    def stats(self):
+        with self._lock:
+            return {
+                'open': len(self._pages),
+                'max_open': self.max_open,
+                'ttl': self.ttl,
+                'opened': self.opened,
+                'expirations': self.expirations,
+                'evictions': self.evictions
+            }
@@ -1,142 +1,304 @@
-from loguru import logger
-
-import arango
-
-
-def connect_to_db(db_name='test', username='root', password='admin', hosts='http://localhost:8529'):
-    """
-    Expect a root level user to access the database and perform transactions
-
-    :param db_name: str
-        default to test
-
-    :param username: str
-        default to root
-
-    :param password: str
-        default to admin
-
-    :param hosts: str
-        default to http://localhost:8529
-
-    :return: client.db
-        client that allows requests to the Arango system database. This is the root db to create other databases.
-        arango.database.StandardDatabase
-    """
-    client = arango.ArangoClient(hosts=hosts)
-    sys_db = client.db('_system', username=username, password=password)
-    if not sys_db.has_database(db_name):
-        sys_db.create_database(
-            name=db_name
-        )
-    return client.db(db_name, username=username, password=password)
-
-
-def create_collection(db=None, col='Test', edge=False, vertex=False, from_col=None, to_col=None, graph='Test'):
-    """
-    Create an Arango collection based on a variety of inputs to simplify an API access in a micro services architecture.
-    The basic collections should be documents that can be changed into edges and/or vertex collections. Graphs can be
-    created on the fly using the Arango method of managing them with edge collections defined by their attributes _to
-    and _from collections based on vertex collections. if there is an edge collection then there should also be a
-    definition that consists of the following requirements
-        {
-            'edge_collection': 'edge_collection_name',
-            'from_vertex_collections': ['from_vertex_collection_name'],
-            'to_vertex_collections': ['to_vertex_collection_name']
-        }
-    otherwise if there is a vertex then it must be created in the graph and lastly if there is nothing then just
-    create the document
-
-    :param db: arango.db
-        the database that will be added to the server
-    :param col: string
-        name for the collection
-    :param edge: bool
-        switch to create an edge collection
-    :param vertex: bool
-        switch to create a vertex collection
-    :param from_col: list of strings
-        list of vertex names that have are also in the edge definitions
-    :param to_col: list of strings
-        list of vertex names that have are also in the edge definitions
-    :param graph: string
-        name for the graph
-    :return: collection or edge defintion
-        1 of 3 types of collections based on the variables received
-
-    """
-    # Case that an edge is True which requires the definition of from and to collections within vertices
-    if edge and from_col and to_col:
-        return db.graph(graph).create_edge_definition(
-            edge_collection=col,
-            from_vertex_collections=from_col,
-            to_vertex_collections=to_col
-        )
-    # Case that an vertex is True which makes it available to the edge collections
-    elif vertex:
-        return db.graph(graph).create_vertex_collection(name=col)
-    # Case of a standard collection which can be later referenced as edge or
-    else:
-        return db.create_collection(name=col)
-
-
-def create_document(db=None, doc=None, col=None):
-    """
-    Insert a document into a database collection and return the document id for potential use in creating
-    other documents such as edges. The id is a combination of the key and the collection in the form
-    <collection/key>. Run quality checks such as data types and collection existence.
-
-    :param db: arango.database.StandardDatabase
-        target for the new document that contains the collection
-    :param doc: json
-        document in JSON format or if edge includes the _to and _from keys for an edge
-    :param col:
-        target collection for the new document
-    :return:
-    """
-    if isinstance(doc, dict) and isinstance(col, str) and isinstance(db, arango.database.StandardDatabase):
-        if db.has_collection(col):
-            return db[col].insert(doc)['_id']
-        else:
-            return None
-    else:
-        return None
-
-
-def create_graph(db=None, graph=None, from_col=None, to_col=None, edge_col=None):
-    """
-    Based on a database that should not be the _sys db, create a graph and return it so it can be used for follow on
-    functions.
-
-    :param db:
-    :param graph: str
-        the name of the graph which if not existing will be used to create it
-    :param from_col:
-        list of existing collections that are have ids contained within the edge definition within the sources or from
-    :param to_col:
-        list of existing collections that are have ids contained within the edge definition within the targets or to
-    :param edge_col:
-        name of the edge definition collection
-    :return: arango.graph
-    """
-    if (isinstance(graph, str) and isinstance(from_col, list) and isinstance(to_col, list)
-            and isinstance(edge_col, str) and isinstance(db, arango.database.StandardDatabase)):
-        if not db.has_graph(graph):
-            graph_db = db.create_graph(graph)
-        else:
-            graph_db = db.graph(graph)
-        graph_db.create_edge_definition(
-            edge_collection=edge_col,
-            from_vertex_collections=from_col,
-            to_vertex_collections=to_col
-        )
-        return graph_db
-
-    return None
-
-
-def close_db_connection(client):
-    logger.info("Closing connection to database")
-    client.db
-
-
+import threading
+
+from loguru import logger
+
+import arango
+
+from database.typeahead import MIN_GRAM, MAX_GRAM
+
+# Callables notified after every write made through this module, see add_write_listener
+_write_listeners = []
+
+
+def add_write_listener(listener):
+    """
+    Register a callable that is told about every write made through this module so derived state such as result
+    caches can be refreshed. It is called as listener(collection, docs) after the write succeeded where docs is the
+    list of documents written, empty when a collection was created.
+
+    :param listener: callable
+    """
+    if listener not in _write_listeners:
+        _write_listeners.append(listener)
+
+
+def remove_write_listener(listener):
+    if listener in _write_listeners:
+        _write_listeners.remove(listener)
+
+
+def notify_write(col, docs=()):
+    """
+    Tell the write listeners that documents were written to a collection. Writers that bypass create_document such as
+    bulk imports call this themselves. A failing listener is logged and never fails the write.
+
+    :param col: str
+        name of the collection written to
+    :param docs: list of dict
+        the documents written
+    """
+    for listener in list(_write_listeners):
+        try:
+            listener(col, docs)
+        except Exception as e:
+            logger.error("Write listener %s failed for %s: %s" % (listener, col, e))
+
+
+# Size of the response bodies received by each thread, see received_bytes
+_received = threading.local()
+
+
+class MeteredHTTPClient(arango.http.DefaultHTTPClient):
+    """
+    DefaultHTTPClient that adds up the size of the responses received on each thread so the caller of a query can
+    tell how much data it brought back
+    """
+
+    def send_request(self, *args, **kwargs):
+        response = super().send_request(*args, **kwargs)
+        _received.size = getattr(_received, 'size', 0) + len(response.raw_body or '')
+        return response
+
+
+def received_bytes():
+    """
+    Size of the response bodies received by the calling thread since the previous call
+
+    :return: int
+    """
+    size = getattr(_received, 'size', 0)
+    _received.size = 0
+    return size
+
+
+def connect_to_db(db_name='test', username='root', password='admin', hosts='http://localhost:8529', pool_size=10,
+                  timeout=60):
+    """
+    Expect a root level user to access the database and perform transactions
+
+    :param db_name: str
+        default to test
+
+    :param username: str
+        default to root
+
+    :param password: str
+        default to admin
+
+    :param hosts: str
+        default to http://localhost:8529
+
+    :param pool_size: int
+        number of HTTP connections kept open to each host. Callers that run queries from several threads (see
+        database.async_arango.AsyncDatabase) block on the pool instead of opening new sockets once it is exhausted
+
+    :param timeout: float
+        seconds before an individual HTTP request to ArangoDB is abandoned
+
+    :return: client.db
+        client that allows requests to the Arango system database. This is the root db to create other databases.
+        arango.database.StandardDatabase
+    """
+    http_client = MeteredHTTPClient(
+        request_timeout=timeout,
+        pool_connections=pool_size,
+        pool_maxsize=pool_size,
+        pool_timeout=timeout
+    )
+    client = arango.ArangoClient(hosts=hosts, http_client=http_client)
+    sys_db = client.db('_system', username=username, password=password)
+    if not sys_db.has_database(db_name):
+        sys_db.create_database(
+            name=db_name
+        )
+    return client.db(db_name, username=username, password=password)
+
+
+def create_collection(db=None, col='Test', edge=False, vertex=False, from_col=None, to_col=None, graph='Test'):
+    """
+    Create an Arango collection based on a variety of inputs to simplify an API access in a micro services architecture.
+    The basic collections should be documents that can be changed into edges and/or vertex collections. Graphs can be
+    created on the fly using the Arango method of managing them with edge collections defined by their attributes _to
+    and _from collections based on vertex collections. if there is an edge collection then there should also be a
+    definition that consists of the following requirements
+        {
+            'edge_collection': 'edge_collection_name',
+            'from_vertex_collections': ['from_vertex_collection_name'],
+            'to_vertex_collections': ['to_vertex_collection_name']
+        }
+    otherwise if there is a vertex then it must be created in the graph and lastly if there is nothing then just
+    create the document
+
+    :param db: arango.db
+        the database that will be added to the server
+    :param col: string
+        name for the collection
+    :param edge: bool
+        switch to create an edge collection
+    :param vertex: bool
+        switch to create a vertex collection
+    :param from_col: list of strings
+        list of vertex names that have are also in the edge definitions
+    :param to_col: list of strings
+        list of vertex names that have are also in the edge definitions
+    :param graph: string
+        name for the graph
+    :return: collection or edge defintion
+        1 of 3 types of collections based on the variables received
+
+    """
+    # Case that an edge is True which requires the definition of from and to collections within vertices
+    if edge and from_col and to_col:
+        created = db.graph(graph).create_edge_definition(
+            edge_collection=col,
+            from_vertex_collections=from_col,
+            to_vertex_collections=to_col
+        )
+    # Case that an vertex is True which makes it available to the edge collections
+    elif vertex:
+        created = db.graph(graph).create_vertex_collection(name=col)
+    # Case of a standard collection which can be later referenced as edge or
+    else:
+        created = db.create_collection(name=col)
+    notify_write(col)
+    return created
+
+
+def create_document(db=None, doc=None, col=None):
+    """
+    Insert a document into a database collection and return the document id for potential use in creating
+    other documents such as edges. The id is a combination of the key and the collection in the form
+    <collection/key>. Run quality checks such as data types and collection existence.
+
+    :param db: arango.database.StandardDatabase
+        target for the new document that contains the collection
+    :param doc: json
+        document in JSON format or if edge includes the _to and _from keys for an edge
+    :param col:
+        target collection for the new document
+    :return:
+    """
+    if isinstance(doc, dict) and isinstance(col, str) and isinstance(db, arango.database.StandardDatabase):
+        if db.has_collection(col):
+            doc_id = db[col].insert(doc)['_id']
+            notify_write(col, [doc])
+            return doc_id
+        else:
+            return None
+    else:
+        return None
+
+
+def create_graph(db=None, graph=None, from_col=None, to_col=None, edge_col=None):
+    """
+    Based on a database that should not be the _sys db, create a graph and return it so it can be used for follow on
+    functions.
+
+    :param db:
+    :param graph: str
+        the name of the graph which if not existing will be used to create it
+    :param from_col:
+        list of existing collections that are have ids contained within the edge definition within the sources or from
+    :param to_col:
+        list of existing collections that are have ids contained within the edge definition within the targets or to
+    :param edge_col:
+        name of the edge definition collection
+    :return: arango.graph
+    """
+    if (isinstance(graph, str) and isinstance(from_col, list) and isinstance(to_col, list)
+            and isinstance(edge_col, str) and isinstance(db, arango.database.StandardDatabase)):
+        if not db.has_graph(graph):
+            graph_db = db.create_graph(graph)
+        else:
+            graph_db = db.graph(graph)
+        graph_db.create_edge_definition(
+            edge_collection=edge_col,
+            from_vertex_collections=from_col,
+            to_vertex_collections=to_col
+        )
+        return graph_db
+
+    return None
+
+
+def create_typeahead_analyzer(db=None, name='edge_ngram', min_gram=MIN_GRAM, max_gram=MAX_GRAM):
+    """
+    Create the analyzer used by the typeahead search. It splits text into lower case words without stemming and
+    indexes every prefix of each word between min_gram and max_gram characters long, so a partially typed word is an
+    exact term lookup in the view rather than a scan. An existing analyzer with the same name is returned as is.
+
+    :param db: arango.database.StandardDatabase
+    :param name: str
+        name of the analyzer
+    :param min_gram: int
+        shortest prefix indexed
+    :param max_gram: int
+        longest prefix indexed, longer input is matched on its first max_gram characters
+    :return: dict
+        analyzer definition
+    """
+    if isinstance(db, arango.database.StandardDatabase):
+        for analyzer in db.analyzers():
+            if analyzer['name'] in (name, '%s::%s' % (db.name, name)):
+                return analyzer
+        return db.create_analyzer(
+            name=name,
+            analyzer_type='text',
+            properties={
+                'locale': 'en',
+                'case': 'lower',
+                'accent': False,
+                'stemming': False,
+                'stopwords': [],
+                'edgeNgram': {'min': min_gram, 'max': max_gram, 'preserveOriginal': False}
+            },
+            features=['frequency', 'norm', 'position']
+        )
+    return None
+
+
+def add_typeahead_links(db=None, view='v_search_test', collections=None, field='name', analyzer='edge_ngram'):
+    """
+    Index a field of the collections linked to an ArangoSearch view with the typeahead analyzer as well as the
+    identity analyzer used by the exact search. The links are replaced by links that include all fields, like the
+    ones the view is created with. The analyzer has to exist, see create_typeahead_analyzer.
+
+    :param db: arango.database.StandardDatabase
+    :param view: str
+        name of an existing arangosearch view
+    :param collections: list of str
+        collections to index, default to every collection already linked to the view
+    :param field: str
+        attribute holding the text that is typed
+    :param analyzer: str
+        name of the typeahead analyzer
+    :return: dict
+        the updated view properties
+    """
+    if isinstance(db, arango.database.StandardDatabase):
+        if collections is None:
+            collections = list(db.view(view).get('links', {}))
+        link = {'includeAllFields': True, 'fields': {field: {'analyzers': ['identity', analyzer]}}}
+        return db.update_arangosearch_view(name=view, properties={'links': {col: link for col in collections}})
+    return None
+
+
+def close_db_connection(db):
+    """
+    Close the pooled HTTP sessions of a database created by connect_to_db. Requests still using a session fail, the
+    database cannot be used afterwards.
+
+    :param db: arango.database.StandardDatabase
+    :return: int
+        number of sessions closed
+    """
+    if isinstance(db, arango.database.StandardDatabase):
+        logger.info("Closing connection to database %s" % db.name)
+        # The connection keeps one session per host, ArangoClient.close closes the same ones
+        sessions = list(getattr(db.conn, '_sessions', ()))
+        for session in sessions:
+            session.close()
+        return len(sessions)
+    return 0
+
+
@@ -0,0 +1,148 @@
+class GraphAssembler:
+    """
+    Build the visualization graph from traversal rows shaped like {v, e} where v is a vertex document and e is the
+    edge used to reach it. Nodes are indexed by their _id in a dict and lines by (source, target, label) so each row
+    costs a constant number of hash lookups no matter how many neighbors have already been seen, and parallel edges
+    of the same label collapse into one line. Rows can be added one cursor batch at a time so the full result never
+    has to be held by the caller.
+
+    The output of graph() is the standard json object used by the visualizer
+        {
+            'index': ['Tag/1', 'Tag/2'],
+            'nodes': [{'key': 'Tag/1', ...}, {'key': 'Tag/2', ...}],
+            'lines': [{'source': 'Tag/1', 'target': 'Tag/2', 'label': 'Related'}]
+        }
+    """
+
+    def __init__(self):
+        self._nodes = {}
+        self._lines = {}
+
+    def __len__(self):
+        return len(self._nodes) + len(self._lines)
+
+    def add_node(self, doc):
+        """
+        Add a vertex document and return the node if it was not already part of the graph.
+        The document is converted in place: _id becomes the key and the other system attributes are dropped.
+
+        :param doc: dict
+            vertex document as returned by ArangoDB
+        :return: dict or None
+        """
+        if doc is None:
+            return None
+        key = doc['_id'] if '_id' in doc else doc['key']
+        if key in self._nodes:
+            return None
+        if '_id' in doc:
+            del doc['_id']
+            doc.pop('_key', None)
+            doc.pop('_rev', None)
+            doc['key'] = key
+        self._nodes[key] = doc
+        return doc
+
+    def add_edge(self, doc):
+        """
+        Add an edge document and return the line if no line with the same source, target and label exists yet.
+        The label is the edge collection name taken from the _id.
+
+        :param doc: dict
+            edge document as returned by ArangoDB
+        :return: dict or None
+        """
+        if doc is None:
+            return None
+        line_id = (doc['_from'], doc['_to'], doc['_id'].partition('/')[0])
+        if line_id in self._lines:
+            return None
+        line = {'source': line_id[0], 'target': line_id[1], 'label': line_id[2]}
+        self._lines[line_id] = line
+        return line
+
+    def add(self, rows):
+        """
+        Add a batch of {v, e} rows and return only the nodes and lines that were new to the graph so the caller
+        can forward them as an incremental update. Rows that also carry a seed, the node the traversal started
+        from, add it to the seeds list of their node and line so merged expansions keep their provenance.
+
+        :param rows: iterable of dict
+        :return: tuple of lists
+            (new nodes, new lines)
+        """
+        nodes, lines = [], []
+        for r in rows:
+            v, e = r.get('v'), r.get('e')
+            node = self.add_node(v)
+            if node is not None:
+                nodes.append(node)
+            line = self.add_edge(e)
+            if line is not None:
+                lines.append(line)
+            seed = r.get('seed')
+            if seed is not None:
+                # Converted and duplicate documents alike are found under the key add_node used
+                if v is not None:
+                    _add_seed(self._nodes[v['_id'] if '_id' in v else v['key']], seed)
+                if e is not None:
+                    _add_seed(self._lines[(e['_from'], e['_to'], e['_id'].partition('/')[0])], seed)
+        return nodes, lines
+
+    def graph(self):
+        return {'index': list(self._nodes), 'nodes': list(self._nodes.values()), 'lines': list(self._lines.values())}
+
+
+def _add_seed(element, seed):
+    seeds = element.setdefault('seeds', [])
+    if seed not in seeds:
+        seeds.append(seed)
+
+
+def columnar(graph):
+    """
+    Convert a graph in the visualizer format to the compact columnar format. Node ids are written once in an id table
+    and referred to by position, labels are dictionary encoded and node attributes are stored one list per attribute,
+    None where a node does not have it. Every edge then costs three small integers instead of two long ids and a label.
+
+        {
+            'ids': ['Tag/1', 'Tag/2'],
+            'attributes': {'name': ['python', 'java']},
+            'labels': ['Related'],
+            'source': [0],
+            'target': [1],
+            'label': [0]
+        }
+
+    Lines pointing at a node that is not part of the nodes get an id table entry without attributes.
+
+    :param graph: dict
+        graph with index, nodes and lines as returned by GraphAssembler.graph
+    :return: dict
+    """
+    nodes, lines = graph['nodes'], graph['lines']
+    ids = [node['key'] for node in nodes]
+    position = dict(zip(ids, range(len(ids))))
+    # One pass per attribute with list comprehensions, graphs have many nodes but few distinct attributes
+    names = set().union(*nodes)
+    names.discard('key')
+    attributes = {name: [node.get(name) for node in nodes] for name in sorted(names)}
+    label_position = {}
+    label = [label_position.setdefault(line['label'], len(label_position)) for line in lines]
+    ends = []
+    for end in ('source', 'target'):
+        column = [position.get(line[end], -1) for line in lines]
+        if -1 in column:
+            for i, index in enumerate(column):
+                if index == -1:
+                    key = lines[i][end]
+                    if key not in position:
+                        position[key] = len(ids)
+                        ids.append(key)
+                    column[i] = position[key]
+        ends.append(column)
+    # Attribute columns cover the nodes only, pad them for ids added by dangling lines
+    for column in attributes.values():
+        column.extend([None] * (len(ids) - len(column)))
+    return {'ids': ids, 'attributes': attributes, 'labels': list(label_position), 'source': ends[0],
+            'target': ends[1], 'label': label}
@@ -0,0 +1,58 @@
+import asyncio
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key into one. The first caller of a key starts the call and every caller
+    arriving while it is in flight awaits the same result, or the same exception, instead of starting its own. The
+    key is forgotten as soon as the call finishes so later callers start a new one, a cache in front of it keeps the
+    result for longer.
+
+    The call runs in its own task, a caller that is cancelled, for example because its client went away, does not
+    cancel it for the others. Results are shared between callers and must be treated as read only.
+    """
+
+    def __init__(self):
+        self._flights = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    def __len__(self):
+        return len(self._flights)
+
+    def __contains__(self, key):
+        flight = self._flights.get(key)
+        return flight is not None and not flight.done()
+
+    async def do(self, key, function, *args):
+        """
+        :param key:
+            hashable, calls with equal keys are assumed to return the same result
+        :param function:
+            coroutine function called with args when no call for the key is in flight
+        :return:
+            the result of the call
+        """
+        flight = self._flights.get(key)
+        # A flight left behind by an event loop that was closed cannot be awaited from this one
+        if flight is None or flight.done() or flight.get_loop() is not asyncio.get_running_loop():
+            flight = asyncio.ensure_future(function(*args))
+            self._flights[key] = flight
+            flight.add_done_callback(lambda done: self._land(key, done))
+            self.leaders += 1
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(flight)
+
+    def _land(self, key, flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    def stats(self):
+        calls = self.leaders + self.coalesced
+        return {
+            'in_flight': len(self._flights),
+            'leaders': self.leaders,
+            'coalesced': self.coalesced,
+            'coalesced_ratio': self.coalesced / calls if calls else 0.0
+        }
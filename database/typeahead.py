@@ -0,0 +1,70 @@
+import time
+
+# Shortest and longest prefix indexed by the edge n-gram analyzer. Prefixes shorter than MIN_GRAM cannot be searched
+# in the view and longer ones are matched on their first MAX_GRAM characters
+MIN_GRAM = 2
+MAX_GRAM = 16
+
+
+def normalize(prefix):
+    return ' '.join(str(prefix).lower().split())
+
+
+class PrefixIndex:
+    """
+    In process answers for the first keystrokes of a typeahead. The most popular documents are loaded once and every
+    prefix of up to max_prefix characters of each word of their name points to the first per_prefix documents with
+    that prefix, so the index is small and a lookup is a single dict access.
+
+    Only popular documents are known to the index so it trades completeness for latency on the shortest prefixes,
+    which are the least selective and the most expensive to search in the view.
+
+    :param max_prefix: int
+        longest prefix answered from memory
+    :param per_prefix: int
+        documents kept for each prefix
+    :param attribute: str
+        attribute of the documents holding the searchable name
+    """
+
+    def __init__(self, max_prefix=3, per_prefix=10, attribute='name'):
+        self.max_prefix = max_prefix
+        self.per_prefix = per_prefix
+        self.attribute = attribute
+        self.loaded_at = None
+        self._prefixes = {}
+
+    def __len__(self):
+        return len(self._prefixes)
+
+    def load(self, docs):
+        """
+        Replace the index with the given documents, most popular first
+
+        :param docs: iterable of dict
+        """
+        prefixes = {}
+        for doc in docs:
+            name = normalize(doc.get(self.attribute, ''))
+            seen = set()
+            for word in name.split():
+                for i in range(1, min(len(word), self.max_prefix) + 1):
+                    prefix = word[:i]
+                    if prefix in seen:
+                        continue
+                    seen.add(prefix)
+                    matches = prefixes.setdefault(prefix, [])
+                    if len(matches) < self.per_prefix:
+                        matches.append(doc)
+        self._prefixes = prefixes
+        self.loaded_at = time.monotonic()
+
+    def lookup(self, prefix, limit=10):
+        """
+        :return: list or None
+            the most popular documents for the prefix or None when the prefix is too long to be answered from memory
+        """
+        prefix = normalize(prefix)
+        if not prefix or len(prefix) > self.max_prefix or ' ' in prefix:
+            return None
+        return self._prefixes.get(prefix, [])[:limit]
@@ -0,0 +1,237 @@
+"""
+Process wide metrics in the Prometheus text format, without any dependency so every layer can record into them.
+Metrics are created once at import and updated from any thread.
+
+    QUERY_SECONDS.observe(0.012, query='neighbors')
+    REGISTRY.render()
+
+Queries slower than SLOW_QUERY_SECONDS are also written to the slow query log, a loguru record bound with
+slow_query=True that add_slow_query_log can route to its own file.
+"""
+import bisect
+import os
+import threading
+
+from loguru import logger
+
+# Prometheus client defaults, in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+SLOW_QUERY_SECONDS = float(os.environ.get('SLOW_QUERY_SECONDS', 1.0))
+# Fraction of queries run with profile=True so their optimizer profile is recorded
+QUERY_PROFILE_SAMPLE = float(os.environ.get('QUERY_PROFILE_SAMPLE', 0.01))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (name, _escape(value)) for name, value in pairs)
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """
+    Base of the metric types, one value or set of values per combination of label values
+    """
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labels):
+            raise ValueError("%s takes the labels %s, got %s" % (self.name, ', '.join(self.labels),
+                                                                 ', '.join(sorted(labels))))
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels))
+
+    def render(self):
+        lines = ['# HELP %s %s' % (self.name, self.documentation), '# TYPE %s %s' % (self.name, self.kind)]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._samples(key, value))
+        return lines
+
+    def _samples(self, key, value):
+        return ['%s%s %s' % (self.name, _labels(self.labels, key), _number(value))]
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(Metric):
+    """
+    Counts of observations per bucket with their sum, the buckets are upper bounds
+    """
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                # One count per bucket, the +Inf bucket, then the sum
+                counts = self._values[key] = [0] * (len(self.buckets) + 2)
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            counts[-1] += value
+
+    def _samples(self, key, counts):
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += count
+            lines.append('%s_bucket%s %d' % (self.name, _labels(self.labels, key, [('le', _number(bound))]),
+                                             cumulative))
+        lines.append('%s_count%s %d' % (self.name, _labels(self.labels, key), cumulative))
+        lines.append('%s_sum%s %s' % (self.name, _labels(self.labels, key), _number(counts[-1])))
+        return lines
+
+
+class Registry:
+    """
+    Metrics by name. Asking for an existing name returns the metric already registered so modules can declare the
+    metrics they share.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, documentation, labels, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, labels, **kwargs)
+            elif not isinstance(metric, cls) or metric.labels != tuple(labels):
+                raise ValueError("Metric %s is already registered with another type or labels" % name)
+            return metric
+
+    def counter(self, name, documentation, labels=()):
+        return self._get(Counter, name, documentation, labels)
+
+    def gauge(self, name, documentation, labels=()):
+        return self._get(Gauge, name, documentation, labels)
+
+    def histogram(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._get(Histogram, name, documentation, labels, buckets=buckets)
+
+    def render(self):
+        """
+        :return: str
+            every metric in the Prometheus text exposition format 0.0.4
+        """
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        return '\n'.join(line for metric in metrics for line in metric.render()) + '\n'
+
+
+REGISTRY = Registry()
+
+REQUEST_SECONDS = REGISTRY.histogram(
+    'http_request_duration_seconds', 'Time to answer a request by route', ('method', 'route', 'status'))
+RESPONSE_ENCODE_SECONDS = REGISTRY.histogram(
+    'http_response_encode_seconds', 'Time to encode a graph response by format', ('format',))
+QUERY_SECONDS = REGISTRY.histogram(
+    'arango_query_duration_seconds', 'Time from sending a catalog query to receiving its first batch', ('query',))
+CURSOR_FETCH_SECONDS = REGISTRY.histogram(
+    'arango_cursor_fetch_seconds', 'Time to fetch one more cursor batch', ('query',))
+QUERY_ROWS = REGISTRY.counter('arango_query_rows_total', 'Rows returned by catalog queries', ('query',))
+QUERY_BYTES = REGISTRY.counter('arango_query_response_bytes_total', 'Bytes received for catalog queries', ('query',))
+QUERY_PROFILE_SECONDS = REGISTRY.histogram(
+    'arango_query_profile_seconds', 'Time spent in each phase of the sampled profiled queries', ('query', 'phase'))
+SLOW_QUERIES = REGISTRY.counter('arango_slow_queries_total', 'Queries slower than SLOW_QUERY_SECONDS', ('query',))
+ASSEMBLY_SECONDS = REGISTRY.histogram(
+    'graph_assembly_seconds', 'Time spent turning traversal rows into a graph', ('query',))
+CRAWL_JOBS = REGISTRY.gauge(
+    'crawl_scheduler', 'State of the crawl scheduler when the metrics were read', ('stat',))
+SEEN_STATS = REGISTRY.gauge(
+    'crawl_seen', 'Posts and searches in the store of what was crawled when the metrics were read', ('stat',))
+CACHE_STATS = REGISTRY.gauge(
+    'result_cache', 'Counters and size of the result cache when the metrics were read', ('stat',))
+DRIVER_POOL = REGISTRY.gauge(
+    'browser_pool', 'State of the browser pool when the metrics were read', ('stat',))
+CURSOR_STATS = REGISTRY.gauge(
+    'page_cursors', 'Cursors kept open between the pages of a result when the metrics were read', ('stat',))
+SINGLE_FLIGHT_STATS = REGISTRY.gauge(
+    'single_flight', 'Queries in flight and requests coalesced into them when the metrics were read', ('stat',))
+COALESCED_REQUESTS = REGISTRY.counter(
+    'coalesced_requests_total', 'Requests answered by a query already in flight for the same result', ('namespace',))
+ADJACENCY_STATS = REGISTRY.gauge(
+    'adjacency_index', 'Size and use of the in memory adjacency of each graph when the metrics were read',
+    ('graph', 'stat'))
+CRAWL_PAGES = REGISTRY.counter('crawl_pages_total', 'Result pages read by the collector', ('engine',))
+CRAWL_POSTS = REGISTRY.counter('crawl_posts_total', 'Posts read by the collector', ('engine',))
+CRAWL_PAGE_SECONDS = REGISTRY.histogram(
+    'crawl_page_seconds', 'Time to load and read one result page', ('engine',),
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0))
+
+
+def record_query(name, seconds, rows, size, bind_vars=None, profile=None):
+    """
+    Record a finished query and log it to the slow query log when it took longer than SLOW_QUERY_SECONDS
+
+    :param name: str
+        catalog name of the query
+    :param seconds: float
+        time from sending the query to receiving its last row
+    :param rows: int
+    :param size: int
+        bytes received
+    :param profile: dict
+        phase durations reported by ArangoDB for a profiled query
+    """
+    QUERY_ROWS.inc(rows, query=name)
+    QUERY_BYTES.inc(size, query=name)
+    for phase, duration in (profile or {}).items():
+        QUERY_PROFILE_SECONDS.observe(duration, query=name, phase=phase)
+    if seconds >= SLOW_QUERY_SECONDS:
+        SLOW_QUERIES.inc(query=name)
+        logger.bind(slow_query=True).warning(
+            "Slow query {} took {:.3f}s for {} rows ({} bytes) bind_vars={} profile={}",
+            name, seconds, rows, size, bind_vars, profile)
+
+
+def add_slow_query_log(path):
+    """
+    Write the slow query log to its own file as well as the regular log
+
+    :param path: str
+    :return: int
+        loguru handler id
+    """
+    return logger.add(path, filter=lambda record: record['extra'].get('slow_query', False), rotation='10 MB')
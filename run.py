@@ -1,3 +1,11 @@
-from apiserver import app
-
-app.create_app().run(debug=True)
+import time
+
+started = time.perf_counter()
+
+from loguru import logger
+
+from apiserver import app
+
+application = app.create_app()
+logger.info("App created in %.1f ms" % ((time.perf_counter() - started) * 1000))
+application.run(debug=True)
@@ -0,0 +1,198 @@
+import asyncio
+import time
+import unittest
+
+from benchmarks.fake_arango import FakeDatabase
+from benchmarks.synthetic import power_law_graph, hubs
+from database.adjacency import AdjacencyIndex, numpy
+from database.aql import bind, traversal
+from database.graph import GraphAssembler
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+def vertex(key, col='Tag'):
+    return {'_id': '%s/%s' % (col, key), '_key': str(key), '_rev': '_a', 'name': 'tag %s' % key}
+
+
+def edges(*pairs, col='Related'):
+    return [(col, 'Tag/%s' % a, 'Tag/%s' % b) for a, b in pairs]
+
+
+def line(source, target, label='Related'):
+    return {'source': 'Tag/%s' % source, 'target': 'Tag/%s' % target, 'label': label}
+
+
+@unittest.skipIf(numpy is None, "numpy is not installed")
+class TestAdjacencyIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = AdjacencyIndex('g')
+        self.index.load([vertex(i) for i in range(6)],
+                        edges((0, 1), (0, 2), (1, 4), (4, 5)) + edges((3, 0), col='Knows'))
+
+    def test_neighbors(self):
+        graph = self.index.neighbors('Tag/0')
+        self.assertEqual(graph['index'], ['Tag/1', 'Tag/2', 'Tag/3'])
+        self.assertEqual(graph['nodes'][0], {'key': 'Tag/1', 'name': 'tag 1'})
+        self.assertEqual(graph['lines'], [line(0, 1), line(0, 2), line(3, 0, 'Knows')])
+        # Nodes are copies
+        graph['nodes'][0]['name'] = 'changed'
+        self.assertEqual(self.index.neighbors('Tag/0')['nodes'][0]['name'], 'tag 1')
+
+    def test_neighbors_of_several_nodes_have_seeds(self):
+        graph = self.index.neighbors(['Tag/0', 'Tag/4'])
+        nodes = {n['key']: n['seeds'] for n in graph['nodes']}
+        self.assertEqual(nodes, {'Tag/1': ['Tag/0', 'Tag/4'], 'Tag/2': ['Tag/0'], 'Tag/3': ['Tag/0'],
+                                 'Tag/5': ['Tag/4']})
+        self.assertIn(dict(line(1, 4), seeds=['Tag/4']), graph['lines'])
+
+    def test_k_hop(self):
+        graph = self.index.k_hop('Tag/0', max_depth=2)
+        self.assertEqual(graph['index'], ['Tag/0', 'Tag/1', 'Tag/2', 'Tag/3', 'Tag/4'])
+        self.assertEqual(len(graph['lines']), 4)
+        graph = self.index.k_hop('Tag/0', max_depth=2, limit=3, direction='OUTBOUND', edge_collections=['Related'])
+        self.assertEqual(graph['index'], ['Tag/0', 'Tag/1', 'Tag/2'])
+        self.assertEqual(self.index.k_hop('Tag/0', 1, direction='INBOUND')['lines'], [line(3, 0, 'Knows')])
+        with self.assertRaises(ValueError):
+            self.index.k_hop('Tag/0', direction='SIDEWAYS')
+
+    def test_unanswerable_requests(self):
+        self.assertIsNone(self.index.neighbors('Tag/99'))
+        self.assertIsNone(self.index.neighbors('Tag/0', graph='other'))
+        self.assertIsNone(self.index.k_hop('Tag/0', edge_collections=['Unknown']))
+        self.assertIsNone(AdjacencyIndex('g').neighbors('Tag/0'))
+
+    def test_writes(self):
+        self.index.apply_write('Related', [{'_from': 'Tag/5', '_to': 'Tag/0'}])
+        self.assertIn(line(5, 0), self.index.neighbors('Tag/0')['lines'])
+        # Until its document is written a new vertex cannot be answered
+        self.index.apply_write('Related', [{'_from': 'Tag/9', '_to': 'Tag/0'}])
+        self.assertIsNone(self.index.neighbors('Tag/0'))
+        self.index.apply_write('Tag', [{'_key': '9', 'name': 'tag 9'}])
+        self.assertIn('Tag/9', self.index.neighbors('Tag/0')['index'])
+        self.assertEqual(self.index.stats()['delta'], 2)
+        # Merging the delta into the arrays keeps the same answers
+        self.index.max_delta = 1
+        self.index.apply_write('Related', [{'_from': 'Tag/9', '_to': 'Tag/2'}])
+        self.assertEqual(self.index.stats()['delta'], 0)
+        self.assertEqual(self.index.k_hop('Tag/9', 1)['index'], ['Tag/9', 'Tag/0', 'Tag/2'])
+        self.assertEqual(self.index.stats()['edges'], 8)
+
+    def test_upserts(self):
+        # Edges written again, already held by the arrays or by the delta, are not added twice
+        self.index.apply_write('Related', [{'_from': 'Tag/0', '_to': 'Tag/1'}, {'_from': 'Tag/5', '_to': 'Tag/0'}])
+        self.index.apply_write('Related', [{'_from': 'Tag/5', '_to': 'Tag/0'}])
+        self.assertEqual((self.index.stats()['edges'], self.index.stats()['delta']), (6, 1))
+        # The same pair in another collection is another edge
+        self.index.apply_write('Knows', [{'_from': 'Tag/0', '_to': 'Tag/1'}])
+        self.assertEqual(self.index.stats()['delta'], 2)
+        # Fields not written are kept
+        self.index.apply_write('Tag', [{'_key': '1', 'group': 3}])
+        self.assertEqual(self.index.neighbors('Tag/0')['nodes'][0], {'key': 'Tag/1', 'name': 'tag 1', 'group': 3})
+
+    def test_memory_bound(self):
+        index = AdjacencyIndex('g', max_bytes=2000)
+        self.assertFalse(index.load([vertex(i) for i in range(100)], []))
+        self.assertFalse(index.loaded)
+        self.assertIsNone(index.neighbors('Tag/1'))
+        index = AdjacencyIndex('g', max_bytes=2000)
+        self.assertTrue(index.load([vertex(1)], []))
+        index.apply_write('Tag', [vertex(i) for i in range(2, 100)])
+        self.assertFalse(index.loaded)
+
+
+@unittest.skipIf(numpy is None, "numpy is not installed")
+class TestSameAsTraversal(unittest.TestCase):
+
+    def setUp(self):
+        nodes, links = power_law_graph(300, edges_per_node=2, seed=5)
+        self.db = FakeDatabase()
+        self.db.create_collection('Tag').import_bulk(nodes)
+        self.db.create_collection('Related', edge=True).import_bulk(links)
+        self.index = AdjacencyIndex('g')
+        self.index.load(self.db.collection('Tag').docs.values(),
+                        (('Related', e['_from'], e['_to']) for e in links))
+        self.hubs = ['Tag/%s' % k for k in hubs(nodes, 3)] + ['Tag/150', 'Tag/299']
+
+    def traverse(self, query, bind_vars):
+        graph = GraphAssembler()
+        graph.add(self.db.aql.execute(query, bind_vars=bind_vars))
+        return graph.graph()
+
+    def test_neighbors(self):
+        for start in self.hubs:
+            expected = self.traverse(*bind('neighbors', start=start))
+            graph = self.index.neighbors(start)
+            self.assertCountEqual(graph['nodes'], expected['nodes'])
+            self.assertCountEqual(graph['lines'], expected['lines'])
+
+    def test_k_hop(self):
+        for start in self.hubs:
+            expected = self.traverse(*traversal('k_hop', 'ANY', start=start, max_depth=2, limit=10000))
+            graph = self.index.k_hop(start, max_depth=2)
+            self.assertCountEqual(graph['index'], expected['index'])
+            self.assertEqual(len(graph['lines']), len(expected['lines']))
+
+    def test_lines_between(self):
+        vertices = self.index.k_hop(self.hubs[0], max_depth=1)['index']
+        expected = self.traverse(*traversal('induced_edges', 'OUTBOUND', vertices=vertices))
+        self.assertCountEqual(self.index.lines_between(vertices), expected['lines'])
+        self.assertGreater(len(expected['lines']), len(vertices) - 1)
+
+
+class SlowAQL:
+    """
+    Queries of the wrapped database that take delay seconds each
+    """
+
+    def __init__(self, aql, delay):
+        self.aql = aql
+        self.delay = delay
+        self.executed = 0
+
+    def execute(self, *args, **kwargs):
+        self.executed += 1
+        time.sleep(self.delay)
+        return self.aql.execute(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.aql, name)
+
+
+@unittest.skipIf(numpy is None, "numpy is not installed")
+class TestLoadAdjacency(unittest.TestCase):
+
+    def setUp(self):
+        from apiserver.blueprints.admin import models
+        from apiserver.resources import resources
+        from database.async_arango import AsyncDatabase
+        self.models, self.resources = models, resources
+        nodes, links = power_law_graph(50, edges_per_node=2, seed=5)
+        db = FakeDatabase()
+        db.create_collection('Tag').import_bulk(nodes)
+        db.create_collection('Related', edge=True).import_bulk(links)
+        self.aql = db.aql = SlowAQL(db.aql, 0.1)
+        # Each query of the load takes longer than the query timeout
+        resources.register('arango', lambda: AsyncDatabase(db, timeout=0.05), close=AsyncDatabase.close)
+        models.adjacency['g'] = AdjacencyIndex('g')
+
+    def tearDown(self):
+        from database.async_arango import AsyncDatabase
+        del self.models.adjacency['g']
+        _run(self.resources.shutdown())
+        self.resources.register('arango', self.models._connect, close=AsyncDatabase.close)
+
+    def test_one_load_without_query_timeout(self):
+        async def go():
+            return await asyncio.gather(self.models.load_adjacency('g'), self.models.load_adjacency('g'))
+        self.assertEqual(_run(go()), [True, True])
+        # Both callers waited for the same load, one query per collection
+        self.assertEqual(self.aql.executed, 2)
+        self.assertEqual(self.models.adjacency['g'].stats()['vertices'], 50)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import unittest
+
+import networkx
+
+from database.analytics import (
+    adjacency_matrix, betweenness, centrality, degree, pagerank, top_nodes, numpy, sparse)
+
+
+def to_graph(digraph):
+    keys = ['Tag/%s' % n for n in digraph.nodes]
+    return {
+        'index': keys,
+        'nodes': [{'key': key, 'name': key} for key in keys],
+        'lines': [{'source': 'Tag/%s' % a, 'target': 'Tag/%s' % b, 'label': 'Related'} for a, b in digraph.edges]
+    }
+
+
+@unittest.skipIf(numpy is None or sparse is None, "numpy and scipy are not installed")
+class TestCentrality(unittest.TestCase):
+
+    def setUp(self):
+        self.digraph = networkx.gnm_random_graph(120, 400, seed=4, directed=True)
+        self.graph = to_graph(self.digraph)
+        self.matrix = adjacency_matrix(self.graph)
+
+    def assertClose(self, scores, expected, places=6):
+        for n, value in expected.items():
+            self.assertAlmostEqual(scores[n], value, places=places)
+
+    def test_matching_networkx(self):
+        self.assertClose(degree(self.matrix), dict(self.digraph.degree))
+        self.assertClose(pagerank(self.matrix), networkx.pagerank(self.digraph))
+        self.assertClose(betweenness(self.matrix, batch=16), networkx.betweenness_centrality(self.digraph), places=9)
+
+    def test_undirected(self):
+        undirected = self.digraph.to_undirected()
+        scores = centrality(self.graph, directed=False)
+        self.assertClose(scores['degree'], dict(undirected.degree))
+        self.assertClose(scores['pagerank'], networkx.pagerank(undirected))
+        self.assertClose(scores['betweenness'], networkx.betweenness_centrality(undirected), places=9)
+
+    def test_sampled_betweenness(self):
+        exact = betweenness(self.matrix)
+        estimate = betweenness(self.matrix, sample=60, seed=1)
+        self.assertTrue(numpy.array_equal(estimate, betweenness(self.matrix, sample=60, seed=1)))
+        # The most central nodes stay on top
+        self.assertIn(int(numpy.argmax(exact)), numpy.argsort(-estimate)[:5].tolist())
+
+    def test_parallel_lines_loops_and_dangling_ends(self):
+        graph = {
+            'index': ['Tag/1', 'Tag/2'],
+            'nodes': [{'key': 'Tag/1'}, {'key': 'Tag/2'}],
+            'lines': [{'source': 'Tag/1', 'target': 'Tag/2', 'label': 'Related'},
+                      {'source': 'Tag/1', 'target': 'Tag/2', 'label': 'Knows'},
+                      {'source': 'Tag/1', 'target': 'Tag/1', 'label': 'Related'},
+                      {'source': 'Tag/1', 'target': 'Tag/9', 'label': 'Related'}]
+        }
+        self.assertEqual(adjacency_matrix(graph).toarray().tolist(), [[0, 1], [0, 0]])
+        self.assertEqual(centrality({'index': [], 'nodes': [], 'lines': []})['pagerank'].tolist(), [])
+
+    def test_top_nodes(self):
+        scores = centrality(self.graph, measures=('degree', 'pagerank'))
+        top = top_nodes(self.graph, scores, 'pagerank', 10)
+        ranks = [node['pagerank'] for node in top['nodes']]
+        self.assertEqual(ranks, sorted(networkx.pagerank(self.digraph).values(), reverse=True)[:10])
+        self.assertEqual(top['index'], [node['key'] for node in top['nodes']])
+        self.assertIn('degree', top['nodes'][0])
+        self.assertNotIn('pagerank', self.graph['nodes'][0])
+        kept = set(top['index'])
+        self.assertTrue(all(line['source'] in kept and line['target'] in kept for line in top['lines']))
+        self.assertEqual(len(top_nodes(self.graph, scores, 'degree', 1000)['nodes']), 120)
+        with self.assertRaises(ValueError):
+            top_nodes(self.graph, scores, 'betweenness', 10)
+        with self.assertRaises(ValueError):
+            centrality(self.graph, measures=('closeness',))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import unittest
+
+from database.aql import QUERIES, bind, traversal, prepare, SEARCH_VIEW, DEFAULT_GRAPH
+
+
+class FakeAQL:
+
+    def __init__(self):
+        self.validated = []
+        self.explained = []
+
+    def validate(self, query):
+        self.validated.append(query)
+        return {'error': False}
+
+    def explain(self, query, bind_vars=None):
+        self.explained.append(bind_vars)
+        return {'estimatedCost': 3.0, 'nodes': [{'type': 'SingletonNode'}, {'type': 'ReturnNode'}], 'rules': []}
+
+
+class FakeDB:
+
+    def __init__(self):
+        self.aql = FakeAQL()
+
+
+class TestQueryCatalog(unittest.TestCase):
+
+    def test_bind_parameters(self):
+        query, bind_vars = bind('search', term="o'reilly")
+        self.assertNotIn("o'reilly", query)
+        self.assertEqual(bind_vars, {'@view': SEARCH_VIEW, 'term': "o'reilly"})
+
+    def test_query_text_does_not_depend_on_values(self):
+        self.assertEqual(bind('neighbors', start='Tag/1')[0], bind('neighbors', start='Tag/2')[0])
+
+    def test_neighbors_batch(self):
+        query, bind_vars = bind('neighbors_batch', seeds=['Tag/1', 'Tag/2'])
+        self.assertIn('FOR seed IN @seeds', query)
+        self.assertEqual(bind_vars, {'seeds': ['Tag/1', 'Tag/2'], 'graph': DEFAULT_GRAPH})
+
+    def test_missing_and_unknown(self):
+        with self.assertRaises(ValueError):
+            bind('neighbors')
+        with self.assertRaises(ValueError):
+            bind('not_a_query')
+
+    def test_traversal_over_named_graph(self):
+        query, bind_vars = traversal('k_hop', 'outbound', start='Tag/1', max_depth=3, limit=50, graph='g')
+        self.assertIn('0..@max_depth OUTBOUND @start GRAPH @graph', query)
+        self.assertEqual(bind_vars, {'start': 'Tag/1', 'max_depth': 3, 'limit': 50, 'graph': 'g'})
+
+    def test_traversal_over_edge_collections(self):
+        query, bind_vars = traversal(
+            'k_shortest_paths', 'ANY', ['Related', 'Knows'], start='Tag/1', target='Tag/2', k=3, max_depth=4)
+        self.assertIn('1..@max_depth ANY K_PATHS @start TO @target @@edge0, @@edge1', query)
+        # The k shortest of the paths within max_depth
+        self.assertLess(query.index('SORT LENGTH(p.edges)'), query.index('LIMIT @k'))
+        self.assertNotIn('graph', bind_vars)
+        self.assertEqual((bind_vars['@edge0'], bind_vars['@edge1']), ('Related', 'Knows'))
+
+    def test_invalid_direction(self):
+        with self.assertRaises(ValueError):
+            traversal('shortest_path', 'SIDEWAYS', start='Tag/1', target='Tag/2')
+
+    def test_prepare(self):
+        db = FakeDB()
+        costs = prepare(db)
+        self.assertEqual(len(db.aql.validated), len(QUERIES))
+        self.assertIn('search', costs)
+        self.assertIn({'@view': SEARCH_VIEW, 'term': 'sample'}, db.aql.explained)
+        # Edge collection variants have no collection to explain with
+        self.assertNotIn('k_hop.any.edges1', costs)
+        self.assertIn({'start': 'Tag/sample', 'graph': DEFAULT_GRAPH}, db.aql.explained)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+import unittest
+import asyncio
+import time
+from collections import deque
+
+from database.async_arango import AsyncDatabase
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+class FakeCursor:
+    """
+    Blocking stand in for arango.cursor.Cursor that serves the rows in fixed size batches
+    """
+
+    def __init__(self, rows, batch_size):
+        self._rows = list(rows)
+        self._size = batch_size
+        self._batch = deque(self._take())
+        self.id = '1'
+        self.closed = False
+
+    def _take(self):
+        chunk, self._rows = self._rows[:self._size], self._rows[self._size:]
+        return chunk
+
+    def __iter__(self):
+        while self._batch or self._rows:
+            if not self._batch:
+                self.fetch()
+            yield self._batch.popleft()
+
+    def batch(self):
+        return self._batch
+
+    def has_more(self):
+        return bool(self._rows) and not self.closed
+
+    def fetch(self):
+        self._batch.extend(self._take())
+
+    def close(self, ignore_missing=False):
+        self.closed = True
+
+
+class FakeAQL:
+
+    def __init__(self, rows, delay):
+        self.rows = rows
+        self.delay = delay
+        self.calls = []
+
+    def execute(self, query, bind_vars=None, batch_size=2, **kwargs):
+        self.calls.append(kwargs)
+        time.sleep(self.delay)
+        return FakeCursor(self.rows, batch_size)
+
+
+class FakeDB:
+
+    def __init__(self, rows=(), delay=0.0):
+        self.aql = FakeAQL(rows, delay)
+
+
+class TestAsyncDatabase(unittest.TestCase):
+
+    def test_execute_returns_all_rows(self):
+        db = AsyncDatabase(FakeDB(rows=range(5)), max_concurrency=2, timeout=5)
+        self.assertEqual(_run(db.execute('RETURN 1')), [0, 1, 2, 3, 4])
+        self.assertEqual(db.db.aql.calls[0]['max_runtime'], 5)
+
+    def test_queries_run_concurrently(self):
+        db = AsyncDatabase(FakeDB(rows=[1], delay=0.2), max_concurrency=8, timeout=5)
+
+        async def burst():
+            start = time.perf_counter()
+            await asyncio.gather(*[db.execute('RETURN 1') for _ in range(8)])
+            return time.perf_counter() - start
+        # Eight blocking 200ms queries would take 1.6s back to back
+        self.assertLess(_run(burst()), 0.8)
+
+    def test_concurrency_is_bounded(self):
+        db = AsyncDatabase(FakeDB(rows=[1], delay=0.1), max_concurrency=2, timeout=5)
+
+        async def burst():
+            start = time.perf_counter()
+            await asyncio.gather(*[db.execute('RETURN 1') for _ in range(4)])
+            return time.perf_counter() - start
+        self.assertGreaterEqual(_run(burst()), 0.2)
+
+    def test_timeout(self):
+        db = AsyncDatabase(FakeDB(rows=[1], delay=0.3), max_concurrency=1, timeout=0.05)
+        with self.assertRaises(asyncio.TimeoutError):
+            _run(db.execute('RETURN 1'))
+
+    def test_stream_yields_batches(self):
+        db = AsyncDatabase(FakeDB(rows=range(5)), max_concurrency=1, timeout=5)
+
+        async def collect():
+            return [batch async for batch in db.stream('RETURN 1', batch_size=2)]
+        self.assertEqual(_run(collect()), [[0, 1], [2, 3], [4]])
+
+    def test_event_loop_stays_responsive(self):
+        db = AsyncDatabase(FakeDB(rows=[1], delay=0.3), max_concurrency=1, timeout=5)
+
+        async def tick_while_querying():
+            ticks = 0
+            query = asyncio.ensure_future(db.execute('RETURN 1'))
+            while not query.done():
+                ticks += 1
+                await asyncio.sleep(0.01)
+            return ticks
+        self.assertGreater(_run(tick_while_querying()), 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
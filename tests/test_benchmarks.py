@@ -0,0 +1,72 @@
+import unittest
+import json
+import os
+import tempfile
+
+from benchmarks.fake_arango import FakeDatabase
+from benchmarks.synthetic import power_law_graph, hubs
+from database.aql import bind, traversal
+from database.bulk import BulkLoader
+
+
+class TestFakeArango(unittest.TestCase):
+
+    def setUp(self):
+        self.nodes, self.edges = power_law_graph(200, edges_per_node=2, seed=3)
+        self.db = FakeDatabase()
+        self.db.create_collection('Tag')
+        self.db.create_collection('Related', edge=True)
+        loader = BulkLoader(self.db, chunk_size=50)
+        loader.load('Tag', iter(self.nodes))
+        loader.load('Related', iter(self.edges))
+
+    def execute(self, query, bind_vars, batch_size=1000):
+        return list(self.db.aql.execute(query, bind_vars=bind_vars, batch_size=batch_size))
+
+    def test_power_law(self):
+        degrees = sorted((d['nodesize'] for d in self.nodes), reverse=True)
+        # A few hubs hold many more edges than the typical node
+        self.assertGreater(degrees[0], 5 * degrees[len(degrees) // 2])
+        self.assertEqual(hubs(self.nodes, 1), [d['_key'] for d in self.nodes if d['nodesize'] == degrees[0]][:1])
+
+    def test_neighbors_in_batches(self):
+        hub = 'Tag/%s' % hubs(self.nodes, 1)[0]
+        rows = self.execute(*bind('neighbors', start=hub), batch_size=7)
+        self.assertEqual(len(rows), self.db.document(hub)['nodesize'])
+        self.assertTrue(all(hub in (r['e']['_from'], r['e']['_to']) for r in rows))
+
+    def test_k_hop_and_path(self):
+        rows = self.execute(*traversal('k_hop', 'ANY', start='Tag/0', max_depth=2, limit=20))
+        self.assertEqual(rows[0]['v']['_id'], 'Tag/0')
+        self.assertEqual(len(rows), 20)
+        path = self.execute(*traversal('shortest_path_bounded', 'ANY', ['Related'], start='Tag/0', target='Tag/150',
+                                       max_depth=10))
+        self.assertEqual([path[0]['v']['_id'], path[-1]['v']['_id']], ['Tag/0', 'Tag/150'])
+
+    def test_search(self):
+        name = self.nodes[5]['name']
+        self.assertIn('Tag/5', [d['_id'] for d in self.execute(*bind('search', term=name))])
+        prefix = name.split()[0][:3]
+        found = self.execute(*bind('typeahead', prefix=prefix, short=[], limit=5))
+        self.assertTrue(found)
+        self.assertTrue(all(any(w.startswith(prefix) for w in d['name'].split()) for d in found))
+
+
+class TestBenchSuite(unittest.TestCase):
+
+    def test_small_run(self):
+        from benchmarks.bench_suite import main
+        with tempfile.TemporaryDirectory() as tmp:
+            output = os.path.join(tmp, 'results.json')
+            main(['--nodes', '300', '--requests', '5', '--output', output])
+            with open(output) as fd:
+                report = json.load(fd)
+        self.assertEqual(report['graph']['nodes'], 300)
+        self.assertEqual(report['bulk_load']['Tag']['rows'], 300)
+        for result in report['results'].values():
+            self.assertEqual(result['calls'], 5)
+            self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+
+
+if __name__ == '__main__':
+    unittest.main()
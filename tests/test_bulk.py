@@ -0,0 +1,102 @@
+import unittest
+import io
+import threading
+
+from database.bulk import BulkLoader, document_key, document_id, read_rows
+
+
+class FakeCollection:
+
+    def __init__(self):
+        self.batches = []
+        self.docs = {}
+        self.lock = threading.Lock()
+
+    def import_bulk(self, docs, halt_on_error=True, details=True, on_duplicate=None):
+        with self.lock:
+            self.batches.append(list(docs))
+            updated = sum(doc['_key'] in self.docs for doc in docs)
+            for doc in docs:
+                self.docs[doc['_key']] = dict(self.docs.get(doc['_key'], {}), **doc)
+        return {'created': len(docs) - updated, 'errors': 0, 'empty': 0, 'updated': updated, 'ignored': 0}
+
+
+class FakeDB:
+
+    def __init__(self):
+        self.collections = {}
+
+    def collection(self, name):
+        return self.collections.setdefault(name, FakeCollection())
+
+
+NODES = 'name,group,nodesize\nhtml,6,272.45\nc#,4,\njquery,6,341.17\n'
+LINKS = 'source,target,value\nhtml,jquery,48.0\nc#,html,10\n'
+
+
+class TestBulkLoader(unittest.TestCase):
+
+    def test_document_key(self):
+        self.assertEqual(document_key('jquery'), 'jquery')
+        self.assertEqual(document_key('c#'), document_key('c#'))
+        self.assertNotIn('#', document_key('c#'))
+        self.assertEqual(document_id('Tag', 'html'), 'Tag/html')
+
+    def test_read_rows(self):
+        rows = list(read_rows(io.StringIO(NODES), fmt='csv'))
+        self.assertEqual(rows[0], {'name': 'html', 'group': 6, 'nodesize': 272.45})
+        self.assertEqual(rows[1]['nodesize'], '')
+        rows = list(read_rows(io.BytesIO(b'{"name": "a"}\n\n{"name": "b"}\n'), fmt='jsonl'))
+        self.assertEqual([r['name'] for r in rows], ['a', 'b'])
+
+    def test_load_nodes_and_edges(self):
+        db = FakeDB()
+        loader = BulkLoader(db, chunk_size=2, workers=2)
+        stats = loader.load_nodes(io.StringIO(NODES), 'Tag', fmt='csv')
+        self.assertEqual((stats['rows'], stats['created']), (3, 3))
+        self.assertEqual(sorted(len(b) for b in db.collection('Tag').batches), [1, 2])
+        keys = {doc['name']: doc['_key'] for batch in db.collection('Tag').batches for doc in batch}
+        loader.load_edges(io.StringIO(LINKS), 'Related', from_col='Tag', to_col='Tag', fmt='csv')
+        edges = [doc for batch in db.collection('Related').batches for doc in batch]
+        self.assertIn({'_key': document_key('Tag/html-Tag/jquery'), '_from': 'Tag/html', '_to': 'Tag/jquery',
+                       'value': 48.0}, edges)
+        self.assertIn({'_key': document_key('Tag/%s-Tag/html' % keys['c#']), '_from': 'Tag/%s' % keys['c#'],
+                       '_to': 'Tag/html', 'value': 10}, edges)
+
+    def test_reload_updates_edges(self):
+        db = FakeDB()
+        loader = BulkLoader(db, chunk_size=2, workers=2)
+        for value in (48.0, 50.0):
+            loader.load_nodes(io.StringIO(NODES), 'Tag', fmt='csv')
+            stats = loader.load_edges(io.StringIO(LINKS.replace('48.0', str(value))), 'Related', from_col='Tag',
+                                      to_col='Tag', fmt='csv')
+        self.assertEqual((stats['created'], stats['updated']), (0, 2))
+        self.assertEqual(len(db.collection('Related').docs), 2)
+        edge = db.collection('Related').docs[document_key('Tag/html-Tag/jquery')]
+        self.assertEqual(edge['value'], 50.0)
+
+    def test_keys_are_read_as_written(self):
+        db = FakeDB()
+        loader = BulkLoader(db)
+        loader.load_nodes(io.StringIO('name,group\n007,1\n1.0,2\n'), 'Tag', fmt='csv')
+        nodes = db.collection('Tag').batches[0]
+        self.assertEqual([(doc['_key'], doc['name'], doc['group']) for doc in nodes], [('007', '007', 1),
+                                                                                       ('1.0', '1.0', 2)])
+        loader.load_edges(io.StringIO('source,target,value\n007,1.0,3\n'), 'Related', from_col='Tag', to_col='Tag',
+                          fmt='csv')
+        edge = db.collection('Related').batches[0][0]
+        self.assertEqual((edge['_from'], edge['_to'], edge['value']), ('Tag/007', 'Tag/1.0', 3))
+
+    def test_invalid_rows_are_skipped(self):
+        db = FakeDB()
+        loader = BulkLoader(db)
+        rows = b'{"name": "a"}\n{"group": 1}\n{"name": ""}\n{"name": "b"}\n'
+        stats = loader.load_nodes(io.BytesIO(rows), 'Tag', fmt='jsonl')
+        self.assertEqual((stats['rows'], stats['invalid']), (2, 2))
+        self.assertEqual([doc['_key'] for doc in db.collection('Tag').batches[0]], ['a', 'b'])
+        stats = loader.load_edges(io.StringIO(LINKS + 'html,,1\n'), 'Related', from_col='Tag', to_col='Tag', fmt='csv')
+        self.assertEqual((stats['rows'], stats['invalid']), (2, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
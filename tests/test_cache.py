@@ -0,0 +1,95 @@
+import unittest
+import json
+
+from database.cache import ResultCache, MISSING, approximate_size
+from database.db_arango import add_write_listener, remove_write_listener, notify_write
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestResultCache(unittest.TestCase):
+
+    def test_hit_and_miss(self):
+        cache = ResultCache()
+        self.assertIs(cache.get('suggestions', 'python'), MISSING)
+        cache.set('suggestions', 'python', [{'name': 'python'}])
+        self.assertEqual(cache.get('suggestions', 'python'), [{'name': 'python'}])
+        self.assertEqual((cache.stats()['hits'], cache.stats()['misses']), (1, 1))
+
+    def test_ttl_per_namespace(self):
+        clock = FakeClock()
+        cache = ResultCache(ttls={'suggestions': 10, 'neighbors': 1}, clock=clock)
+        cache.set('suggestions', 'a', 1)
+        cache.set('neighbors', 'a', 2)
+        clock.now = 5
+        self.assertEqual(cache.get('suggestions', 'a'), 1)
+        self.assertIs(cache.get('neighbors', 'a'), MISSING)
+        self.assertEqual(cache.stats()['expirations'], 1)
+
+    def test_lru_eviction_by_entries(self):
+        cache = ResultCache(max_entries=2)
+        cache.set('n', 'a', 1)
+        cache.set('n', 'b', 2)
+        cache.get('n', 'a')
+        cache.set('n', 'c', 3)
+        self.assertIs(cache.get('n', 'b'), MISSING)
+        self.assertEqual(cache.get('n', 'a'), 1)
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_eviction_by_bytes(self):
+        cache = ResultCache(max_bytes=100)
+        cache.set('n', 'a', 'x' * 60)
+        cache.set('n', 'b', 'y' * 60)
+        self.assertEqual(len(cache), 1)
+        self.assertLessEqual(cache.stats()['bytes'], 100)
+        self.assertFalse(cache.set('n', 'c', 'z' * 200))
+
+    def test_invalidate_by_tag(self):
+        cache = ResultCache()
+        cache.set('neighbors', 'Tag/1', {}, tags={'Tag', 'Related'})
+        cache.set('suggestions', 'python', [], tags={'v_search_test', 'User'})
+        self.assertEqual(cache.invalidate('Related'), 1)
+        self.assertIs(cache.get('neighbors', 'Tag/1'), MISSING)
+        self.assertEqual(cache.get('suggestions', 'python'), [])
+
+    def test_invalidated_during_read(self):
+        cache = ResultCache()
+        generation = cache.generation()
+        cache.invalidate('Related')
+        # Read before the write, refused
+        self.assertFalse(cache.set('neighbors', 'Tag/1', {}, tags={'Tag', 'Related'}, generation=generation))
+        self.assertTrue(cache.set('suggestions', 'python', [], tags={'User'}, generation=generation))
+        self.assertTrue(cache.set('neighbors', 'Tag/1', {}, tags={'Related'}, generation=cache.generation()))
+        self.assertEqual(cache.stats()['stale'], 1)
+
+    def test_approximate_size(self):
+        graph = {'index': {'Tag/%d' % i: i for i in range(10000)},
+                 'lines': [{'from': 'Tag/%d' % i, 'to': 'Tag/%d' % (i + 1), 'label': 'Related'} for i in range(10000)]}
+        size = len(json.dumps(graph))
+        self.assertLess(abs(approximate_size(graph) - size), size * 0.2)
+        self.assertEqual(approximate_size('x' * 60), 62)
+        self.assertEqual(approximate_size([]), 2)
+
+    def test_write_listener(self):
+        cache = ResultCache()
+        cache.set('neighbors', 'Tag/1', {}, tags={'Tag'})
+
+        def listener(col, docs):
+            cache.invalidate(col)
+        add_write_listener(listener)
+        try:
+            notify_write('Tag', [{'name': 'new'}])
+        finally:
+            remove_write_listener(listener)
+        self.assertEqual(len(cache), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
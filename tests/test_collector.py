@@ -1,14 +1,35 @@
-import unittest
-from loguru import logger
-from collector import web_driver
-
-
-class TestAdminRoutes(unittest.TestCase):
-
-    def test_home_2(self):
-
-        web_driver.scroll()
-
-
-if __name__ == '__main__':
-    unittest.main()
+import unittest
+from loguru import logger
+from networkx import DiGraph
+from collector import web_driver
+
+POSTS = [
+    {'author': 'Jane Doe', 'link': 'https://medium.com/@jane', 'date': 'May 1', 'title': 'Graphs, Part 1!',
+     'claps': '120'},
+    {'author': 'Jane Doe', 'link': 'https://medium.com/@jane', 'date': 'May 2', 'title': 'Graphs part 2',
+     'claps': None},
+    {'author': None, 'link': None, 'date': None, 'title': 'No author', 'claps': None}
+]
+
+
+class TestAdminRoutes(unittest.TestCase):
+
+    def test_home_2(self):
+
+        web_driver.scroll()
+
+    def test_add_posts(self):
+        graph = DiGraph()
+        graph.add_node('mediumcom')
+        graph.add_node('graphs')
+        self.assertEqual(web_driver.add_posts(graph, POSTS, 'graphs'), 2)
+        self.assertEqual(graph.nodes['graphspart1']['description'], 'Graphs, Part 1! by Jane Doe')
+        self.assertEqual(graph.nodes['graphspart1']['count'], '120')
+        self.assertEqual(graph.edges['janedoe', 'graphspart2']['label'], 'Posted')
+        self.assertEqual(graph.edges['graphspart2', 'mediumcom']['label'], 'PostedOn')
+        self.assertEqual(graph.edges['graphs', 'graphspart1']['label'], 'FromSearch')
+        self.assertEqual(graph.number_of_nodes(), 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
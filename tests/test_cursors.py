@@ -0,0 +1,174 @@
+import unittest
+import asyncio
+
+from arango.exceptions import CursorNextError
+from arango.request import Request
+from arango.response import Response
+
+from benchmarks.fake_arango import FakeCursor, FakeDatabase
+from benchmarks.synthetic import power_law_graph, hubs
+from database.cursors import CursorStore, CursorExpired
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+class Clock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def cursor_not_found(cursor_id='1'):
+    # What python-arango raises for a cursor ArangoDB no longer has
+    response = Response('PUT', 'http://localhost:8529/_api/cursor/%s' % cursor_id, {}, 404, 'Not Found', '')
+    response.error_code, response.error_message = 1600, 'cursor not found'
+    return CursorNextError(response, Request('put', '/_api/cursor/%s' % cursor_id))
+
+
+class TestCursorStore(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        self.store = CursorStore(ttl=10, max_open=2, clock=self.clock)
+
+    def test_token_is_used_once(self):
+        cursor = FakeCursor(range(5), batch_size=2)
+        token, evicted = self.store.add(cursor, {'kind': 'test'})
+        self.assertEqual(evicted, [])
+        page = self.store.take(token)
+        self.assertIs(page.cursor, cursor)
+        self.assertEqual(page.state, {'kind': 'test'})
+        with self.assertRaises(CursorExpired):
+            self.store.take(token)
+        self.assertNotEqual(self.store.add(cursor)[0], token)
+
+    def test_ttl(self):
+        old, _ = self.store.add(FakeCursor(range(5)))
+        self.clock.now = 5
+        recent, _ = self.store.add(FakeCursor(range(5)))
+        self.clock.now = 11
+        self.assertEqual(len(self.store.expire()), 1)
+        self.assertEqual(len(self.store), 1)
+        with self.assertRaises(CursorExpired):
+            self.store.take(old)
+        self.store.take(recent)
+        token, _ = self.store.add(FakeCursor(range(5)))
+        self.clock.now = 30
+        with self.assertRaises(CursorExpired):
+            self.store.take(token)
+        self.assertEqual(self.store.stats()['expirations'], 2)
+
+    def test_least_recently_added_is_evicted(self):
+        first = FakeCursor(range(5))
+        tokens = [self.store.add(first)[0], self.store.add(FakeCursor(range(5)))[0]]
+        token, evicted = self.store.add(FakeCursor(range(5)))
+        self.assertEqual(evicted, [first])
+        with self.assertRaises(CursorExpired):
+            self.store.take(tokens[0])
+        self.store.take(tokens[1])
+        self.assertEqual(len(self.store.clear()), 1)
+
+
+class TestPagedRoutes(unittest.TestCase):
+
+    def setUp(self):
+        from apiserver.blueprints.admin import models, views
+        from apiserver.resources import resources
+        from database.async_arango import AsyncDatabase
+        self.models, self.views, self.resources = models, views, resources
+        # The crawls a search would start are recorded rather than queued on the app's scheduler
+        self.crawls = []
+        self.submit_crawl = views._submit_crawl
+        views._submit_crawl = lambda term, priority: self.crawls.append(term) or {'term': term}
+        nodes, edges = power_law_graph(300, edges_per_node=2, seed=2)
+        db = FakeDatabase()
+        db.create_collection('Tag').import_bulk(nodes + [dict(nodes[0], _key='copy%d' % i) for i in range(25)])
+        db.create_collection('Related', edge=True).import_bulk(edges)
+        self.hub, self.name = 'Tag/%s' % hubs(nodes, 1)[0], nodes[0]['name']
+        self.degree = len(list(db._edges(self.hub)))
+        resources.register('arango', lambda: AsyncDatabase(db), close=AsyncDatabase.close)
+
+    def tearDown(self):
+        from database.async_arango import AsyncDatabase
+        _run(self.resources.shutdown())
+        self.views._submit_crawl = self.submit_crawl
+        self.resources.register('arango', self.models._connect, close=AsyncDatabase.close)
+
+    def pages(self, route, first):
+        from apiserver.app import create_app
+
+        async def go():
+            client = create_app().test_client()
+            pages, form = [], dict(first)
+            while True:
+                response = await client.post(route, form=form)
+                body = await response.get_json()
+                if response.status_code != 200:
+                    return pages, response.status_code
+                pages.append(body)
+                if not body['next']:
+                    break
+                form = {'pagetoken': body['next']}
+            # A token cannot be used twice
+            response = await client.post(route, form=form if len(pages) > 1 else {'pagetoken': 'unknown'})
+            return pages, response.status_code
+        return _run(go())
+
+    def test_neighbor_pages(self):
+        pages, status = self.pages('/get_neighbors_index', {'nodekey': self.hub, 'pagesize': 10})
+        self.assertEqual(status, 410)
+        self.assertEqual(len(pages), -(-self.degree // 10))
+        keys = [key for page in pages for key in page['data']['index']]
+        self.assertEqual(len(keys), len(set(keys)))
+        self.assertEqual(sum(len(page['data']['lines']) for page in pages), self.degree)
+        self.assertEqual(len(self.models.cursors), 0)
+
+    def test_suggestion_pages(self):
+        pages, status = self.pages('/get_suggestion_items', {'searchterms': self.name, 'pagesize': 7})
+        self.assertEqual(status, 410)
+        self.assertGreaterEqual(sum(len(page['data']) for page in pages), 26)
+        self.assertTrue(all(len(page['data']) <= 7 for page in pages))
+        self.assertIsNotNone(pages[0]['crawl'])
+        self.assertTrue(all(page['crawl'] is None for page in pages[1:]))
+        self.assertEqual(self.crawls, [self.name])
+
+    def test_cursor_gone_from_the_database(self):
+        from apiserver.app import create_app
+
+        async def go():
+            client = create_app().test_client()
+            response = await client.post('/get_neighbors_index', form={'nodekey': self.hub, 'pagesize': 10})
+            token = (await response.get_json())['next']
+            page, _ = self.models.cursors._pages[token]
+
+            def fetch():
+                raise cursor_not_found()
+            page.cursor.fetch = fetch
+            response = await client.post('/get_neighbors_index', form={'pagetoken': token})
+            return response.status_code
+        self.assertEqual(_run(go()), 410)
+        self.assertEqual(len(self.models.cursors), 0)
+
+    def test_bad_requests(self):
+        from apiserver.app import create_app
+
+        async def go():
+            client = create_app().test_client()
+            statuses = []
+            forms = ({'pagesize': 10}, {'nodekey': self.hub, 'pagesize': 0}, {'nodekey': self.hub, 'pagesize': 'x'})
+            for form in forms:
+                statuses.append((await client.post('/get_neighbors_index', form=form)).status_code)
+            response = await client.post('/get_suggestion_items', form={'searchterms': 'x', 'mode': 'typeahead',
+                                                                        'pagesize': 5})
+            statuses.append(response.status_code)
+            return statuses
+        self.assertEqual(_run(go()), [400, 400, 400, 400])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+import unittest
+import tempfile
+import threading
+
+from selenium.common.exceptions import WebDriverException
+
+from collector import web_driver
+from collector.driver_pool import DriverPool, PoolTimeout, PoolClosed
+
+
+class FakeDriver:
+    """
+    Webdriver stand in that answers the health check until it is crashed
+    """
+
+    def __init__(self, heap=0):
+        self.crashed = False
+        self.quit_called = False
+        self.heap = heap
+
+    def execute_script(self, script):
+        if self.crashed:
+            raise WebDriverException('chrome not reachable')
+        if 'usedJSHeapSize' in script:
+            return self.heap
+        return 1
+
+    def quit(self):
+        self.quit_called = True
+
+
+class TestDriverPool(unittest.TestCase):
+
+    def setUp(self):
+        self.drivers = []
+
+        def factory():
+            self.drivers.append(FakeDriver())
+            return self.drivers[-1]
+        self.pool = DriverPool(factory, size=2, max_pages=3, max_memory=100)
+
+    def test_sessions_are_reused(self):
+        with self.pool.session() as session:
+            session.pages += 1
+        with self.pool.session() as again:
+            self.assertIs(again, session)
+        self.assertEqual(self.pool.stats()['started'], 1)
+
+    def test_size_is_bounded(self):
+        first, second = self.pool.checkout(), self.pool.checkout()
+        with self.assertRaises(PoolTimeout):
+            self.pool.checkout(timeout=0.05)
+        threading.Timer(0.05, self.pool.checkin, [first]).start()
+        self.assertIs(self.pool.checkout(timeout=2), first)
+        self.pool.checkin(second)
+
+    def test_recycled_after_max_pages(self):
+        with self.pool.session() as session:
+            session.pages = 3
+        self.assertTrue(session.driver.quit_called)
+        with self.pool.session() as again:
+            self.assertIsNot(again, session)
+        self.assertEqual(self.pool.stats()['recycled'], 1)
+
+    def test_recycled_over_memory_cap(self):
+        with self.pool.session() as session:
+            session.driver.heap = 200 * 2 ** 20
+        self.assertTrue(session.driver.quit_called)
+        self.assertEqual(self.pool.stats()['open'], 0)
+
+    def test_failed_health_check(self):
+        with self.pool.session() as session:
+            pass
+        session.driver.crashed = True
+        with self.pool.session() as again:
+            self.assertIsNot(again, session)
+        self.assertTrue(session.driver.quit_called)
+
+    def test_broken_session_is_replaced(self):
+        with self.assertRaises(WebDriverException):
+            with self.pool.session() as session:
+                raise WebDriverException('tab crashed')
+        self.assertTrue(session.driver.quit_called)
+        self.assertEqual(self.pool.stats()['open'], 0)
+
+    def test_close(self):
+        idle = self.pool.checkout()
+        busy = self.pool.checkout()
+        self.pool.checkin(idle)
+        self.pool.close()
+        self.assertTrue(idle.driver.quit_called)
+        self.assertFalse(busy.driver.quit_called)
+        self.pool.checkin(busy)
+        self.assertTrue(busy.driver.quit_called)
+        self.assertEqual(self.pool.stats()['open'], 0)
+        with self.assertRaises(PoolClosed):
+            self.pool.checkout()
+
+
+class TestNewDriver(unittest.TestCase):
+
+    def test_selenium_4_arguments(self):
+        created = []
+        chrome = web_driver.webdriver.Chrome
+        web_driver.webdriver.Chrome = lambda **kwargs: created.append(kwargs) or FakeDriver()
+        try:
+            with tempfile.NamedTemporaryFile() as driver:
+                self.assertIsInstance(web_driver.new_driver(driver.name), FakeDriver)
+        finally:
+            web_driver.webdriver.Chrome = chrome
+        self.assertEqual(set(created[0]), {'service', 'options'})
+        self.assertEqual(created[0]['service'].path, driver.name)
+        self.assertIn('--headless', created[0]['options'].arguments)
+
+
+if __name__ == '__main__':
+    unittest.main()
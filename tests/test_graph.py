@@ -0,0 +1,74 @@
+import unittest
+
+from database.graph import GraphAssembler, columnar
+
+
+def vertex(key):
+    return {'_id': 'Tag/%s' % key, '_key': str(key), '_rev': '_a', 'name': 'tag %s' % key}
+
+
+def edge(key, source, target, col='Related'):
+    return {'_id': '%s/%s' % (col, key), '_from': 'Tag/%s' % source, '_to': 'Tag/%s' % target}
+
+
+class TestGraphAssembler(unittest.TestCase):
+
+    def test_output_contract(self):
+        graph = GraphAssembler()
+        graph.add([{'v': vertex(1), 'e': edge(10, 0, 1)}, {'v': vertex(2), 'e': edge(11, 0, 2)}])
+        result = graph.graph()
+        self.assertEqual(result['index'], ['Tag/1', 'Tag/2'])
+        self.assertEqual(result['nodes'][0], {'key': 'Tag/1', 'name': 'tag 1'})
+        self.assertEqual(result['lines'][1], {'source': 'Tag/0', 'target': 'Tag/2', 'label': 'Related'})
+
+    def test_duplicates_are_removed(self):
+        graph = GraphAssembler()
+        # The same neighbor reached over two parallel edges and a second edge collection
+        graph.add([{'v': vertex(1), 'e': edge(10, 0, 1)}, {'v': vertex(1), 'e': edge(11, 0, 1)}])
+        nodes, lines = graph.add([{'v': vertex(1), 'e': edge(12, 0, 1, col='Knows')}])
+        result = graph.graph()
+        self.assertEqual(len(result['nodes']), 1)
+        self.assertEqual([line['label'] for line in result['lines']], ['Related', 'Knows'])
+        self.assertEqual((len(nodes), len(lines)), (0, 1))
+
+    def test_rows_without_edges(self):
+        graph = GraphAssembler()
+        graph.add([{'v': vertex(1)}, {'v': None, 'e': None}])
+        self.assertEqual(graph.graph()['index'], ['Tag/1'])
+        self.assertEqual(graph.graph()['lines'], [])
+
+
+
+    def test_seeds(self):
+        graph = GraphAssembler()
+        # Tag/1 is a neighbor of both seeds, over a different edge from each
+        graph.add([{'seed': 'Tag/0', 'v': vertex(1), 'e': edge(10, 0, 1)},
+                   {'seed': 'Tag/0', 'v': vertex(2), 'e': edge(11, 0, 2)},
+                   {'seed': 'Tag/3', 'v': vertex(1), 'e': edge(12, 3, 1)},
+                   {'seed': 'Tag/3', 'v': vertex(1), 'e': edge(12, 3, 1)}])
+        result = graph.graph()
+        self.assertEqual([n['seeds'] for n in result['nodes']], [['Tag/0', 'Tag/3'], ['Tag/0']])
+        self.assertEqual([line['seeds'] for line in result['lines']], [['Tag/0'], ['Tag/0'], ['Tag/3']])
+
+
+class TestColumnar(unittest.TestCase):
+
+    def test_round_trip(self):
+        graph = GraphAssembler()
+        graph.add([{'v': vertex(0), 'e': None}, {'v': vertex(1), 'e': edge(10, 0, 1)},
+                   {'v': dict(vertex(2), size=3), 'e': edge(11, 1, 2, col='Knows')}, {'v': None, 'e': edge(12, 0, 9)}])
+        data = columnar(graph.graph())
+        self.assertEqual(data['ids'], ['Tag/0', 'Tag/1', 'Tag/2', 'Tag/9'])
+        self.assertEqual(data['attributes'], {'name': ['tag 0', 'tag 1', 'tag 2', None], 'size': [None, None, 3, None]})
+        self.assertEqual(data['labels'], ['Related', 'Knows'])
+        lines = [{'source': data['ids'][s], 'target': data['ids'][t], 'label': data['labels'][l]}
+                 for s, t, l in zip(data['source'], data['target'], data['label'])]
+        self.assertEqual(lines, graph.graph()['lines'])
+
+    def test_empty(self):
+        self.assertEqual(columnar({'index': [], 'nodes': [], 'lines': []}), {
+            'ids': [], 'attributes': {}, 'labels': [], 'source': [], 'target': [], 'label': []})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+import os
+import threading
+import unittest
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+from networkx import DiGraph
+
+from collector.engines import get_engine
+from collector.http_engine import parse_posts, crawl
+from collector.posts import add_site, add_search, add_posts
+from collector.seen import SeenStore
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+with open(os.path.join(FIXTURES, 'medium_search.html'), encoding='utf-8') as page:
+    PAGE = page.read()
+
+
+class RecordedPages(BaseHTTPRequestHandler):
+    """
+    Answer every search with the recorded result page whatever the query
+    """
+    requested = []
+
+    def do_GET(self):
+        self.requested.append(self.path)
+        body = PAGE.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class LosingGraph(DiGraph):
+    """
+    Sink stand in that fails to write any article
+    """
+
+    def flush(self):
+        return {node for node, category in self.nodes(data='category') if category == 'Article'}
+
+
+class TestParsePosts(unittest.TestCase):
+
+    def test_fields(self):
+        posts = parse_posts(PAGE, 'https://medium.com/search?q=graphs')
+        self.assertEqual(len(posts), 3)
+        self.assertEqual(posts[0], {'author': 'Jane Doe', 'link': 'https://medium.com/@jane', 'date': 'May 1',
+                                    'title': 'Graphs, Part 1!', 'claps': '120'})
+        # Whitespace is collapsed like innerText and missing fields are None
+        self.assertEqual(posts[1]['author'], 'Jane Doe')
+        self.assertIsNone(posts[1]['claps'])
+        self.assertIsNone(posts[2]['author'])
+        self.assertEqual(posts[2]['title'], 'No author')
+
+
+class TestHttpEngine(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = HTTPServer(('127.0.0.1', 0), RecordedPages)
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+        cls.url = 'http://127.0.0.1:%d/search?q=%%s' % cls.server.server_port
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        RecordedPages.requested = []
+
+    def test_same_graph_as_add_posts(self):
+        progress = {}
+        graph = crawl(search_ids=['graphs'], progress=progress, search_url=self.url)
+        # The graph the browser engine builds from the same page
+        expected = DiGraph()
+        add_site(expected)
+        add_posts(expected, parse_posts(PAGE, 'http://127.0.0.1/'), add_search(expected, 'graphs'))
+        self.assertEqual(set(graph.nodes), set(expected.nodes))
+        self.assertEqual(set(graph.edges), set(expected.edges))
+        self.assertEqual(graph.nodes['graphspart1']['count'], '120')
+        self.assertEqual(progress, {'search': 'graphs', 'posts': 3})
+
+    def test_pages_and_terms(self):
+        graph = crawl(search_ids=['graphs', 'trees'], search_url=self.url, pages=2)
+        self.assertEqual(sorted(RecordedPages.requested), sorted([
+            '/search?q=graphs%20trees', '/search?q=graphs%20trees&page=2', '/search?q=graphs',
+            '/search?q=graphs&page=2', '/search?q=trees', '/search?q=trees&page=2']))
+        for search in ('graphs_trees', 'graphs', 'trees'):
+            self.assertEqual(graph.edges[search, 'graphspart2']['label'], 'FromSearch')
+
+    def test_recrawl_only_adds_new_posts(self):
+        seen = SeenStore()
+        progress = {}
+        graph = crawl(search_ids=['graphs'], search_url=self.url, pages=3, seen=seen, progress=progress)
+        self.assertEqual(graph.edges['graphs', 'graphspart2']['label'], 'FromSearch')
+        # The second page repeats the first one, nothing new so the third is not requested
+        self.assertEqual(RecordedPages.requested, ['/search?q=graphs', '/search?q=graphs&page=2'])
+        self.assertEqual(progress, {'search': 'graphs', 'posts': 6, 'new': 2})
+        RecordedPages.requested = []
+        graph = crawl(search_ids=['graphs'], search_url=self.url, pages=3, seen=seen)
+        self.assertEqual(set(graph.nodes), {'mediumcom', 'graphs'})
+        self.assertEqual(RecordedPages.requested, ['/search?q=graphs'])
+        self.assertEqual(seen.stats()['searches'], 1)
+        seen.close()
+
+    def test_posts_not_written_stay_new(self):
+        seen = SeenStore()
+        crawl(search_ids=['graphs'], search_url=self.url, graph=LosingGraph(), seen=seen)
+        self.assertEqual(seen.stats(), {'posts': 0, 'searches': 0, 'oldest_search_age': 0.0})
+        graph = crawl(search_ids=['graphs'], search_url=self.url, seen=seen)
+        self.assertEqual(graph.edges['graphs', 'graphspart2']['label'], 'FromSearch')
+        self.assertEqual(seen.stats()['posts'], 2)
+        seen.close()
+
+    def test_failed_page_is_skipped(self):
+        graph = crawl(search_ids=['graphs'], search_url='http://127.0.0.1:1/search?q=%s', timeout=2)
+        self.assertEqual(set(graph.nodes), {'mediumcom', 'graphs'})
+
+    def test_get_engine(self):
+        self.assertIs(get_engine('http'), crawl)
+        with self.assertRaises(ValueError):
+            get_engine('lynx')
+
+
+if __name__ == '__main__':
+    unittest.main()
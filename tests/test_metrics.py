@@ -0,0 +1,97 @@
+import unittest
+import asyncio
+
+from loguru import logger
+
+from database.aql import query_name, QUERIES
+from monitoring import metrics
+from monitoring.metrics import Registry, record_query
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+class TestRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = Registry()
+
+    def test_counter_and_gauge(self):
+        counter = self.registry.counter('rows_total', 'Rows', ('query',))
+        counter.inc(3, query='neighbors')
+        counter.inc(query='neighbors')
+        gauge = self.registry.gauge('queued', 'Queued jobs')
+        gauge.set(2)
+        self.assertEqual(counter.value(query='neighbors'), 4)
+        text = self.registry.render()
+        self.assertIn('# TYPE rows_total counter\nrows_total{query="neighbors"} 4\n', text)
+        self.assertIn('queued 2\n', text)
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = self.registry.histogram('seconds', 'Latency', ('route',), buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 3.0):
+            histogram.observe(value, route='/a')
+        lines = self.registry.render().splitlines()
+        self.assertIn('seconds_bucket{route="/a",le="0.1"} 2', lines)
+        self.assertIn('seconds_bucket{route="/a",le="1.0"} 3', lines)
+        self.assertIn('seconds_bucket{route="/a",le="+Inf"} 4', lines)
+        self.assertIn('seconds_count{route="/a"} 4', lines)
+        self.assertIn('seconds_sum{route="/a"} 3.65', lines)
+
+    def test_labels_must_match(self):
+        counter = self.registry.counter('rows_total', 'Rows', ('query',))
+        with self.assertRaises(ValueError):
+            counter.inc(route='/a')
+        with self.assertRaises(ValueError):
+            self.registry.gauge('rows_total', 'Rows', ('query',))
+        self.assertIs(self.registry.counter('rows_total', 'Rows', ('query',)), counter)
+
+    def test_label_values_are_escaped(self):
+        self.registry.counter('terms_total', 'Terms', ('term',)).inc(term='say "hi"\n')
+        self.assertIn('terms_total{term="say \\"hi\\"\\n"} 1', self.registry.render())
+
+
+class TestRecordQuery(unittest.TestCase):
+
+    def test_query_names(self):
+        self.assertEqual(query_name(QUERIES['neighbors'].text), 'neighbors')
+        self.assertEqual(query_name('FOR d IN Tag RETURN d'), 'adhoc')
+
+    def test_slow_queries_are_logged(self):
+        records = []
+        handler = logger.add(records.append, filter=lambda record: record['extra'].get('slow_query', False))
+        slow = metrics.SLOW_QUERIES.value(query='test.slow') or 0
+        try:
+            record_query('test.slow', metrics.SLOW_QUERY_SECONDS + 1, 10, 2048, {'start': 'Tag/1'},
+                         {'executing': 0.5})
+            record_query('test.slow', 0.0, 1, 10)
+        finally:
+            logger.remove(handler)
+        self.assertEqual(len(records), 1)
+        self.assertIn('test.slow', records[0])
+        self.assertEqual(metrics.SLOW_QUERIES.value(query='test.slow'), slow + 1)
+        self.assertEqual(metrics.QUERY_ROWS.value(query='test.slow'), 11)
+        self.assertEqual(metrics.QUERY_PROFILE_SECONDS.value(query='test.slow', phase='executing')[-1], 0.5)
+
+
+class TestMetricsRoute(unittest.TestCase):
+
+    def test_metrics_route(self):
+        from apiserver.app import create_app
+
+        async def go():
+            client = create_app().test_client()
+            await client.get('/get_cache_stats')
+            response = await client.get('/metrics')
+            return response.status_code, response.mimetype, (await response.get_data()).decode()
+        status, mimetype, text = _run(go())
+        self.assertEqual(status, 200)
+        self.assertEqual(mimetype, 'text/plain')
+        self.assertIn('http_request_duration_seconds_count{method="GET",route="/get_cache_stats",status="200"}', text)
+        self.assertIn('result_cache{stat="entries"}', text)
+        self.assertIn('crawl_scheduler{stat="queued"} 0', text)
+
+
+if __name__ == '__main__':
+    unittest.main()
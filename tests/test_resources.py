@@ -0,0 +1,77 @@
+import unittest
+import asyncio
+
+from apiserver.resources import Resources
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+class TestResources(unittest.TestCase):
+
+    def setUp(self):
+        self.resources = Resources()
+        self.created, self.closed = [], []
+        for name in ('db', 'pool', 'crawler'):
+            self.resources.register(name, lambda name=name: self.created.append(name) or {'name': name},
+                                    close=lambda instance: self.closed.append(instance['name']))
+
+    def test_lazy(self):
+        proxy = self.resources.proxy('db')
+        self.assertEqual(self.created, [])
+        self.assertEqual(proxy.get('name'), 'db')
+        self.assertEqual(proxy.get('name'), 'db')
+        self.assertEqual(self.created, ['db'])
+        self.assertIn('db', self.resources.timings)
+
+    def test_startup_and_shutdown_order(self):
+        timings = _run(self.resources.startup())
+        self.assertEqual(self.created, ['db', 'pool', 'crawler'])
+        self.assertEqual(set(timings), {'db', 'pool', 'crawler'})
+        _run(self.resources.shutdown())
+        self.assertEqual(self.closed, ['crawler', 'pool', 'db'])
+        self.assertFalse(self.resources.started('db'))
+
+    def test_only_started_resources_are_closed(self):
+        self.resources.get('pool')
+        _run(self.resources.shutdown())
+        self.assertEqual(self.closed, ['pool'])
+
+    def test_failing_close(self):
+        self.resources.register('broken', dict, close=lambda instance: 1 / 0)
+        _run(self.resources.startup())
+        _run(self.resources.shutdown())
+        self.assertEqual(self.closed, ['crawler', 'pool', 'db'])
+
+
+class TestImportApp(unittest.TestCase):
+
+    def test_create_app_has_no_side_effects(self):
+        from apiserver.app import create_app
+        from apiserver.resources import resources
+        create_app()
+        for name in ('arango', 'browsers', 'crawler'):
+            self.assertFalse(resources.started(name))
+        # Nor is the slow query log file opened
+        from apiserver.blueprints.admin import views
+        self.assertIsNone(views._slow_query_log)
+
+    def test_crawl_status_does_not_start_browsers(self):
+        from apiserver.app import create_app
+        from apiserver.resources import resources
+        client = create_app().test_client()
+
+        async def go():
+            response = await client.post('/get_crawl_status', form={})
+            return await response.get_json()
+        try:
+            data = _run(go())['data']
+            self.assertFalse(resources.started('browsers'))
+            self.assertEqual(data['browsers']['open'], 0)
+        finally:
+            _run(resources.shutdown())
+
+
+if __name__ == '__main__':
+    unittest.main()
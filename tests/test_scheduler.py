@@ -0,0 +1,98 @@
+import unittest
+import threading
+import time
+
+from collector.scheduler import CrawlScheduler, QueueFull, SchedulerStopped, HIGH, LOW
+
+
+class BlockingCrawl:
+    """
+    Crawl stand in that records the terms it ran and blocks until released
+    """
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.terms = []
+        self.running = 0
+        self.max_running = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, search_ids=None, progress=None):
+        with self.lock:
+            self.terms.append(search_ids[0])
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        progress['posts'] = 1
+        self.release.wait(5)
+        with self.lock:
+            self.running -= 1
+        return {'posts': 1}
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+class TestCrawlScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.crawl = BlockingCrawl()
+        self.scheduler = CrawlScheduler(self.crawl, workers=2, max_queue=2)
+        self.scheduler.start()
+
+    def tearDown(self):
+        self.crawl.release.set()
+        self.scheduler.stop(timeout=5)
+
+    def test_worker_pool_is_bounded(self):
+        for term in ['a', 'b']:
+            self.scheduler.submit(term)
+        self.assertTrue(wait_for(lambda: self.crawl.running == 2))
+        for term in ['c', 'd']:
+            self.scheduler.submit(term)
+        time.sleep(0.1)
+        self.assertEqual(self.crawl.max_running, 2)
+
+    def test_duplicate_terms_are_merged(self):
+        first = self.scheduler.submit('Graph Visualization')
+        second = self.scheduler.submit('graph  visualization')
+        self.assertIs(first, second)
+        self.assertEqual(second.requests, 2)
+
+    def test_backpressure(self):
+        for term in ['a', 'b']:
+            self.scheduler.submit(term)
+        self.assertTrue(wait_for(lambda: self.crawl.running == 2))
+        self.scheduler.submit('c')
+        self.scheduler.submit('d')
+        with self.assertRaises(QueueFull):
+            self.scheduler.submit('e')
+
+    def test_priority_and_status(self):
+        for term in ['a', 'b']:
+            self.scheduler.submit(term)
+        self.assertTrue(wait_for(lambda: self.crawl.running == 2))
+        low = self.scheduler.submit('low', priority=LOW)
+        high = self.scheduler.submit('high', priority=HIGH)
+        self.assertEqual(self.scheduler.get(low.id).status, 'queued')
+        self.crawl.release.set()
+        self.assertTrue(wait_for(lambda: not low.active))
+        self.assertLess(self.crawl.terms.index('high'), self.crawl.terms.index('low'))
+        self.assertEqual(high.to_dict()['status'], 'done')
+        self.assertEqual(high.progress, {'posts': 1})
+        self.assertEqual(high.result, {'posts': 1})
+
+    def test_submit_when_not_running(self):
+        with self.assertRaises(SchedulerStopped):
+            CrawlScheduler(self.crawl).submit('a')
+        self.scheduler.stop(timeout=5)
+        with self.assertRaises(SchedulerStopped):
+            self.scheduler.submit('a')
+        self.assertEqual(self.scheduler.stats()['queued'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,146 @@
+import unittest
+import json
+import time
+
+from networkx import DiGraph
+
+from collector.driver_pool import DriverPool
+from collector.posts import node_id
+from collector.rate_limit import RateLimiter, parse_rates
+from collector.seen import SeenStore
+from collector.web_driver import scroll, MEASURE_PAGE, EXTRACT_POSTS
+
+
+class InfiniteScroll:
+    """
+    Webdriver stand in for a result page that loads per_scroll more of its total posts latency seconds after every
+    scroll to the bottom
+    """
+
+    def __init__(self, total=25, per_scroll=10, latency=0.02):
+        self.total = total
+        self.per_scroll = per_scroll
+        self.latency = latency
+        self.urls = []
+        self.loaded = 0
+        self._pending = None
+
+    def get(self, url):
+        self.urls.append(url)
+        self.term = url.rpartition('q=')[2]
+        self.loaded = min(self.per_scroll, self.total)
+        self._pending = None
+
+    def execute_script(self, script, *args):
+        if self._pending is not None and time.monotonic() >= self._pending:
+            self.loaded, self._pending = min(self.loaded + self.per_scroll, self.total), None
+        if 'scrollTo' in script:
+            if self.loaded < self.total:
+                self._pending = time.monotonic() + self.latency
+            return None
+        if script == MEASURE_PAGE:
+            # Every page has the same height when fully loaded
+            return {'height': 100 * self.loaded, 'posts': self.loaded}
+        if script == EXTRACT_POSTS:
+            return json.dumps([{'author': 'author %d' % i, 'link': None, 'date': 'May 1', 'claps': None,
+                                'title': '%s post %d' % (self.term, i)} for i in range(args[0], self.loaded)])
+        return 1
+
+    def quit(self):
+        pass
+
+
+class TestScroll(unittest.TestCase):
+
+    def setUp(self):
+        self.drivers = []
+        self.limiter = RateLimiter(rate=0)
+
+    def pool(self, size=2, **page):
+        def factory():
+            self.drivers.append(InfiniteScroll(**page))
+            return self.drivers[-1]
+        return DriverPool(factory, size=size, max_pages=0, max_memory=0)
+
+    def articles(self, graph, search):
+        return {target for _, target in graph.out_edges(search)}
+
+    def test_every_search_is_read_to_its_end(self):
+        pool = self.pool()
+        start = time.perf_counter()
+        graph = scroll(search_ids=['graphs', 'trees'], pool=pool, timeout=0.5, limiter=self.limiter)
+        elapsed = time.perf_counter() - start
+        # Each search reads its own page from the top, whatever height the previous one ended at
+        for search in ('graphs_trees', 'graphs', 'trees'):
+            self.assertEqual(len(self.articles(graph, search)), 25)
+        # Scrolls end as soon as the posts are there and only the end of each search waits the full timeout, three
+        # searches of three scrolls one after the other took 4.5 s with a fixed sleep
+        self.assertLess(elapsed, 2.5)
+        self.assertEqual(len(self.drivers), 2)
+        pool.close()
+
+    def test_post_and_scroll_caps(self):
+        graph = scroll(search_ids='graphs', pool=self.pool(total=100), timeout=0.3, max_posts=15,
+                       limiter=self.limiter)
+        self.assertEqual(len(self.articles(graph, 'graphs')), 15)
+        graph = scroll(search_ids='graphs', pool=self.pool(total=100), timeout=0.3, max_scrolls=2,
+                       limiter=self.limiter)
+        self.assertEqual(len(self.articles(graph, 'graphs')), 30)
+
+    def test_stop_at_known(self):
+        graph = DiGraph()
+        for i in range(10, 100):
+            graph.add_node(node_id('graphs post %d' % i))
+        progress = {}
+        scroll(search_ids='graphs', graph=graph, progress=progress, pool=self.pool(total=100), timeout=0.3,
+               stop_at_known=True, limiter=self.limiter)
+        # The first scroll only brought known posts
+        self.assertEqual(progress, {'search': 'graphs', 'posts': 20})
+
+    def test_recrawl_with_seen_store(self):
+        seen = SeenStore()
+        progress = {}
+        graph = scroll(search_ids='graphs', progress=progress, pool=self.pool(total=30), timeout=0.3,
+                       stop_at_known=True, limiter=self.limiter, seen=seen)
+        self.assertEqual(len(self.articles(graph, 'graphs')), 30)
+        self.assertEqual(progress['new'], 30)
+        # The first scroll of the recrawl only brings posts already recorded, nothing is added
+        progress = {}
+        graph = scroll(search_ids='graphs', progress=progress, pool=self.pool(total=30), timeout=0.3,
+                       stop_at_known=True, limiter=self.limiter, seen=seen)
+        self.assertEqual(len(self.articles(graph, 'graphs')), 0)
+        self.assertEqual((progress['posts'], progress['new']), (20, 0))
+        seen.close()
+
+    def test_rate_limited(self):
+        start = time.perf_counter()
+        scroll(search_ids='graphs', pool=self.pool(), timeout=0.2, limiter=RateLimiter(rate=10))
+        # A page load and three scrolls
+        self.assertGreaterEqual(time.perf_counter() - start, 0.3)
+
+
+class TestRateLimiter(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 0.0
+        self.limiter = RateLimiter(rate=2, burst=2, rates={'slow.com': 0.5}, clock=lambda: self.now)
+
+    def test_spacing_per_host(self):
+        delays = [self.limiter.reserve('https://medium.com/search?q=%d' % i) for i in range(4)]
+        self.assertEqual(delays, [0, 0, 0.5, 1.0])
+        self.assertEqual(self.limiter.reserve('https://slow.com/a'), 0)
+        self.assertEqual(self.limiter.reserve('https://slow.com/b'), 0)
+        self.assertEqual(self.limiter.reserve('https://slow.com/c'), 2.0)
+        # A host left alone gets its burst back
+        self.now = 10
+        self.assertEqual(self.limiter.reserve('https://medium.com/'), 0)
+        self.assertEqual(self.limiter.reserve('https://medium.com/'), 0)
+        self.assertEqual(RateLimiter(rate=0).reserve('https://medium.com/'), 0)
+
+    def test_parse_rates(self):
+        self.assertEqual(parse_rates('medium.com=1, Example.com = 0.5,bad'), {'medium.com': 1, 'example.com': 0.5})
+        self.assertEqual(parse_rates(None), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
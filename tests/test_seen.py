@@ -0,0 +1,83 @@
+import unittest
+import os
+import tempfile
+import threading
+
+from collector.posts import node_id
+from collector.seen import SeenStore
+
+
+def post(i, claps='1'):
+    return {'author': 'Author %d' % (i % 3), 'link': 'https://medium.com/p/%d' % i, 'date': 'May 1',
+            'title': 'Post %d' % i, 'claps': claps}
+
+
+class TestSeenStore(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        self.store = SeenStore(clock=lambda: self.now)
+
+    def tearDown(self):
+        self.store.close()
+
+    def test_only_new_or_changed(self):
+        posts = [post(i) for i in range(5)]
+        self.assertEqual(self.store.new_or_changed('graphs', posts), posts)
+        self.store.record('graphs', posts)
+        self.assertEqual(self.store.new_or_changed('graphs', posts), [])
+        changed = [post(1, claps='9'), post(2), post(7)]
+        self.assertEqual(self.store.new_or_changed('graphs', changed), [changed[0], changed[2]])
+        # Another search still has to link the articles it finds
+        self.assertEqual(self.store.new_or_changed('trees', posts[:2]), posts[:2])
+        # Incomplete posts are left for add_posts to report
+        self.assertEqual(self.store.new_or_changed('graphs', [{'title': 'No author'}]), [])
+
+    def test_last_seen(self):
+        self.store.record('graphs', [post(1)])
+        self.store.crawled('graphs', 1, 1)
+        self.now = 2000.0
+        self.store.record('trees', [post(1), post(2)])
+        self.store.crawled('trees', 2, 1)
+        self.assertEqual(self.store.last_seen(node_id('Post 1')), 2000.0)
+        self.assertIsNone(self.store.last_seen('unknown'))
+        self.assertEqual(self.store.stats(), {'posts': 2, 'searches': 2, 'oldest_search_age': 1000.0})
+
+    def test_claim_due(self):
+        self.store.crawled('graphs', 1, 1)
+        self.now = 1500.0
+        self.store.crawled('trees', 1, 1)
+        self.store.crawled('empty')
+        self.now = 2000.0
+        self.assertEqual(self.store.claim_due(600), ['graphs'])
+        # Claimed searches are not handed out twice until they are crawled again or stay due for another max_age
+        self.assertEqual(self.store.claim_due(600), [])
+        self.now = 3000.0
+        self.assertEqual(self.store.claim_due(600, limit=2), ['graphs', 'trees'])
+        self.store.crawled('graphs', 1, 0)
+        self.assertEqual(self.store.claim_due(600), ['empty'])
+
+    def test_shared_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'seen.sqlite3')
+            stores = [SeenStore(path) for _ in range(2)]
+
+            def crawl(store, offset):
+                for i in range(20):
+                    store.record('term %d' % offset, [post(offset * 100 + i)])
+                    store.crawled('term %d' % offset, 1, 1)
+            threads = [threading.Thread(target=crawl, args=(store, n)) for n, store in enumerate(stores)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            for store in stores:
+                store.close()
+            reopened = SeenStore(path)
+            self.assertEqual(reopened.stats()['posts'], 40)
+            self.assertEqual(reopened.new_or_changed('term 1', [post(105)]), [])
+            reopened.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,39 @@
+import unittest
+
+import arango
+
+from apiserver.serve import config, main
+from database.async_arango import AsyncDatabase
+from database.db_arango import close_db_connection
+
+
+class TestConfig(unittest.TestCase):
+
+    def test_config(self):
+        settings = config(bind='0.0.0.0:8000', workers=4, graceful_timeout=10)
+        self.assertEqual(settings.application_path, 'apiserver.app:create_app()')
+        self.assertEqual((settings.bind, settings.workers, settings.graceful_timeout), (['0.0.0.0:8000'], 4, 10))
+        self.assertEqual(config(bind=['a:1', 'b:2']).bind, ['a:1', 'b:2'])
+        with self.assertRaises(ValueError):
+            config(workers=0)
+
+    def test_arguments(self):
+        with self.assertRaises(ValueError):
+            main(['--workers', '0'])
+
+
+class TestCloseConnection(unittest.TestCase):
+
+    def test_sessions_are_closed(self):
+        # No request is made, the sessions are only created
+        db = arango.ArangoClient(hosts='http://localhost:8529').db('test', verify=False)
+        closed = []
+        for session in db.conn._sessions:
+            session.close = lambda: closed.append(True)
+        AsyncDatabase(db).close()
+        self.assertEqual(closed, [True])
+        self.assertEqual(close_db_connection(object()), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+import unittest
+import asyncio
+import time
+
+from benchmarks.fake_arango import FakeDatabase
+from benchmarks.synthetic import power_law_graph, hubs
+from database.singleflight import SingleFlight
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+class TestSingleFlight(unittest.TestCase):
+
+    def setUp(self):
+        self.flights = SingleFlight()
+        self.calls = 0
+
+    async def slow(self, value, fail=False):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        if fail:
+            raise ValueError(value)
+        return value
+
+    def test_concurrent_calls_are_coalesced(self):
+        async def go():
+            results = await asyncio.gather(*[self.flights.do('a', self.slow, 1) for _ in range(10)],
+                                           self.flights.do('b', self.slow, 2))
+            # Once finished the key is forgotten
+            return results, len(self.flights), await self.flights.do('a', self.slow, 3)
+        results, in_flight, later = _run(go())
+        self.assertEqual(results, [1] * 10 + [2])
+        self.assertEqual((in_flight, later, self.calls), (0, 3, 3))
+        self.assertEqual(self.flights.stats()['coalesced'], 9)
+        self.assertEqual(self.flights.stats()['leaders'], 3)
+
+    def test_exceptions_are_shared(self):
+        async def go():
+            return await asyncio.gather(*[self.flights.do('a', self.slow, 1, True) for _ in range(3)],
+                                        return_exceptions=True)
+        self.assertTrue(all(isinstance(e, ValueError) for e in _run(go())))
+        self.assertEqual(self.calls, 1)
+
+    def test_cancelled_caller_does_not_cancel_the_others(self):
+        async def go():
+            first = asyncio.ensure_future(self.flights.do('a', self.slow, 1))
+            second = asyncio.ensure_future(self.flights.do('a', self.slow, 1))
+            await asyncio.sleep(0)
+            self.assertIn('a', self.flights)
+            first.cancel()
+            return await second
+        self.assertEqual(_run(go()), 1)
+        self.assertEqual(self.calls, 1)
+
+
+class TestCoalescedRoutes(unittest.TestCase):
+
+    def setUp(self):
+        from apiserver.blueprints.admin import models
+        from apiserver.resources import resources
+        from database.async_arango import AsyncDatabase
+        self.models, self.resources = models, resources
+        nodes, edges = power_law_graph(200, edges_per_node=2, seed=3)
+        db = FakeDatabase()
+        db.create_collection('Tag').import_bulk(nodes)
+        db.create_collection('Related', edge=True).import_bulk(edges)
+        self.hub = 'Tag/%s' % hubs(nodes, 1)[0]
+        self.queries = []
+        execute = db.aql.execute
+
+        def slow_execute(query, bind_vars=None, **options):
+            self.queries.append(query)
+            time.sleep(0.05)
+            return execute(query, bind_vars=bind_vars, **options)
+        db.aql.execute = slow_execute
+        models.cache.clear()
+        resources.register('arango', lambda: AsyncDatabase(db), close=AsyncDatabase.close)
+
+    def tearDown(self):
+        from database.async_arango import AsyncDatabase
+        _run(self.resources.shutdown())
+        self.resources.register('arango', self.models._connect, close=AsyncDatabase.close)
+        self.models.cache.clear()
+
+    def test_identical_requests_share_one_query(self):
+        from apiserver.app import create_app
+
+        async def go():
+            client = create_app().test_client()
+            before = self.models.flights.stats()['coalesced']
+            responses = await asyncio.gather(
+                *[client.post('/get_neighbors_index', form={'nodekey': self.hub}) for _ in range(8)])
+            bodies = [await response.get_json() for response in responses]
+            metrics = await (await client.get('/metrics')).get_data(as_text=True)
+            return bodies, self.models.flights.stats()['coalesced'] - before, metrics
+        bodies, coalesced, metrics = _run(go())
+        self.assertEqual(len(self.queries), 1)
+        self.assertEqual(coalesced, 7)
+        self.assertTrue(all(body == bodies[0] for body in bodies))
+        self.assertGreater(len(bodies[0]['data']['nodes']), 1)
+        self.assertIn('coalesced_requests_total{namespace="neighbors"}', metrics)
+        self.assertIn('single_flight{stat="coalesced"}', metrics)
+        self.assertIn('single_flight{stat="in_flight"} 0', metrics)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import unittest
+
+from collector.sink import ArangoGraphSink
+
+
+class FakeCollection:
+
+    def __init__(self, name, writes, fail=(), reject=()):
+        self.name = name
+        self.writes = writes
+        self.fail = fail
+        self.reject = reject
+
+    def import_bulk(self, docs, halt_on_error=True, details=True, on_duplicate=None):
+        if self.name in self.fail:
+            raise ConnectionError('%s is unavailable' % self.name)
+        if self.name in self.reject:
+            return {'created': 0, 'errors': len(docs)}
+        self.writes.append((self.name, list(docs), on_duplicate))
+        return {'created': len(docs), 'errors': 0}
+
+
+class FakeDB:
+
+    def __init__(self, fail=(), reject=()):
+        self.writes = []
+        self.fail = fail
+        self.reject = reject
+
+    def collection(self, name):
+        return FakeCollection(name, self.writes, self.fail, self.reject)
+
+
+class TestArangoGraphSink(unittest.TestCase):
+
+    def test_batched_upserts(self):
+        db = FakeDB()
+        sink = ArangoGraphSink(db, batch_size=4, create=False)
+        sink.add_node('janedoe', category='Author', description='Jane Doe')
+        sink.add_node('graphs', category='Article', description='Graphs by Jane Doe')
+        sink.add_node('graphs', category='Article', description='Graphs by Jane Doe', count='10')
+        self.assertEqual(db.writes, [])
+        sink.add_edge('janedoe', 'graphs', label='Posted')
+        # Nodes are written before the edges that point at them
+        self.assertEqual([col for col, docs, mode in db.writes], ['Author', 'Article', 'Posted'])
+        self.assertTrue(all(mode == 'update' for col, docs, mode in db.writes))
+        articles = db.writes[1][1]
+        self.assertEqual(articles, [{'_key': 'graphs', 'category': 'Article', 'description': 'Graphs by Jane Doe',
+                                     'count': '10'}])
+        edge = db.writes[2][1][0]
+        self.assertEqual((edge['_from'], edge['_to']), ('Author/janedoe', 'Article/graphs'))
+        self.assertEqual((sink.number_of_nodes(), sink.number_of_edges()), (2, 1))
+
+    def test_flush_on_exit(self):
+        db = FakeDB()
+        with ArangoGraphSink(db, create=False) as sink:
+            sink.add_node('mediumcom', category='Site')
+            sink.add_edge('graphs', 'mediumcom', label='PostedOn')
+            self.assertFalse(sink.has_node('mediumcom'))
+        self.assertEqual([col for col, docs, mode in db.writes], ['Site', 'PostedOn'])
+        self.assertTrue(sink.has_node('mediumcom'))
+
+    def test_failed_writes_are_returned(self):
+        sink = ArangoGraphSink(FakeDB(fail=('Article',)), batch_size=2, create=False)
+        sink.add_node('janedoe', category='Author')
+        sink.add_node('graphs', category='Article')
+        sink.add_edge('janedoe', 'graphs', label='Posted')
+        # The failure of the batch written when it filled up is kept for the next flush
+        self.assertEqual(sink.flush(), {'graphs'})
+        self.assertEqual(sink.flush(), set())
+        self.assertEqual(sink.number_of_nodes(), 1)
+
+    def test_only_written_nodes_are_known(self):
+        sink = ArangoGraphSink(FakeDB(reject=('Article',)), create=False)
+        sink.add_node('janedoe', category='Author')
+        sink.add_node('graphs', category='Article')
+        # Nothing is known before it is written
+        self.assertFalse(sink.has_node('janedoe'))
+        self.assertEqual(sink.flush(), {'graphs'})
+        self.assertTrue(sink.has_node('janedoe'))
+        self.assertFalse(sink.has_node('graphs'))
+        self.assertEqual(sink.number_of_nodes(), 1)
+
+    def test_nodes_are_counted_once(self):
+        db = FakeDB()
+        sink = ArangoGraphSink(db, create=False)
+        for _ in range(3):
+            sink.add_node('janedoe', category='Author')
+            sink.add_node('graphs', category='Article')
+            sink.add_edge('janedoe', 'graphs', label='Posted')
+            sink.flush()
+        # Upserted three times, one node of the crawl each like in a DiGraph
+        self.assertEqual(len(db.writes), 9)
+        self.assertEqual((sink.number_of_nodes(), sink.number_of_edges()), (2, 1))
+
+    def test_memory_stays_bounded(self):
+        sink = ArangoGraphSink(FakeDB(), batch_size=10, remember=5, create=False)
+        for i in range(100):
+            sink.add_node('author%d' % i, category='Author')
+        self.assertLessEqual(sink._buffered, 10)
+        self.assertEqual(len(sink._recent), 5)
+        self.assertFalse(sink.has_node('author0'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+import unittest
+import asyncio
+
+from apiserver.blueprints.admin.stream import GraphStream
+from database.aql import DIRECTIONS
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+def chain(n):
+    # Tag/0 - Tag/1 - ... - Tag/n
+    return [{'v': {'_id': 'Tag/%d' % i},
+             'e': {'_id': 'Related/%d' % i, '_from': 'Tag/%d' % (i - 1), '_to': 'Tag/%d' % i} if i else None}
+            for i in range(n + 1)]
+
+
+def expand(node_key, max_depth=1, **options):
+    if options.get('direction', 'ANY') not in DIRECTIONS:
+        raise ValueError("Bad direction")
+    return 'k_hop', {'start': node_key, 'max_depth': max_depth}
+
+
+def paths(start_key, target_key, k=1, **options):
+    return 'path', {'start': start_key, 'target': target_key}
+
+
+class Job:
+    """
+    Crawl job stand in that goes through a fixed list of states, one per look
+    """
+
+    def __init__(self):
+        self.states = [('running', {'posts': 1}), ('running', {'posts': 1}), ('done', {'posts': 3})]
+        self.status = None
+
+    @property
+    def active(self):
+        return self.status != 'done'
+
+    def to_dict(self):
+        self.status, progress = self.states.pop(0) if len(self.states) > 1 else self.states[0]
+        return {'status': self.status, 'progress': progress}
+
+
+class TestGraphStream(unittest.TestCase):
+
+    def setUp(self):
+        self.sent = []
+        self.gate = None
+        self.job = Job()
+
+    async def send(self, message):
+        self.sent.append(message)
+
+    async def stream(self, query, bind_vars, assembler):
+        rows = chain(bind_vars.get('max_depth', 3))
+        for i in range(0, len(rows), 2):
+            if self.gate is not None:
+                await self.gate.wait()
+            nodes, lines = assembler.add([dict(r, v=dict(r['v'])) for r in rows[i:i + 2]])
+            if nodes or lines:
+                yield nodes, lines
+
+    def session(self):
+        return GraphStream(self.send, expand, paths, self.stream, get_job=lambda job_id: self.job if job_id == 'j'
+                           else None, poll_interval=0)
+
+    def of(self, kind):
+        return [m for m in self.sent if m['type'] == kind]
+
+    async def finish(self, session):
+        for subscription in list(session.subscriptions.values()):
+            await subscription.task
+
+    def test_expand_streams_batches(self):
+        async def go():
+            session = self.session()
+            await session.handle({'type': 'expand', 'id': 'a', 'node': 'Tag/0', 'depth': 3})
+            await self.finish(session)
+        _run(go())
+        batches = self.of('batch')
+        self.assertEqual([b['seq'] for b in batches], [0, 1])
+        self.assertEqual([n['key'] for b in batches for n in b['nodes']], ['Tag/0', 'Tag/1', 'Tag/2', 'Tag/3'])
+        self.assertEqual(self.of('done'), [{'type': 'done', 'id': 'a', 'nodes': 4, 'lines': 3}])
+
+    def test_depth_only_sends_new_elements(self):
+        async def go():
+            session = self.session()
+            await session.handle({'type': 'expand', 'id': 'a', 'node': 'Tag/0', 'depth': 1})
+            await self.finish(session)
+            await session.handle({'type': 'depth', 'id': 'a', 'depth': 3})
+            await self.finish(session)
+            await session.handle({'type': 'depth', 'id': 'a', 'depth': 2})
+        _run(go())
+        keys = [n['key'] for b in self.of('batch') for n in b['nodes']]
+        self.assertEqual(keys, ['Tag/0', 'Tag/1', 'Tag/2', 'Tag/3'])
+        self.assertEqual(self.of('done')[-1]['nodes'], 4)
+        self.assertIn('only increase', self.of('error')[0]['message'])
+
+    def test_cancel(self):
+        async def go():
+            self.gate = asyncio.Event()
+            session = self.session()
+            await session.handle({'type': 'path', 'id': 'b', 'start': 'Tag/0', 'target': 'Tag/3'})
+            await asyncio.sleep(0)
+            await session.handle({'type': 'cancel', 'id': 'b'})
+            self.gate.set()
+            await asyncio.sleep(0)
+            self.assertEqual(session.subscriptions, {})
+        _run(go())
+        self.assertEqual(self.sent, [{'type': 'cancelled', 'id': 'b'}])
+
+    def test_invalid_messages(self):
+        async def go():
+            session = self.session()
+            await session.handle(['expand'])
+            await session.handle({'type': 'expand', 'node': 'Tag/0'})
+            await session.handle({'type': 'expand', 'id': 'a'})
+            await session.handle({'type': 'expand', 'id': 'a', 'node': 'Tag/0', 'direction': 'SIDEWAYS'})
+            await session.handle({'type': 'fly', 'id': 'a'})
+            self.assertEqual(session.subscriptions, {})
+        _run(go())
+        self.assertEqual(len(self.of('error')), 5)
+
+    def test_crawl_progress(self):
+        async def go():
+            session = self.session()
+            await session.handle({'type': 'crawl', 'id': 'c', 'job': 'j'})
+            await session.handle({'type': 'crawl', 'id': 'd', 'job': 'missing'})
+            await self.finish(session)
+        _run(go())
+        progress = self.of('progress')
+        # Unchanged states are not sent again
+        self.assertEqual([p['job']['status'] for p in progress], ['running', 'done'])
+        self.assertEqual(self.of('error')[0]['id'], 'd')
+
+
+if __name__ == '__main__':
+    unittest.main()
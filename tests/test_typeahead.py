@@ -0,0 +1,75 @@
+import unittest
+import asyncio
+
+from benchmarks.fake_arango import FakeDatabase
+from database.typeahead import PrefixIndex
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+class TestPrefixIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = PrefixIndex(max_prefix=3, per_prefix=2)
+        # Most popular first
+        self.index.load([{'name': 'JavaScript'}, {'name': 'java'}, {'name': 'Apache Jakarta'}, {'name': 'python'}])
+
+    def test_most_popular_first(self):
+        self.assertEqual([d['name'] for d in self.index.lookup('JA')], ['JavaScript', 'java'])
+        self.assertEqual([d['name'] for d in self.index.lookup('ja', limit=1)], ['JavaScript'])
+
+    def test_any_word_matches(self):
+        self.assertEqual([d['name'] for d in self.index.lookup('ap')], ['Apache Jakarta'])
+
+    def test_unknown_prefix(self):
+        self.assertEqual(self.index.lookup('zz'), [])
+
+    def test_long_prefix_is_not_answered(self):
+        self.assertIsNone(self.index.lookup('java'))
+        self.assertIsNone(self.index.lookup('ja py'))
+        self.assertIsNone(self.index.lookup(''))
+
+
+class TestGetTypeahead(unittest.TestCase):
+
+    def setUp(self):
+        from apiserver.blueprints.admin import models
+        from apiserver.resources import resources
+        from database.async_arango import AsyncDatabase
+        self.models, self.resources = models, resources
+        db = FakeDatabase()
+        self.docs = [{'_key': str(i), 'name': 'graph %d' % i} for i in range(30)]
+        db.create_collection('Tag').import_bulk(self.docs)
+        resources.register('arango', lambda: AsyncDatabase(db), close=AsyncDatabase.close)
+        models.prefix_index.load(reversed(self.docs))
+
+    def tearDown(self):
+        from database.async_arango import AsyncDatabase
+        _run(self.resources.shutdown())
+        self.resources.register('arango', self.models._connect, close=AsyncDatabase.close)
+        self.models.prefix_index.load([])
+        self.models.prefix_index.loaded_at = None
+        self.models.cache.clear()
+
+    def test_limit_beyond_the_index(self):
+        per_prefix = self.models.prefix_index.per_prefix
+        # Answered from memory, most popular first
+        data = _run(self.models.get_typeahead('gr', limit=per_prefix))
+        self.assertEqual([d['name'] for d in data], ['graph 29', 'graph 28'] + [d['name'] for d in data[2:]])
+        self.assertEqual(len(data), per_prefix)
+        # The index holds per_prefix documents of a prefix, the rest are searched for in the view
+        data = _run(self.models.get_typeahead('gr', limit=per_prefix + 5))
+        self.assertEqual(len(data), per_prefix + 5)
+        self.assertEqual(data[0]['name'], 'graph 0')
+
+    def test_short_last_word(self):
+        # The last word is too short for the view's n-grams, it still has to start a word of every name found
+        data = _run(self.models.get_typeahead('graph 1', limit=20))
+        self.assertEqual(sorted(d['name'] for d in data), ['graph 1'] + ['graph 1%d' % i for i in range(10)])
+        self.assertEqual(_run(self.models.get_typeahead('g 1')), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
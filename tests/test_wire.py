@@ -0,0 +1,51 @@
+import unittest
+import asyncio
+import json
+
+from quart import Quart
+
+from apiserver.blueprints.admin.wire import graph_response, COLUMNAR_JSON
+
+GRAPH = {
+    'index': ['Tag/1', 'Tag/2'],
+    'nodes': [{'key': 'Tag/1', 'name': 'python'}, {'key': 'Tag/2', 'name': 'java'}],
+    'lines': [{'source': 'Tag/1', 'target': 'Tag/2', 'label': 'Related'}]
+}
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+class TestGraphResponse(unittest.TestCase):
+
+    def setUp(self):
+        self.app = Quart(__name__)
+
+        @self.app.route('/graph')
+        async def graph():
+            return graph_response('2 nodes', GRAPH)
+
+    def get(self, accept):
+        async def go():
+            response = await self.app.test_client().get('/graph', headers={'Accept': accept})
+            return response.mimetype, response.headers.get('Vary'), json.loads(await response.get_data())
+        return _run(go())
+
+    def test_json_by_default(self):
+        for accept in ('*/*', 'application/json', 'text/html'):
+            mimetype, vary, body = self.get(accept)
+            self.assertEqual(mimetype, 'application/json')
+            self.assertEqual(body['data'], GRAPH)
+            self.assertEqual(vary, 'Accept')
+
+    def test_columnar(self):
+        mimetype, vary, body = self.get('%s, application/json;q=0.5' % COLUMNAR_JSON)
+        self.assertEqual(mimetype, COLUMNAR_JSON)
+        self.assertEqual(body['message'], '2 nodes')
+        self.assertEqual(body['data']['ids'], ['Tag/1', 'Tag/2'])
+        self.assertEqual([body['data']['source'], body['data']['target'], body['data']['label']], [[0], [1], [0]])
+
+
+if __name__ == '__main__':
+    unittest.main()